@@ -0,0 +1,145 @@
+"""
+Admin profiling routes (mounted only when PROFILING_ENABLED is set)
+"""
+
+import os
+import re
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+from core.config import settings
+from core.database import User
+from core.security import get_current_admin_user
+from core.profiling import profiler
+
+router = APIRouter()
+
+
+class RequestProfileCreate(BaseModel):
+    """Request-triggered profiling session parameters"""
+    path_pattern: str = Field(..., description="Regular expression matched against request paths")
+    count: int = Field(default=10, ge=1, le=1000)
+    interval_ms: float = Field(default=5, ge=1, le=1000)
+    include_idle: bool = False
+    timeout_seconds: Optional[float] = Field(default=None, gt=0)
+
+
+def _collapsed_response(collapsed: str, samples: int) -> PlainTextResponse:
+    """Collapsed stacks as text, ready for flamegraph.pl or speedscope"""
+    return PlainTextResponse(
+        collapsed + "\n" if collapsed else "",
+        headers={"X-Profile-Samples": str(samples), "X-Profile-Pid": str(os.getpid())},
+    )
+
+
+@router.post("/profile/cpu", response_class=PlainTextResponse)
+async def profile_cpu(
+    seconds: float = Query(default=10, gt=0),
+    interval_ms: float = Query(default=5, ge=1, le=1000),
+    include_idle: bool = False,
+    admin: User = Depends(get_current_admin_user)
+):
+    """Sample this worker for a time window and return collapsed stacks"""
+    if seconds > settings.PROFILING_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Window may not exceed {settings.PROFILING_MAX_SECONDS} seconds"
+        )
+    
+    sampler = await profiler.profile_window(seconds, interval_ms / 1000, include_idle)
+    return _collapsed_response(sampler.collapsed(), sampler.samples)
+
+
+@router.post("/profile/requests")
+async def arm_request_profile(
+    body: RequestProfileCreate,
+    admin: User = Depends(get_current_admin_user)
+):
+    """Profile the next matching requests served by this worker"""
+    timeout = min(body.timeout_seconds or settings.PROFILING_MAX_SECONDS, settings.PROFILING_MAX_SECONDS)
+    try:
+        session = profiler.arm(body.path_pattern, body.count, body.interval_ms / 1000, body.include_idle, timeout)
+    except re.error as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid path pattern: {e}")
+    return session.describe()
+
+
+@router.get("/profile/requests/{session_id}")
+async def get_request_profile(
+    session_id: str,
+    admin: User = Depends(get_current_admin_user)
+):
+    """State of a request-triggered profiling session"""
+    session = profiler.get_session(session_id)
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling session not found")
+    return session.describe()
+
+
+@router.get("/profile/requests/{session_id}/collapsed", response_class=PlainTextResponse)
+async def get_request_profile_stacks(
+    session_id: str,
+    admin: User = Depends(get_current_admin_user)
+):
+    """Collapsed stacks of a finished session"""
+    session = profiler.get_session(session_id)
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling session not found")
+    if session.status == "armed":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Profiling session still running")
+    return _collapsed_response(session.sampler.collapsed(), session.sampler.samples)
+
+
+@router.delete("/profile/requests/{session_id}")
+async def cancel_request_profile(
+    session_id: str,
+    admin: User = Depends(get_current_admin_user)
+):
+    """Stop a session early, keeping what it sampled"""
+    session = profiler.cancel(session_id)
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling session not found")
+    return session.describe()
+
+
+@router.post("/memory/start")
+async def start_memory_tracing(
+    frames: int = Query(default=10, ge=1, le=100),
+    admin: User = Depends(get_current_admin_user)
+):
+    """Start tracking allocations in this worker"""
+    started = profiler.start_tracing(frames)
+    return {"pid": os.getpid(), "tracing": True, "started": started}
+
+
+@router.post("/memory/stop")
+async def stop_memory_tracing(admin: User = Depends(get_current_admin_user)):
+    """Stop tracking allocations and discard snapshots"""
+    profiler.stop_tracing()
+    return {"pid": os.getpid(), "tracing": False}
+
+
+@router.post("/memory/snapshots")
+async def take_memory_snapshot(admin: User = Depends(get_current_admin_user)):
+    """Record current allocations for later comparison"""
+    if not profiler.is_tracing():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Memory tracing is not running")
+    return {"pid": os.getpid(), "snapshot_id": profiler.take_snapshot()}
+
+
+@router.get("/memory/snapshots/{snapshot_id}")
+async def get_memory_snapshot(
+    snapshot_id: str,
+    base: Optional[str] = None,
+    group_by: str = Query(default="lineno", pattern="^(lineno|filename|traceback)$"),
+    path_filter: Optional[str] = None,
+    limit: int = Query(default=25, ge=1, le=500),
+    admin: User = Depends(get_current_admin_user)
+):
+    """Top allocation sites, or growth relative to the `base` snapshot"""
+    try:
+        allocations = profiler.top_allocations(snapshot_id, base, group_by, path_filter, limit)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Snapshot not found")
+    return {"pid": os.getpid(), "snapshot_id": snapshot_id, "base": base, "allocations": allocations}
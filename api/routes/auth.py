@@ -2,13 +2,13 @@
 Authentication routes
 """
 
-from datetime import timedelta
+from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from core.database import get_db, User
-from core.security import verify_password, get_password_hash, create_access_token, get_current_active_user
+from core.security import verify_password_async, get_password_hash_async, create_access_token, get_current_active_user
 from core.config import settings
 
 router = APIRouter()
@@ -45,7 +45,7 @@ class UserResponse(BaseModel):
     full_name: str = None
     is_active: bool
     is_verified: bool
-    created_at: str
+    created_at: datetime
 
     class Config:
         from_attributes = True
@@ -66,7 +66,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     db_user = User(
         email=user_data.email,
         username=user_data.username,
@@ -95,7 +95,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     """Login user"""
     # Find user by email
     user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -2,24 +2,38 @@
 Document management routes
 """
 
-import os
 import hashlib
+import json
+import re
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from datetime import datetime
-from core.database import get_db, User, Document, Verification
-from core.security import get_current_active_user
+from core.database import get_db, get_read_db, SessionLocal, User, Document, Verification
+from core.security import get_current_active_user, get_current_stream_user
+from core.rate_limit import limit_requests
 from core.config import settings
-from services.blockchain_service import BlockchainService
-from services.ipfs_service import IPFSService
+from core.events import event_bus
+from core.pagination import paginate_keyset, NEXT_CURSOR_HEADER
+from core.responses import Serializer
+from core.response_cache import response_cache
 from services.file_service import FileService
+from services.audit_service import audit_log
+from services.stats_service import StatsService
+from services.pipeline_service import pipeline, pipeline_executor
+from services.deletion_service import deletion_service
+from services.export_service import export_service, ARCHIVE_FORMATS
+from services.verification_service import bulk_verifier
+from services.storage_service import ContentUnavailableError, tiered_storage
 
 router = APIRouter()
-blockchain_service = BlockchainService()
-ipfs_service = IPFSService()
 file_service = FileService()
+stats_service = StatsService()
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
 
 
 class DocumentCreate(BaseModel):
@@ -35,26 +49,45 @@ class DocumentResponse(BaseModel):
     description: Optional[str]
     file_size: int
     file_type: str
-    file_hash: str
+    file_hash: Optional[str]
     ipfs_hash: Optional[str]
     blockchain_tx_hash: Optional[str]
     is_verified: bool
-    created_at: str
-    updated_at: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
 
     class Config:
         from_attributes = True
 
 
+class BulkVerifyRequest(BaseModel):
+    """Bulk verification filters; all of the user's documents when none are given"""
+    document_ids: Optional[List[int]] = None
+    verified: Optional[bool] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+
 class DocumentUploadResponse(BaseModel):
     """Document upload response model"""
     document: DocumentResponse
     ipfs_hash: Optional[str]
     blockchain_tx_hash: Optional[str]
     verification_status: str
+    job_id: Optional[int] = None
+
+
+document_serializer = Serializer(DocumentResponse)
+document_list_serializer = Serializer(List[DocumentResponse])
+document_upload_serializer = Serializer(DocumentUploadResponse)
 
 
-@router.post("/upload", response_model=DocumentUploadResponse)
+@router.post(
+    "/upload",
+    response_model=DocumentUploadResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(limit_requests("upload"))]
+)
 async def upload_document(
     title: str = Form(...),
     description: Optional[str] = Form(None),
@@ -62,7 +95,7 @@ async def upload_document(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Upload a new document"""
+    """Upload a new document; hashing, IPFS and anchoring continue in the background"""
     # Validate file
     if not file_service.is_valid_file(file):
         raise HTTPException(
@@ -73,99 +106,142 @@ async def upload_document(
     # Save file locally
     file_path = await file_service.save_file(file, current_user.id)
     
-    # Calculate file hash
-    file_hash = file_service.calculate_file_hash(file_path)
-    
-    # Create document record
+    # Create document record and its post-processing job in one transaction
     document = Document(
         title=title,
         description=description,
         file_path=file_path,
         file_size=file.size,
         file_type=file.content_type,
-        file_hash=file_hash,
         owner_id=current_user.id
     )
     
     db.add(document)
+    db.flush()
+    job = pipeline.create_job(db, document)
     db.commit()
-    db.refresh(document)
-    
-    # Upload to IPFS
-    ipfs_hash = None
-    try:
-        ipfs_hash = await ipfs_service.upload_file(file_path)
-        document.ipfs_hash = ipfs_hash
-    except Exception as e:
-        print(f"IPFS upload failed: {e}")
     
-    # Store on blockchain
-    blockchain_tx_hash = None
-    try:
-        blockchain_tx_hash = await blockchain_service.store_document_hash(
-            file_hash, ipfs_hash, current_user.id
-        )
-        document.blockchain_tx_hash = blockchain_tx_hash
-        document.is_verified = True
-    except Exception as e:
-        print(f"Blockchain storage failed: {e}")
-    
-    # Create verification record
-    verification = Verification(
-        document_id=document.id,
-        user_id=current_user.id,
-        verification_type="upload",
-        status="success" if blockchain_tx_hash else "failed",
-        blockchain_tx_hash=blockchain_tx_hash,
-        ipfs_hash=ipfs_hash
-    )
-    
-    db.add(verification)
-    db.commit()
-    db.refresh(document)
+    # Track progress at /api/jobs/{job_id}
+    await pipeline_executor.submit(job.id)
     
-    return DocumentUploadResponse(
-        document=document,
-        ipfs_hash=ipfs_hash,
-        blockchain_tx_hash=blockchain_tx_hash,
-        verification_status="success" if blockchain_tx_hash else "failed"
-    )
+    return document_upload_serializer.response({
+        "document": document,
+        "ipfs_hash": None,
+        "blockchain_tx_hash": None,
+        "verification_status": "pending",
+        "job_id": job.id
+    }, status_code=status.HTTP_202_ACCEPTED)
 
 
 @router.get("/", response_model=List[DocumentResponse])
 async def list_documents(
+    request: Request,
+    cursor: Optional[str] = None,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
+):
+    """List user's documents, newest first (pass X-Next-Cursor back as `cursor` for the next page)"""
+    def build():
+        query = db.query(Document).filter(Document.owner_id == current_user.id, Document.deleted_at.is_(None))
+        documents, next_cursor = paginate_keyset(query, Document, cursor, limit, skip)
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+        return document_list_serializer.response(documents, headers=headers)
+    
+    version = stats_service.get_version(db, current_user.id)
+    return response_cache.respond(request, current_user.id, version, build)
+
+
+def _byte_range(header: Optional[str], size: int) -> Optional[tuple]:
+    """(start, end) of a single-range Range header, None for the whole body; 416 if unsatisfiable"""
+    match = RANGE_PATTERN.match(header.strip()) if header else None
+    if match is None or match.groups() == ("", ""):
+        return None  # Absent, or a form we do not serve (multiple ranges): send everything
+    
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last) + 1, size) if last else size
+    else:
+        start, end = max(size - int(last), 0), size  # Suffix range: the final N bytes
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def _plan_export(user_id: int, archive_format: str):
+    """Plan an export on a session of its own, closed before the archive starts streaming"""
+    db = SessionLocal()
+    try:
+        return export_service.plan(db, user_id, archive_format)
+    finally:
+        db.close()
+
+
+@router.get("/export", dependencies=[Depends(limit_requests("export", get_current_stream_user))])
+async def export_documents(
+    request: Request,
+    archive_format: str = Query("zip", alias="format", pattern=f"^({'|'.join(ARCHIVE_FORMATS)})$"),
+    current_user: User = Depends(get_current_stream_user)
 ):
-    """List user's documents"""
-    documents = db.query(Document).filter(
-        Document.owner_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    """Stream all of the user's documents and a proof manifest as one archive (resumable with Range)"""
+    # No get_db here: its session would stay checked out until the download finished
+    export = await run_in_threadpool(_plan_export, current_user.id, archive_format)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": export.etag,
+        "Content-Disposition": f'attachment; filename="digital-shadow-export.{archive_format}"',
+    }
+    
+    # Resume only the archive the client started: a changed vault means a fresh download
+    byte_range = None
+    if request.headers.get("if-range", export.etag) == export.etag:
+        byte_range = _byte_range(request.headers.get("range"), export.size)
+    
+    if byte_range is None:
+        headers["Content-Length"] = str(export.size)
+        return StreamingResponse(export.stream(), media_type=export.media_type, headers=headers)
     
-    return documents
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start)
+    headers["Content-Range"] = f"bytes {start}-{end - 1}/{export.size}"
+    return StreamingResponse(
+        export.stream(start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=export.media_type,
+        headers=headers
+    )
 
 
 @router.get("/{document_id}", response_model=DocumentResponse)
 async def get_document(
     document_id: int,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Get a specific document"""
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.owner_id == current_user.id
-    ).first()
+    def build():
+        document = db.query(Document).filter(
+            Document.id == document_id,
+            Document.owner_id == current_user.id,
+            Document.deleted_at.is_(None)
+        ).first()
+        
+        if not document:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found"
+            )
+        
+        return document_serializer.response(document)
     
-    if not document:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Document not found"
-        )
-    
-    return document
+    version = stats_service.get_version(db, current_user.id)
+    return response_cache.respond(request, current_user.id, version, build)
 
 
 @router.delete("/{document_id}")
@@ -174,32 +250,35 @@ async def delete_document(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Delete a document"""
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.owner_id == current_user.id
-    ).first()
-    
-    if not document:
+    """Delete a document; its file, IPFS pin and verifications are cleaned up in the background"""
+    if not deletion_service.tombstone(db, current_user.id, [document_id]):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Document not found"
         )
-    
-    # Delete file from storage
-    try:
-        os.remove(document.file_path)
-    except OSError:
-        pass  # File might not exist
-    
-    # Delete from database
-    db.delete(document)
     db.commit()
     
     return {"message": "Document deleted successfully"}
 
 
-@router.post("/{document_id}/verify")
+@router.post("/verify", dependencies=[Depends(limit_requests("bulk_verify", get_current_stream_user))])
+async def verify_documents(
+    filters: Optional[BulkVerifyRequest] = None,
+    current_user: User = Depends(get_current_stream_user)
+):
+    """Verify many documents at once, streaming one NDJSON result per document as it completes"""
+    # No get_db here: its session would stay checked out until the whole run finished
+    filters = filters or BulkVerifyRequest()
+    results = bulk_verifier.verify(current_user.id, **filters.model_dump())
+    
+    async def lines():
+        async for result in results:
+            yield json.dumps(result) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post("/{document_id}/verify", dependencies=[Depends(limit_requests("verify"))])
 async def verify_document(
     document_id: int,
     current_user: User = Depends(get_current_active_user),
@@ -208,7 +287,8 @@ async def verify_document(
     """Verify a document's authenticity"""
     document = db.query(Document).filter(
         Document.id == document_id,
-        Document.owner_id == current_user.id
+        Document.owner_id == current_user.id,
+        Document.deleted_at.is_(None)
     ).first()
     
     if not document:
@@ -217,21 +297,40 @@ async def verify_document(
             detail="Document not found"
         )
     
-    # Verify file hash
-    current_hash = file_service.calculate_file_hash(document.file_path)
+    if document.file_hash is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Document is still being processed"
+        )
+    
+    # Verify file hash, fetching the file back from IPFS if it was evicted
+    try:
+        file_path = await tiered_storage.ensure_local(document)
+    except ContentUnavailableError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Content temporarily unavailable",
+            headers={"Retry-After": "30"}
+        )
+    # Off the loop: hashing reads the whole file, over the network for object storage
+    current_hash = await run_in_threadpool(file_service.calculate_file_hash, file_path)
     is_valid = current_hash == document.file_hash
     
     # Create verification record
-    verification = Verification(
+    audit_log.record(db, Verification(
         document_id=document.id,
         user_id=current_user.id,
         verification_type="verify",
         status="success" if is_valid else "failed",
         verification_metadata=f'{{"hash_match": {is_valid}}}'
-    )
+    ))
     
-    db.add(verification)
-    db.commit()
+    event_bus.publish(current_user.id, {
+        "type": "verification",
+        "document_id": document_id,
+        "is_valid": is_valid,
+        "verification_status": "success" if is_valid else "failed",
+    })
     
     return {
         "document_id": document_id,
@@ -0,0 +1,59 @@
+"""
+Push event stream routes (Server-Sent Events)
+"""
+
+import asyncio
+import json
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from core.config import settings
+from core.events import event_bus
+from core.security import authenticate_stream_token
+
+router = APIRouter()
+optional_bearer = HTTPBearer(auto_error=False)
+
+RECONNECT_MILLISECONDS = 5000
+
+
+@router.get("")
+async def stream_events(
+    request: Request,
+    document_id: Optional[List[int]] = Query(None),
+    token: Optional[str] = Query(None, description="Access token, for clients such as EventSource that cannot send headers"),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer)
+):
+    """Stream the user's pipeline progress and verification results as they happen"""
+    token = credentials.credentials if credentials else token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user = await authenticate_stream_token(token)
+    subscription = event_bus.subscribe(user.id, document_id)
+    
+    async def events():
+        try:
+            # Events are not replayed, so a reconnecting client should re-read current state
+            yield f"retry: {RECONNECT_MILLISECONDS}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), settings.EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"  # Keeps idle connections open through proxies
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
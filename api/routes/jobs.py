@@ -0,0 +1,80 @@
+"""
+Background job status routes
+"""
+
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from core.database import get_db, User, UploadJob
+from core.security import get_current_active_user
+from services.pipeline_service import pipeline
+
+router = APIRouter()
+
+
+class JobResponse(BaseModel):
+    """Upload pipeline job status model"""
+    id: int
+    document_id: int
+    stage: str
+    status: str
+    attempts: int
+    last_error: Optional[str]
+    stages: List[str]
+    completed_stages: List[str]
+    progress: float
+    created_at: datetime
+    updated_at: Optional[datetime]
+
+
+def _job_response(job: UploadJob) -> JobResponse:
+    """Build the status payload for a job"""
+    return JobResponse(
+        id=job.id,
+        document_id=job.document_id,
+        stage=job.stage,
+        status=job.status,
+        attempts=job.attempts,
+        last_error=job.last_error,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+        **pipeline.get_progress(job)
+    )
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job_status(
+    job_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get the progress of an upload post-processing job"""
+    job = db.query(UploadJob).filter(
+        UploadJob.id == job_id,
+        UploadJob.user_id == current_user.id
+    ).first()
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    
+    return _job_response(job)
+
+
+@router.get("/document/{document_id}", response_model=List[JobResponse])
+async def get_document_jobs(
+    document_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get the pipeline jobs for a document, newest first"""
+    jobs = db.query(UploadJob).filter(
+        UploadJob.document_id == document_id,
+        UploadJob.user_id == current_user.id
+    ).order_by(UploadJob.id.desc()).all()
+    
+    return [_job_response(job) for job in jobs]
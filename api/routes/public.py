@@ -0,0 +1,95 @@
+"""
+Public (unauthenticated) verification routes
+"""
+
+import hashlib
+import re
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from core.config import settings
+from core.rate_limit import limit_public_requests
+from core.responses import Serializer
+from core.response_cache import etag_matches
+from core.metrics import CACHE_REQUESTS
+from services.content_index_service import content_index
+from services.file_service import FileService
+
+router = APIRouter()
+file_service = FileService()
+
+SHA256_PATTERN = re.compile(r"^[0-9a-fA-F]{64}$")
+
+
+class PublicVerificationResponse(BaseModel):
+    """Public verification response model"""
+    file_hash: str
+    registered: bool
+    first_registered_at: Optional[datetime]
+    anchored: bool
+    blockchain_tx_hash: Optional[str]
+
+
+public_verification_serializer = Serializer(PublicVerificationResponse)
+
+
+def _cacheable_response(request: Request, result: dict, headers: Optional[dict] = None) -> Response:
+    """Render a result with shared-cache headers, or 304 when the client already has it"""
+    body = public_verification_serializer.dumps(result)
+    etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+    
+    # Anchored answers are final; anything else may change once the index or pipeline catches up
+    max_age = settings.PUBLIC_VERIFY_CACHE_SECONDS
+    if not result["anchored"]:
+        max_age = min(max_age, settings.CONTENT_INDEX_REFRESH_SECONDS)
+    cache_headers = {**(headers or {}), "ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        CACHE_REQUESTS.labels("public_verify", "not_modified").inc()
+        return Response(status_code=304, headers=cache_headers)
+    return Response(content=body, media_type="application/json", headers=cache_headers)
+
+
+@router.get(
+    "/verify/{file_hash}",
+    response_model=PublicVerificationResponse,
+    dependencies=[Depends(limit_public_requests("public_verify"))]
+)
+async def verify_hash(file_hash: str, request: Request):
+    """Check whether content with this SHA-256 has been registered and anchored"""
+    if not SHA256_PATTERN.match(file_hash):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a hex-encoded SHA-256 digest"
+        )
+    
+    file_hash = file_hash.lower()
+    if content_index.might_contain(file_hash):
+        result = await run_in_threadpool(content_index.find, file_hash)
+    else:
+        result = content_index.not_registered(file_hash)  # Answered from memory
+    return _cacheable_response(request, result)
+
+
+@router.post(
+    "/verify",
+    response_model=PublicVerificationResponse,
+    dependencies=[Depends(limit_public_requests("public_verify_upload"))]
+)
+async def verify_file(request: Request, file: UploadFile = File(...)):
+    """Hash an uploaded file (not stored) and check whether its content has been registered"""
+    if file.size is not None and file.size > settings.MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="File too large"
+        )
+    
+    file_hash = await run_in_threadpool(file_service.calculate_stream_hash, file.file, 1024 * 1024)
+    result = await run_in_threadpool(content_index.lookup, file_hash)
+    
+    # Point clients and caches at the cacheable GET form of this answer
+    return _cacheable_response(request, result, headers={
+        "Content-Location": str(request.url_for("verify_hash", file_hash=file_hash).path),
+    })
@@ -2,12 +2,16 @@
 User management routes
 """
 
+from datetime import datetime
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from core.database import get_db, User
-from core.security import get_current_active_user, get_password_hash, verify_password
+from core.security import (
+    get_current_active_user, get_password_hash_async, verify_password_async, invalidate_user_cache
+)
+from services.deletion_service import deletion_service
 
 router = APIRouter()
 
@@ -33,7 +37,7 @@ class UserResponse(BaseModel):
     full_name: Optional[str]
     is_active: bool
     is_verified: bool
-    created_at: str
+    created_at: datetime
 
     class Config:
         from_attributes = True
@@ -78,6 +82,7 @@ async def update_user_profile(
         current_user.username = user_data.username
     
     db.commit()
+    invalidate_user_cache(current_user.id)
     db.refresh(current_user)
     
     return current_user
@@ -91,15 +96,16 @@ async def change_password(
 ):
     """Change user password"""
     # Verify current password
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not await verify_password_async(password_data.current_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
     # Update password
-    current_user.hashed_password = get_password_hash(password_data.new_password)
+    current_user.hashed_password = await get_password_hash_async(password_data.new_password)
     db.commit()
+    invalidate_user_cache(current_user.id)
     
     return {"message": "Password changed successfully"}
 
@@ -110,8 +116,10 @@ async def delete_account(
     db: Session = Depends(get_db)
 ):
     """Delete user account"""
-    # Deactivate user instead of deleting
+    # Deactivate user instead of deleting; their documents are reaped in the background
     current_user.is_active = False
+    deletion_service.tombstone(db, current_user.id)
     db.commit()
+    invalidate_user_cache(current_user.id)
     
     return {"message": "Account deactivated successfully"} 
\ No newline at end of file
@@ -2,16 +2,24 @@
 Verification routes
 """
 
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from core.database import get_db, User, Verification, Document
+from core.database import get_db, get_read_db, User, Verification, Document
 from core.security import get_current_active_user
+from core.rate_limit import limit_requests
+from core.pagination import paginate_keyset, NEXT_CURSOR_HEADER
+from core.responses import Serializer, DefaultJSONResponse
+from core.response_cache import response_cache
 from services.blockchain_service import BlockchainService
+from services.stats_service import StatsService
+from services.audit_service import audit_log
 
 router = APIRouter()
 blockchain_service = BlockchainService()
+stats_service = StatsService()
 
 
 class VerificationResponse(BaseModel):
@@ -23,7 +31,7 @@ class VerificationResponse(BaseModel):
     blockchain_tx_hash: Optional[str]
     ipfs_hash: Optional[str]
     verification_metadata: Optional[str]
-    created_at: str
+    created_at: datetime
 
     class Config:
         from_attributes = True
@@ -32,58 +40,79 @@ class VerificationResponse(BaseModel):
 class VerificationHistoryResponse(BaseModel):
     """Verification history response model"""
     verifications: List[VerificationResponse]
-    total_count: int
+    total_count: Optional[int]
+    next_cursor: Optional[str] = None
+
+
+verification_list_serializer = Serializer(List[VerificationResponse])
+verification_history_serializer = Serializer(VerificationHistoryResponse)
 
 
 @router.get("/history", response_model=VerificationHistoryResponse)
 async def get_verification_history(
+    request: Request,
+    cursor: Optional[str] = None,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
+    include_total: bool = True,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Get user's verification history"""
-    verifications = db.query(Verification).filter(
-        Verification.user_id == current_user.id
-    ).order_by(Verification.created_at.desc()).offset(skip).limit(limit).all()
-    
-    total_count = db.query(Verification).filter(
-        Verification.user_id == current_user.id
-    ).count()
+    """Get user's verification history, newest first"""
+    def build():
+        query = db.query(Verification).filter(Verification.user_id == current_user.id)
+        verifications, next_cursor = paginate_keyset(query, Verification, cursor, limit, skip)
+        
+        # Total comes from the maintained counters instead of a COUNT(*) per page
+        total_count = None
+        if include_total:
+            total_count = stats_service.get_user_stats(db, current_user.id)["total_verifications"]
+        
+        return verification_history_serializer.response({
+            "verifications": verifications,
+            "total_count": total_count,
+            "next_cursor": next_cursor
+        })
     
-    return VerificationHistoryResponse(
-        verifications=verifications,
-        total_count=total_count
-    )
+    version = stats_service.get_version(db, current_user.id)
+    return response_cache.respond(request, current_user.id, version, build)
 
 
 @router.get("/document/{document_id}", response_model=List[VerificationResponse])
 async def get_document_verification_history(
     document_id: int,
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get verification history for a specific document"""
-    # Check if user owns the document
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.owner_id == current_user.id
-    ).first()
-    
-    if not document:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Document not found"
-        )
-    
-    verifications = db.query(Verification).filter(
-        Verification.document_id == document_id
-    ).order_by(Verification.created_at.desc()).all()
+    def build():
+        # Check if user owns the document
+        document = db.query(Document).filter(
+            Document.id == document_id,
+            Document.owner_id == current_user.id,
+            Document.deleted_at.is_(None)
+        ).first()
+        
+        if not document:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found"
+            )
+        
+        query = db.query(Verification).filter(Verification.document_id == document_id)
+        verifications, next_cursor = paginate_keyset(query, Verification, cursor, limit)
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+        
+        return verification_list_serializer.response(verifications, headers=headers)
     
-    return verifications
+    version = stats_service.get_version(db, current_user.id)
+    return response_cache.respond(request, current_user.id, version, build)
 
 
-@router.post("/verify-blockchain/{document_id}")
+@router.post("/verify-blockchain/{document_id}", dependencies=[Depends(limit_requests("chain_verify"))])
 async def verify_document_on_blockchain(
     document_id: int,
     current_user: User = Depends(get_current_active_user),
@@ -92,7 +121,8 @@ async def verify_document_on_blockchain(
     """Verify document authenticity on blockchain"""
     document = db.query(Document).filter(
         Document.id == document_id,
-        Document.owner_id == current_user.id
+        Document.owner_id == current_user.id,
+        Document.deleted_at.is_(None)
     ).first()
     
     if not document:
@@ -115,17 +145,14 @@ async def verify_document_on_blockchain(
         )
         
         # Create verification record
-        verification = Verification(
+        audit_log.record(db, Verification(
             document_id=document.id,
             user_id=current_user.id,
             verification_type="blockchain_verify",
             status="success" if is_valid else "failed",
             blockchain_tx_hash=document.blockchain_tx_hash,
             verification_metadata=f'{{"blockchain_verified": {is_valid}}}'
-        )
-        
-        db.add(verification)
-        db.commit()
+        ))
         
         return {
             "document_id": document_id,
@@ -136,17 +163,14 @@ async def verify_document_on_blockchain(
         
     except Exception as e:
         # Create failed verification record
-        verification = Verification(
+        audit_log.record(db, Verification(
             document_id=document.id,
             user_id=current_user.id,
             verification_type="blockchain_verify",
             status="failed",
             blockchain_tx_hash=document.blockchain_tx_hash,
             verification_metadata=f'{{"error": "{str(e)}"}}'
-        )
-        
-        db.add(verification)
-        db.commit()
+        ))
         
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -156,39 +180,14 @@ async def verify_document_on_blockchain(
 
 @router.get("/stats")
 async def get_verification_stats(
+    request: Request,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get verification statistics for the user"""
-    total_verifications = db.query(Verification).filter(
-        Verification.user_id == current_user.id
-    ).count()
-    
-    successful_verifications = db.query(Verification).filter(
-        Verification.user_id == current_user.id,
-        Verification.status == "success"
-    ).count()
-    
-    failed_verifications = db.query(Verification).filter(
-        Verification.user_id == current_user.id,
-        Verification.status == "failed"
-    ).count()
-    
-    total_documents = db.query(Document).filter(
-        Document.owner_id == current_user.id
-    ).count()
-    
-    verified_documents = db.query(Document).filter(
-        Document.owner_id == current_user.id,
-        Document.is_verified == True
-    ).count()
+    def build():
+        counters = stats_service.get_user_stats(db, current_user.id)
+        return DefaultJSONResponse(stats_service.format_stats(counters))
     
-    return {
-        "total_verifications": total_verifications,
-        "successful_verifications": successful_verifications,
-        "failed_verifications": failed_verifications,
-        "success_rate": (successful_verifications / total_verifications * 100) if total_verifications > 0 else 0,
-        "total_documents": total_documents,
-        "verified_documents": verified_documents,
-        "verification_coverage": (verified_documents / total_documents * 100) if total_documents > 0 else 0
-    } 
\ No newline at end of file
+    version = stats_service.get_version(db, current_user.id)
+    return response_cache.respond(request, current_user.id, version, build)
\ No newline at end of file
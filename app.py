@@ -5,37 +5,108 @@ Backend API Server
 """
 
 import os
+import sys
+import asyncio
 import argparse
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
 import uvicorn
 from dotenv import load_dotenv
 
-from api.routes import auth, documents, users, verification
+from api.routes import auth, documents, users, verification, jobs, public, events
 from core.config import settings
-from core.database import engine, Base
-from core.security import get_current_user
+from core.migrations import run_migrations
+from core.pagination import NEXT_CURSOR_HEADER
+from core.cache import invalidation_bus
+from core.events import event_bus
+from core.responses import DefaultJSONResponse
+from core.metrics import MetricsMiddleware, render_metrics, mark_process_dead
+from core.tracing import TracingMiddleware, configure_tracing, shutdown_tracing
+from core.security import get_current_user, password_pool
+from services.stats_service import reconcile_all
+from services.audit_service import audit_log
+from services.pipeline_service import pipeline_executor
+from services.content_index_service import content_index
+from services.deletion_service import deletion_service
+from services.storage_backend import s3_backend
+from services.storage_service import tiered_storage
+from services.verification_service import bulk_verifier
 
 # Load environment variables
 load_dotenv()
 
+
+async def reconcile_stats_periodically(interval: int):
+    """Periodically repair drift in the per-user statistics counters"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            fixed = await asyncio.to_thread(reconcile_all)
+            if fixed:
+                print(f"🔧 Reconciled stats for {fixed} users")
+        except Exception as e:
+            print(f"Stats reconciliation failed: {e}")
+
+
+async def reap_tombstones_periodically(interval: int):
+    """Periodically reclaim the storage of deleted documents"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            reaped = await asyncio.to_thread(deletion_service.reap_all)
+            if reaped:
+                print(f"🧹 Reaped {reaped} deleted documents")
+        except Exception as e:
+            print(f"Tombstone reaping failed: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
     print("🚀 Starting Digital Shadow API Server...")
     
-    # Create database tables
-    Base.metadata.create_all(bind=engine)
-    print("✅ Database tables created")
+    # Schema is managed by migrations, applied once before workers start
+    
+    configure_tracing()
+    await audit_log.start()
+    invalidation_bus.start()
+    event_bus.start()
+    await pipeline_executor.start()
+    await content_index.start()
+    await tiered_storage.start()
+    
+    background_tasks = []
+    if settings.STATS_RECONCILE_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(
+            reconcile_stats_periodically(settings.STATS_RECONCILE_INTERVAL_SECONDS)
+        ))
+    if settings.DELETION_REAP_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(
+            reap_tombstones_periodically(settings.DELETION_REAP_INTERVAL_SECONDS)
+        ))
     
     yield
     
     # Shutdown
     print("🛑 Shutting down Digital Shadow API Server...")
+    for task in background_tasks:
+        task.cancel()
+    await content_index.stop()
+    await tiered_storage.stop()
+    await pipeline_executor.stop()
+    
+    # Drain queued audit records before the worker exits
+    await audit_log.stop()
+    invalidation_bus.stop()
+    event_bus.stop()
+    password_pool.shutdown()
+    bulk_verifier.shutdown()
+    s3_backend.shutdown()
+    shutdown_tracing()
+    mark_process_dead()
 
 def create_app() -> FastAPI:
     """Create and configure the FastAPI application"""
@@ -46,6 +117,7 @@ def create_app() -> FastAPI:
         version="1.0.0",
         docs_url="/api/docs",
         redoc_url="/api/redoc",
+        default_response_class=DefaultJSONResponse,
         lifespan=lifespan
     )
     
@@ -56,19 +128,43 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
     )
     
+    if settings.METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware)
+    if settings.TRACING_ENABLED:
+        app.add_middleware(TracingMiddleware)
+    
+    # Profiling is opt-in; when disabled neither the middleware nor the routes exist
+    if settings.PROFILING_ENABLED:
+        from api.routes import admin
+        from core.profiling import ProfilingMiddleware
+        app.add_middleware(ProfilingMiddleware)
+    
     # Include API routes
     app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
     app.include_router(users.router, prefix="/api/users", tags=["Users"])
     app.include_router(documents.router, prefix="/api/documents", tags=["Documents"])
     app.include_router(verification.router, prefix="/api/verification", tags=["Verification"])
+    app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
+    app.include_router(public.router, prefix="/api/public", tags=["Public"])
+    app.include_router(events.router, prefix="/api/events", tags=["Events"])
+    if settings.PROFILING_ENABLED:
+        app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
     
     # Health check endpoint
     @app.get("/api/health")
     async def health_check():
         return {"status": "healthy", "service": "Digital Shadow API"}
     
+    # Prometheus metrics, aggregated across workers
+    if settings.METRICS_ENABLED:
+        @app.get("/metrics", include_in_schema=False)
+        async def metrics():
+            body, content_type = render_metrics()
+            return Response(content=body, media_type=content_type)
+    
     # Root endpoint
     @app.get("/")
     async def root():
@@ -88,24 +184,30 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, default=8000, help="Port to bind to")
     parser.add_argument("--reload", action="store_true", help="Enable auto-reload")
     parser.add_argument("--production", action="store_true", help="Run in production mode")
+    parser.add_argument("--migrate", action="store_true", help="Apply database migrations and exit")
+    parser.add_argument("--skip-migrations", action="store_true", help="Do not apply migrations on launch")
     
     args = parser.parse_args()
     
     if args.production:
-        # Production settings
-        uvicorn.run(
-            "app:app",
-            host=args.host,
-            port=args.port,
-            workers=4,
-            log_level="info"
-        )
-    else:
-        # Development settings
-        uvicorn.run(
-            "app:app",
-            host=args.host,
-            port=args.port,
-            reload=args.reload,
-            log_level="debug"
-        ) 
\ No newline at end of file
+        # Hand over to the production launcher in a fresh interpreter, so metrics
+        # and the app are loaded once in multiprocess mode and inherited by workers
+        launcher = [sys.executable, "-m", "core.server", "--host", args.host, "--port", str(args.port)]
+        if args.skip_migrations:
+            launcher.append("--skip-migrations")
+        os.execv(sys.executable, launcher)
+    
+    # Apply migrations once in the launcher process, before any worker starts
+    if args.migrate or not args.skip_migrations:
+        run_migrations()
+    if args.migrate:
+        raise SystemExit(0)
+    
+    # Development settings
+    uvicorn.run(
+        "app:app",
+        host=args.host,
+        port=args.port,
+        reload=args.reload,
+        log_level="debug"
+    ) 
\ No newline at end of file
@@ -0,0 +1,481 @@
+"""
+Local stand-ins for the IPFS HTTP API, an Ethereum JSON-RPC node and S3
+
+All run on stdlib HTTP servers in background threads and add configurable
+latency, so load tests exercise the real client libraries without external
+services. They can also be started on their own:
+    
+    python -m benchmarks.fakes --ipfs-port 5001 --rpc-port 8545 --rpc-latency-ms 20 --s3-port 9000
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import re
+import tarfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+# Well-known development key (Hardhat/Anvil account #0); never holds real funds
+FAKE_PRIVATE_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+FAKE_ACCOUNT = "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"
+FAKE_CONTRACT = "0x0000000000000000000000000000000000000001"
+CHAIN_ID = 1337
+S3_XMLNS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+class FakeServer:
+    """Threaded HTTP server with a latency knob shared by its handler"""
+    
+    def __init__(self, handler_class, port: int = 0, latency: float = 0.0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler_class)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self.latency = latency
+        self._thread = None
+    
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+    
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """Shut the server down"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Common request plumbing"""
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";", 1)[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+    
+    def _send(self, payload: bytes, content_type: str = "application/json", status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def _send_json(self, value, status: int = 200):
+        self._send(json.dumps(value).encode(), status=status)
+    
+    def _delay(self):
+        if self.server.fake.latency:
+            time.sleep(self.server.fake.latency)
+
+
+class FakeIPFSServer(FakeServer):
+    """Content-addressed in-memory store speaking the subset of /api/v0 the app uses"""
+    
+    def __init__(self, port: int = 0, latency: float = 0.0):
+        super().__init__(IPFSHandler, port, latency)
+        self.blobs = {}
+        self.pins = set()
+        self.lock = threading.Lock()
+    
+    @property
+    def multiaddr(self) -> str:
+        return f"/ip4/127.0.0.1/tcp/{self.port}/http"
+
+
+def _multipart_files(body: bytes, content_type: str):
+    """Yield (filename, content) for each part of a multipart body"""
+    boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+    for part in body.split(b"--" + boundary):
+        if b"\r\n\r\n" not in part:
+            continue
+        head, content = part.split(b"\r\n\r\n", 1)
+        if content.endswith(b"\r\n"):
+            content = content[:-2]
+        filename = "file"
+        for line in head.decode(errors="replace").split("\r\n"):
+            if "filename=" in line:
+                filename = line.split("filename=", 1)[1].split(";")[0].strip('"')
+        yield filename, content
+
+
+class IPFSHandler(_Handler):
+    """Handle /api/v0 calls made by ipfshttpclient"""
+    
+    def do_POST(self):
+        url = urlparse(self.path)
+        args = parse_qs(url.query).get("arg", [])
+        body = self._body()
+        fake = self.server.fake
+        self._delay()
+        
+        if url.path == "/api/v0/version":
+            self._send_json({"Version": "0.8.0", "Commit": "", "Repo": "10", "System": "fake", "Golang": ""})
+        elif url.path == "/api/v0/id":
+            self._send_json({"ID": "fake-ipfs", "Addresses": [], "ProtocolVersion": "ipfs/0.1.0", "AgentVersion": "fake"})
+        elif url.path == "/api/v0/add":
+            lines = []
+            for filename, content in _multipart_files(body, self.headers.get("Content-Type", "")):
+                cid = "bafk" + hashlib.sha256(content).hexdigest()[:52]
+                with fake.lock:
+                    fake.blobs[cid] = content
+                lines.append(json.dumps({"Name": filename, "Hash": cid, "Size": str(len(content))}))
+            self._send(("\n".join(lines) + "\n").encode())
+        elif url.path in ("/api/v0/pin/add", "/api/v0/pin/rm"):
+            with fake.lock:
+                if url.path.endswith("add"):
+                    fake.pins.update(args)
+                else:
+                    fake.pins.difference_update(args)
+            self._send_json({"Pins": args})
+        elif url.path in ("/api/v0/cat", "/api/v0/get"):
+            content = fake.blobs.get(args[0] if args else "")
+            if content is None:
+                self._send_json({"Message": "not found", "Code": 0, "Type": "error"}, status=500)
+            elif url.path.endswith("cat"):
+                self._send(content, "application/octet-stream")
+            else:
+                archive = io.BytesIO()
+                with tarfile.open(fileobj=archive, mode="w") as tar:
+                    info = tarfile.TarInfo(args[0])
+                    info.size = len(content)
+                    tar.addfile(info, io.BytesIO(content))
+                self._send(archive.getvalue(), "application/x-tar")
+        elif url.path == "/api/v0/files/stat":
+            cid = args[0].rsplit("/", 1)[-1] if args else ""
+            content = fake.blobs.get(cid, b"")
+            self._send_json({"Hash": cid, "Size": len(content), "CumulativeSize": len(content), "Type": "file"})
+        else:
+            self._send_json({"Message": f"unsupported: {url.path}", "Code": 0, "Type": "error"}, status=404)
+
+
+class FakeChainServer(FakeServer):
+    """JSON-RPC node that mines every transaction after a fixed delay"""
+    
+    def __init__(self, port: int = 0, latency: float = 0.0, confirm_seconds: float = 1.0):
+        super().__init__(ChainHandler, port, latency)
+        self.confirm_seconds = confirm_seconds
+        self.started = time.monotonic()
+        self.seen = {}
+        self.nonce = 0
+        self.lock = threading.Lock()
+    
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+    
+    def block_number(self) -> int:
+        return int((time.monotonic() - self.started) / max(self.confirm_seconds, 0.001)) + 1
+    
+    def receipt(self, tx_hash: str):
+        """Receipt once the transaction has been 'mined', None before that"""
+        with self.lock:
+            first_seen = self.seen.setdefault(tx_hash, time.monotonic())
+        if time.monotonic() - first_seen < self.confirm_seconds:
+            return None
+        return {
+            "transactionHash": tx_hash,
+            "transactionIndex": "0x0",
+            "blockHash": "0x" + hashlib.sha256(tx_hash.encode()).hexdigest(),
+            "blockNumber": hex(self.block_number()),
+            "from": FAKE_ACCOUNT,
+            "to": FAKE_CONTRACT,
+            "cumulativeGasUsed": "0x5208",
+            "gasUsed": "0x5208",
+            "effectiveGasPrice": "0x3b9aca00",
+            "contractAddress": None,
+            "logs": [],
+            "logsBloom": "0x" + "00" * 256,
+            "status": "0x1",
+            "type": "0x0",
+        }
+    
+    def handle(self, method: str, params: list):
+        """Result for one JSON-RPC call"""
+        if method == "web3_clientVersion":
+            return "FakeChain/v1"
+        if method == "eth_chainId":
+            return hex(CHAIN_ID)
+        if method == "net_version":
+            return str(CHAIN_ID)
+        if method == "eth_accounts":
+            return [FAKE_ACCOUNT]
+        if method == "eth_gasPrice":
+            return "0x3b9aca00"
+        if method == "eth_estimateGas":
+            return "0x30d40"
+        if method == "eth_blockNumber":
+            return hex(self.block_number())
+        if method == "eth_getTransactionCount":
+            with self.lock:
+                self.nonce += 1
+                return hex(self.nonce)
+        if method == "eth_getBlockByNumber":
+            number = self.block_number()
+            return {
+                "number": hex(number),
+                "hash": "0x" + hashlib.sha256(str(number).encode()).hexdigest(),
+                "parentHash": "0x" + "00" * 32,
+                "timestamp": hex(int(time.time())),
+                "gasLimit": "0x1c9c380",
+                "gasUsed": "0x0",
+                "baseFeePerGas": "0x3b9aca00",
+                "miner": FAKE_ACCOUNT,
+                "transactions": [],
+            }
+        if method == "eth_sendRawTransaction":
+            raw = params[0] if isinstance(params[0], str) else "0x" + bytes(params[0]).hex()
+            return "0x" + hashlib.sha256(raw.encode()).hexdigest()
+        if method == "eth_getTransactionReceipt":
+            return self.receipt(params[0])
+        if method == "eth_call":
+            # Every ABI-encoded bool answer is True
+            return "0x" + "0" * 63 + "1"
+        raise KeyError(method)
+
+
+class ChainHandler(_Handler):
+    """Dispatch JSON-RPC requests (single or batched)"""
+    
+    def do_POST(self):
+        payload = json.loads(self._body() or b"{}")
+        self._delay()
+        if isinstance(payload, list):
+            self._send_json([self._call(item) for item in payload])
+        else:
+            self._send_json(self._call(payload))
+    
+    def _call(self, request: dict) -> dict:
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            response["result"] = self.server.fake.handle(request.get("method"), request.get("params") or [])
+        except KeyError:
+            response["error"] = {"code": -32601, "message": f"Method not found: {request.get('method')}"}
+        return response
+
+
+class FakeS3Server(FakeServer):
+    """In-memory, path-style S3 (the MinIO subset the storage backend uses), tracking peak concurrency"""
+    
+    def __init__(self, port: int = 0, latency: float = 0.0):
+        super().__init__(S3Handler, port, latency)
+        self.objects = {}  # (bucket, key) -> bytes
+        self.uploads = {}  # upload id -> (bucket, key, {part number: bytes})
+        self.buckets = set()
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+    
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+
+def _xml(root: str, body: str) -> bytes:
+    return f'<?xml version="1.0" encoding="UTF-8"?><{root} xmlns="{S3_XMLNS}">{body}</{root}>'.encode()
+
+
+class S3Handler(_Handler):
+    """Object, multipart and batch-delete calls made by botocore"""
+    
+    # HTTP/1.1 so botocore's Expect: 100-continue is answered instead of timing out
+    protocol_version = "HTTP/1.1"
+    
+    def _route(self):
+        url = urlparse(self.path)
+        bucket, _, key = unquote(url.path).lstrip("/").partition("/")
+        return bucket, key, parse_qs(url.query, keep_blank_values=True)
+    
+    def _error(self, status: int, code: str, with_body: bool = True):
+        payload = _xml("Error", f"<Code>{code}</Code><Message>{code}</Message>") if with_body else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def _empty(self, status: int = 200, headers: dict = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+    
+    def _track(self, handler):
+        fake = self.server.fake
+        with fake.lock:
+            fake.requests += 1
+            fake.in_flight += 1
+            fake.peak_in_flight = max(fake.peak_in_flight, fake.in_flight)
+        try:
+            self._delay()
+            handler()
+        finally:
+            with fake.lock:
+                fake.in_flight -= 1
+    
+    def do_HEAD(self):
+        self._track(lambda: self._get(head=True))
+    
+    def do_GET(self):
+        self._track(self._get)
+    
+    def do_PUT(self):
+        self._track(self._put)
+    
+    def do_POST(self):
+        self._track(self._post)
+    
+    def do_DELETE(self):
+        self._track(self._delete)
+    
+    def _get(self, head: bool = False):
+        bucket, key, _ = self._route()
+        content = self.server.fake.objects.get((bucket, key))
+        if content is None:
+            return self._error(404, "NoSuchKey", with_body=not head)
+        
+        start, end, status = 0, len(content) - 1, 200
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if match and not head:
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), end) if match.group(2) else end
+            else:
+                start = max(0, len(content) - int(match.group(2)))
+            if start >= len(content):
+                return self._error(416, "InvalidRange")
+            status = 206
+        
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", f'"{hashlib.md5(content).hexdigest()}"')
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(content)}")
+        self.end_headers()
+        if not head:
+            self.wfile.write(content[start:end + 1])
+    
+    def _put(self):
+        bucket, key, query = self._route()
+        body = self._body()
+        fake = self.server.fake
+        if not key:
+            with fake.lock:
+                fake.buckets.add(bucket)
+            return self._empty()
+        
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if "uploadId" in query:
+            upload = fake.uploads.get(query["uploadId"][0])
+            if upload is None:
+                return self._error(404, "NoSuchUpload")
+            with fake.lock:
+                upload[2][int(query["partNumber"][0])] = body
+        else:
+            with fake.lock:
+                fake.objects[(bucket, key)] = body
+        self._empty(headers={"ETag": etag})
+    
+    def _post(self):
+        bucket, key, query = self._route()
+        body = self._body()
+        fake = self.server.fake
+        
+        if "delete" in query:
+            keys = [unquote(k) for k in re.findall(r"<Key>(.*?)</Key>", body.decode())]
+            with fake.lock:
+                for k in keys:
+                    fake.objects.pop((bucket, k), None)
+            deleted = "".join(f"<Deleted><Key>{k}</Key></Deleted>" for k in keys) if b"<Quiet>true</Quiet>" not in body else ""
+            return self._send(_xml("DeleteResult", deleted), "application/xml")
+        
+        if "uploads" in query:
+            upload_id = hashlib.sha256(f"{bucket}/{key}/{time.monotonic_ns()}".encode()).hexdigest()[:32]
+            with fake.lock:
+                fake.uploads[upload_id] = (bucket, key, {})
+            return self._send(_xml(
+                "InitiateMultipartUploadResult",
+                f"<Bucket>{bucket}</Bucket><Key>{key}</Key><UploadId>{upload_id}</UploadId>"
+            ), "application/xml")
+        
+        if "uploadId" in query:
+            with fake.lock:
+                upload = fake.uploads.pop(query["uploadId"][0], None)
+            if upload is None:
+                return self._error(404, "NoSuchUpload")
+            numbers = [int(n) for n in re.findall(r"<PartNumber>(\d+)</PartNumber>", body.decode())]
+            content = b"".join(upload[2][n] for n in numbers)
+            with fake.lock:
+                fake.objects[(bucket, key)] = content
+            return self._send(_xml(
+                "CompleteMultipartUploadResult",
+                f"<Bucket>{bucket}</Bucket><Key>{key}</Key><ETag>\"{hashlib.md5(content).hexdigest()}-{len(numbers)}\"</ETag>"
+            ), "application/xml")
+        
+        self._error(400, "InvalidRequest")
+    
+    def _delete(self):
+        bucket, key, query = self._route()
+        fake = self.server.fake
+        with fake.lock:
+            if "uploadId" in query:
+                fake.uploads.pop(query["uploadId"][0], None)
+            else:
+                fake.objects.pop((bucket, key), None)
+        self._empty(204)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run fake IPFS, Ethereum and S3 services")
+    parser.add_argument("--ipfs-port", type=int, default=5001)
+    parser.add_argument("--rpc-port", type=int, default=8545)
+    parser.add_argument("--ipfs-latency-ms", type=float, default=0)
+    parser.add_argument("--rpc-latency-ms", type=float, default=0)
+    parser.add_argument("--confirm-seconds", type=float, default=1.0)
+    parser.add_argument("--s3-port", type=int, default=0, help="Also serve S3 on this port")
+    parser.add_argument("--s3-latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    
+    ipfs = FakeIPFSServer(args.ipfs_port, args.ipfs_latency_ms / 1000).start()
+    chain = FakeChainServer(args.rpc_port, args.rpc_latency_ms / 1000, args.confirm_seconds).start()
+    print(f"IPFS_NODE_URL={ipfs.multiaddr}")
+    print(f"ETHEREUM_RPC_URL={chain.url}")
+    print(f"CONTRACT_ADDRESS={FAKE_CONTRACT}")
+    print(f"PRIVATE_KEY={FAKE_PRIVATE_KEY}")
+    s3 = None
+    if args.s3_port:
+        s3 = FakeS3Server(args.s3_port, args.s3_latency_ms / 1000).start()
+        print(f"S3_ENDPOINT_URL={s3.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        ipfs.stop()
+        chain.stop()
+        if s3 is not None:
+            s3.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test against a locally launched API server
+
+Starts fake IPFS and Ethereum services, migrates a scratch database,
+launches uvicorn and drives a weighted mix of register, login, upload,
+list, verify and blockchain-verify calls from concurrent virtual users.
+Reports throughput and p50/p95/p99 latency per endpoint as JSON.
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.load_test --users 50 --duration 60 --output results.json
+    python -m benchmarks.load_test --database-url postgresql://bench@localhost/bench
+
+Use --base-url to target a server that is already running; the fakes and
+launcher are skipped then.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+import httpx
+from benchmarks.common import environment, summarize, write_results
+from benchmarks.fakes import FAKE_CONTRACT, FAKE_PRIVATE_KEY, FakeChainServer, FakeIPFSServer
+
+DEFAULT_MIX = {
+    "login": 1,
+    "upload": 2,
+    "list": 6,
+    "verify": 4,
+    "verify_blockchain": 2,
+}
+NEEDS_DOCUMENT = ("verify", "verify_blockchain")
+
+
+class Recorder:
+    """Latencies and status codes per endpoint"""
+    
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+    
+    async def call(self, name: str, request) -> Optional[httpx.Response]:
+        """Await a request, recording its latency and outcome"""
+        start = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError as e:
+            self.errors[name][type(e).__name__] += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - start)
+        self.statuses[name][response.status_code] += 1
+        return response
+    
+    def report(self, elapsed: float) -> dict:
+        """Per-endpoint summary"""
+        endpoints = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            summary = summarize(self.latencies[name])
+            summary["throughput_rps"] = len(self.latencies[name]) / elapsed if elapsed else 0.0
+            summary["status_codes"] = {str(code): n for code, n in sorted(self.statuses[name].items())}
+            summary["server_errors"] = sum(n for code, n in self.statuses[name].items() if code >= 500)
+            summary["transport_errors"] = dict(self.errors[name])
+            endpoints[name] = summary
+        return endpoints
+
+
+def make_payload(size: int, rng: random.Random) -> bytes:
+    """Random document body of the given size"""
+    return rng.randbytes(size)
+
+
+async def virtual_user(client: httpx.AsyncClient, index: int, run_id: str, deadline: float,
+                       mix: Dict[str, float], payload_size: int, recorder: Recorder, seed: int):
+    """One simulated user: register, then loop over the weighted mix until the deadline"""
+    rng = random.Random(seed + index)
+    email = f"bench-{run_id}-{index}@example.com"
+    password = "bench-password"
+    
+    response = await recorder.call("register", client.post("/api/auth/register", json={
+        "email": email, "username": f"bench_{run_id}_{index}", "password": password, "full_name": "Bench User",
+    }))
+    if response is None or response.status_code != 200:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    
+    documents: List[int] = []
+    operations, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        if operation in NEEDS_DOCUMENT and not documents:
+            operation = "upload"
+        
+        if operation == "login":
+            response = await recorder.call("login", client.post(
+                "/api/auth/login", data={"username": email, "password": password}
+            ))
+            if response is not None and response.status_code == 200:
+                headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        elif operation == "upload":
+            payload = make_payload(payload_size, rng)
+            response = await recorder.call("upload", client.post(
+                "/api/documents/upload",
+                headers=headers,
+                data={"title": f"Bench document {len(documents)}"},
+                files={"file": (f"bench-{index}-{len(documents)}.txt", payload, "text/plain")},
+            ))
+            if response is not None and response.status_code in (200, 202):
+                documents.append(response.json()["document"]["id"])
+        elif operation == "list":
+            await recorder.call("list", client.get("/api/documents/", headers=headers, params={"limit": 50}))
+        elif operation == "verify":
+            await recorder.call("verify", client.post(
+                f"/api/documents/{rng.choice(documents)}/verify", headers=headers
+            ))
+        elif operation == "verify_blockchain":
+            await recorder.call("verify_blockchain", client.post(
+                f"/api/verification/verify-blockchain/{rng.choice(documents)}", headers=headers
+            ))
+
+
+async def run_load(base_url: str, users: int, duration: float, mix: Dict[str, float],
+                   payload_size: int, seed: int) -> dict:
+    """Drive the mix from concurrent users and summarise the results"""
+    recorder = Recorder()
+    run_id = f"{int(time.time())}{random.Random(seed).randrange(1000)}"
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        start = time.monotonic()
+        deadline = start + duration
+        await asyncio.gather(*(
+            virtual_user(client, i, run_id, deadline, mix, payload_size, recorder, seed)
+            for i in range(users)
+        ))
+        elapsed = time.monotonic() - start
+    
+    endpoints = recorder.report(elapsed)
+    total = sum(len(samples) for samples in recorder.latencies.values())
+    return {
+        "elapsed_seconds": elapsed,
+        "total_requests": total,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def wait_for_server(base_url: str, process: subprocess.Popen, timeout: float = 60):
+    """Poll the health endpoint until the server answers"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited with status {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/api/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError("API server did not become healthy in time")
+
+
+def server_environment(args, workdir: str, ipfs: FakeIPFSServer, chain: FakeChainServer) -> dict:
+    """Settings for the launched server: scratch storage, fakes, no rate limiting"""
+    env = dict(os.environ)
+    env.update({
+        "SECRET_KEY": env.get("SECRET_KEY", "load-test-secret"),
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "AUDIT_WAL_DIR": os.path.join(workdir, "audit-wal"),
+        "IPFS_NODE_URL": ipfs.multiaddr,
+        "ETHEREUM_RPC_URL": chain.url,
+        "CONTRACT_ADDRESS": FAKE_CONTRACT,
+        "PRIVATE_KEY": FAKE_PRIVATE_KEY,
+        "WORKERS": str(args.workers),
+        "REDIS_ENABLED": env.get("REDIS_ENABLED", "false"),
+        "RATE_LIMIT_ENABLED": "false",
+    })
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end API load test")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load after registration")
+    parser.add_argument("--payload-size", type=int, default=64 * 1024, help="Bytes per uploaded document")
+    parser.add_argument("--mix", nargs="*", default=[], metavar="OP=WEIGHT",
+                        help=f"Override operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the launched server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--database-url", help="Database to use instead of a scratch SQLite file")
+    parser.add_argument("--ipfs-latency-ms", type=float, default=20)
+    parser.add_argument("--rpc-latency-ms", type=float, default=30)
+    parser.add_argument("--confirm-seconds", type=float, default=2.0, help="Fake block confirmation delay")
+    parser.add_argument("--base-url", help="Target an already running server instead of launching one")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    
+    mix = dict(DEFAULT_MIX)
+    for item in args.mix:
+        name, weight = item.split("=", 1)
+        if name not in DEFAULT_MIX:
+            parser.error(f"Unknown operation {name}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight)
+    
+    config = {
+        "users": args.users,
+        "duration": args.duration,
+        "payload_size": args.payload_size,
+        "mix": mix,
+        "seed": args.seed,
+    }
+    
+    if args.base_url:
+        results = asyncio.run(run_load(args.base_url, args.users, args.duration, mix, args.payload_size, args.seed))
+        write_results({"environment": environment(), "config": config, **results}, args.output)
+        return
+    
+    ipfs = FakeIPFSServer(latency=args.ipfs_latency_ms / 1000).start()
+    chain = FakeChainServer(latency=args.rpc_latency_ms / 1000, confirm_seconds=args.confirm_seconds).start()
+    config.update({
+        "workers": args.workers,
+        "database": "postgresql" if args.database_url and args.database_url.startswith("postgres") else "sqlite",
+        "ipfs_latency_ms": args.ipfs_latency_ms,
+        "rpc_latency_ms": args.rpc_latency_ms,
+        "confirm_seconds": args.confirm_seconds,
+    })
+    
+    with tempfile.TemporaryDirectory(prefix="digital-shadow-bench-") as workdir:
+        env = server_environment(args, workdir, ipfs, chain)
+        subprocess.run([sys.executable, "app.py", "--migrate"], env=env, check=True)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(args.port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            env=env,
+        )
+        base_url = f"http://127.0.0.1:{args.port}"
+        try:
+            wait_for_server(base_url, server)
+            results = asyncio.run(run_load(base_url, args.users, args.duration, mix, args.payload_size, args.seed))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+            ipfs.stop()
+            chain.stop()
+    
+    write_results({"environment": environment(), "config": config, **results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
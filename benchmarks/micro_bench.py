@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for file hashing, file storage, tokens, bcrypt and serialization
+
+Each benchmark is calibrated so one sample lasts at least --min-sample-ms,
+warmed up, then sampled --repeat times. Results report per-operation
+median, IQR and a 95% confidence interval, plus MB/s where bytes are
+processed.
+
+    python -m benchmarks.micro_bench --output baseline.json
+    python -m benchmarks.micro_bench --baseline baseline.json --fail-on-regression
+    python -m benchmarks.micro_bench --only hash --quick
+"""
+
+import os
+
+# Settings need these before any application module is imported
+os.environ.setdefault("SECRET_KEY", "micro-bench-secret")
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, List, Optional
+from fastapi import UploadFile
+from fastapi.encoders import jsonable_encoder
+from benchmarks.common import environment, percentile, write_results
+
+# Service clients report connection status on import; keep stdout for the JSON results
+with contextlib.redirect_stdout(sys.stderr):
+    from core.security import create_access_token, verify_token, pwd_context
+    from services.file_service import FileService
+    from api.routes.documents import DocumentResponse, document_list_serializer
+
+KB = 1024
+MB = 1024 * KB
+HASH_FILE_SIZES = [4 * KB, 1 * MB, 16 * MB]
+HASH_CHUNK_SIZES = [4 * KB, 64 * KB, 1 * MB]
+SAVE_FILE_SIZES = [64 * KB, 4 * MB]
+DOCUMENT_COUNTS = [10, 100, 500]
+
+
+@dataclass
+class Benchmark:
+    """One named operation to time"""
+    name: str
+    fn: Callable[[], object]
+    bytes_per_op: Optional[int] = None
+
+
+def make_documents(count: int) -> list:
+    """Build ORM-like document objects"""
+    now = datetime.now(timezone.utc)
+    return [
+        SimpleNamespace(
+            id=i,
+            title=f"Document {i}",
+            description="Quarterly report with signatures",
+            file_size=1024 * (i + 1),
+            file_type="application/pdf",
+            file_hash="a" * 64,
+            ipfs_hash="Qm" + "b" * 44,
+            blockchain_tx_hash="0x" + "c" * 64,
+            is_verified=i % 2 == 0,
+            created_at=now,
+            updated_at=None if i % 3 else now,
+        )
+        for i in range(count)
+    ]
+
+
+def serialize_default(documents: list) -> bytes:
+    """What FastAPI does for response_model=List[DocumentResponse]"""
+    models = [DocumentResponse.model_validate(doc) for doc in documents]
+    return json.dumps(jsonable_encoder(models)).encode()
+
+
+def serialize_fast(documents: list) -> bytes:
+    """Precompiled pydantic-core validation and JSON encoding used by the routes"""
+    return document_list_serializer.dumps(documents)
+
+
+def size_label(size: int) -> str:
+    """Short human label for a byte count"""
+    return f"{size // MB}MB" if size >= MB else f"{size // KB}KB"
+
+
+def build_benchmarks(workdir: Path, quick: bool) -> List[Benchmark]:
+    """Create fixtures in workdir and return every benchmark"""
+    file_service = FileService()
+    file_service.upload_dir = workdir / "uploads"
+    file_service.upload_dir.mkdir()
+    loop = asyncio.new_event_loop()
+    benchmarks = []
+    
+    file_sizes = HASH_FILE_SIZES[:2] if quick else HASH_FILE_SIZES
+    for file_size in file_sizes:
+        path = workdir / f"hash-{file_size}.bin"
+        path.write_bytes(os.urandom(file_size))
+        for chunk_size in HASH_CHUNK_SIZES:
+            benchmarks.append(Benchmark(
+                f"file.hash[size={size_label(file_size)},chunk={size_label(chunk_size)}]",
+                lambda path=str(path), chunk_size=chunk_size: file_service.calculate_file_hash(path, chunk_size),
+                file_size,
+            ))
+    
+    for file_size in SAVE_FILE_SIZES[:1] if quick else SAVE_FILE_SIZES:
+        payload = io.BytesIO(os.urandom(file_size))
+        upload = UploadFile(file=payload, filename=f"bench-{file_size}.pdf", size=file_size)
+        
+        def save(upload=upload, payload=payload):
+            payload.seek(0)
+            return loop.run_until_complete(file_service.save_file(upload, 1))
+        
+        benchmarks.append(Benchmark(f"file.save[size={size_label(file_size)}]", save, file_size))
+    
+    token = create_access_token({"sub": "12345"})
+    benchmarks.append(Benchmark("token.create", lambda: create_access_token({"sub": "12345"})))
+    benchmarks.append(Benchmark("token.verify", lambda: verify_token(token)))
+    
+    password_hash = pwd_context.hash("benchmark-password")
+    rounds = password_hash.split("$")[2]
+    benchmarks.append(Benchmark(f"bcrypt.hash[rounds={rounds}]", lambda: pwd_context.hash("benchmark-password")))
+    benchmarks.append(Benchmark(
+        f"bcrypt.verify[rounds={rounds}]", lambda: pwd_context.verify("benchmark-password", password_hash)
+    ))
+    
+    for count in DOCUMENT_COUNTS[:2] if quick else DOCUMENT_COUNTS:
+        documents = make_documents(count)
+        benchmarks.append(Benchmark(f"serialize.default[documents={count}]", lambda d=documents: serialize_default(d)))
+        benchmarks.append(Benchmark(f"serialize.fast[documents={count}]", lambda d=documents: serialize_fast(d)))
+    
+    return benchmarks
+
+
+def calibrate(fn: Callable, min_sample: float) -> int:
+    """Loop count that makes one sample last at least min_sample seconds"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= min_sample or number >= 1_000_000:
+            return number
+        number *= 2
+
+
+def measure(benchmark: Benchmark, repeat: int, warmup: int, min_sample: float) -> dict:
+    """Per-operation timing statistics for one benchmark"""
+    number = calibrate(benchmark.fn, min_sample)
+    for _ in range(warmup):
+        for _ in range(number):
+            benchmark.fn()
+    
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            benchmark.fn()
+        samples.append((time.perf_counter() - start) / number)
+    
+    ordered = sorted(samples)
+    median = statistics.median(ordered)
+    stdev = statistics.stdev(ordered) if len(ordered) > 1 else 0.0
+    # Normal approximation for the standard error of the median
+    half_width = 1.96 * 1.2533 * stdev / math.sqrt(len(ordered))
+    result = {
+        "loops_per_sample": number,
+        "samples": len(ordered),
+        "median_us": median * 1e6,
+        "mean_us": statistics.mean(ordered) * 1e6,
+        "stdev_us": stdev * 1e6,
+        "min_us": ordered[0] * 1e6,
+        "q1_us": percentile(ordered, 0.25) * 1e6,
+        "q3_us": percentile(ordered, 0.75) * 1e6,
+        "ci95_us": [(median - half_width) * 1e6, (median + half_width) * 1e6],
+    }
+    if benchmark.bytes_per_op:
+        result["bytes_per_op"] = benchmark.bytes_per_op
+        result["throughput_mb_s"] = benchmark.bytes_per_op / median / MB
+    return result
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> dict:
+    """Classify each benchmark against a baseline run.
+    
+    A change counts only if the medians differ by more than `threshold`
+    and the 95% confidence intervals do not overlap.
+    """
+    comparison = {}
+    for name, result in current.items():
+        base = baseline.get(name)
+        if base is None:
+            comparison[name] = {"status": "new"}
+            continue
+        
+        ratio = result["median_us"] / base["median_us"]
+        if ratio > 1 + threshold and result["ci95_us"][0] > base["ci95_us"][1]:
+            status_value = "regressed"
+        elif ratio < 1 - threshold and result["ci95_us"][1] < base["ci95_us"][0]:
+            status_value = "improved"
+        else:
+            status_value = "unchanged"
+        comparison[name] = {
+            "status": status_value,
+            "ratio": ratio,
+            "baseline_median_us": base["median_us"],
+            "median_us": result["median_us"],
+        }
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Component microbenchmarks")
+    parser.add_argument("--only", action="append", default=[], help="Run benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="Skip the largest sizes")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed samples per benchmark")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed samples per benchmark")
+    parser.add_argument("--min-sample-ms", type=float, default=50, help="Minimum duration of one sample")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change treated as significant")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on regressions")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory(prefix="digital-shadow-micro-") as workdir:
+        benchmarks = [
+            benchmark for benchmark in build_benchmarks(Path(workdir), args.quick)
+            if not args.only or any(part in benchmark.name for part in args.only)
+        ]
+        results = {}
+        for benchmark in benchmarks:
+            print(f"Running {benchmark.name}...", file=sys.stderr)
+            results[benchmark.name] = measure(benchmark, args.repeat, args.warmup, args.min_sample_ms / 1000)
+    
+    output = {
+        "environment": environment(),
+        "config": {"repeat": args.repeat, "warmup": args.warmup, "min_sample_ms": args.min_sample_ms},
+        "benchmarks": results,
+    }
+    
+    regressed = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["benchmarks"]
+        output["comparison"] = compare(results, baseline, args.threshold)
+        regressed = [name for name, entry in output["comparison"].items() if entry["status"] == "regressed"]
+    
+    write_results(output, args.output)
+    if regressed:
+        print(f"Regressed: {', '.join(regressed)}", file=sys.stderr)
+        if args.fail_on_regression:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
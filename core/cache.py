@@ -0,0 +1,270 @@
+"""
+In-process caching and cross-worker invalidation
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from core.config import settings
+from core.metrics import CACHE_REQUESTS
+
+_MISSING = object()
+
+_redis_client = None
+_redis_checked = False
+_redis_lock = threading.Lock()
+
+PUBSUB_HEALTH_CHECK_SECONDS = 30
+PUBSUB_RECONNECT_MAX_SECONDS = 30
+
+
+def get_redis():
+    """Return a shared Redis client, or None when Redis is disabled or unreachable"""
+    global _redis_client, _redis_checked
+    
+    if _redis_checked:
+        return _redis_client
+    
+    with _redis_lock:
+        if _redis_checked:
+            return _redis_client
+        _redis_checked = True
+        
+        if not settings.REDIS_ENABLED:
+            return None
+        
+        try:
+            import redis
+            client = redis.Redis.from_url(
+                settings.REDIS_URL, socket_connect_timeout=1, socket_timeout=1
+            )
+            client.ping()
+            _redis_client = client
+        except Exception as e:
+            print(f"Redis unavailable, using in-memory fallback: {e}")
+            _redis_client = None
+    
+    return _redis_client
+
+
+def connect_pubsub(channel: str):
+    """Subscribe to a channel on a dedicated connection.
+    
+    The shared client's one-second socket timeout would end a subscription
+    the first time the channel goes quiet, so subscribers get a connection
+    without a read timeout, kept honest by TCP keepalive and health checks.
+    """
+    import redis
+    client = redis.Redis.from_url(
+        settings.REDIS_URL,
+        socket_connect_timeout=1,
+        socket_timeout=None,
+        socket_keepalive=True,
+        health_check_interval=PUBSUB_HEALTH_CHECK_SECONDS,
+    )
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(channel)
+    return pubsub
+
+
+class PubSubListener:
+    """Background thread handing every message on a Redis channel to a callback.
+    
+    If the connection drops, the thread reconnects with backoff instead of
+    exiting; on_reconnect runs after each reconnect so callers can make up
+    for messages missed in between.
+    """
+    
+    def __init__(self, channel: str, on_message: Callable[[bytes], None], name: str,
+                 on_reconnect: Optional[Callable[[], None]] = None):
+        self.channel = channel
+        self.on_message = on_message
+        self.name = name
+        self.on_reconnect = on_reconnect
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pubsub = None
+    
+    def start(self):
+        """Start the listener thread"""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the listener thread"""
+        self._stopping.set()
+        pubsub = self._pubsub
+        if pubsub is not None:
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+        self._thread = None
+    
+    def _run(self):
+        delay = 1
+        connected = False
+        while not self._stopping.is_set():
+            try:
+                self._pubsub = connect_pubsub(self.channel)
+                if connected and self.on_reconnect is not None:
+                    self.on_reconnect()
+                connected = True
+                delay = 1
+                while not self._stopping.is_set():
+                    # The timeout only bounds how long a stop() can go unnoticed
+                    message = self._pubsub.get_message(timeout=1.0)
+                    data = message.get("data") if message else None
+                    if isinstance(data, bytes):
+                        try:
+                            self.on_message(data)
+                        except Exception as e:
+                            print(f"{self.name}: message handler failed: {e}")
+            except Exception as e:
+                if self._stopping.is_set():
+                    break
+                print(f"{self.name}: Redis subscription lost, reconnecting in {delay}s: {e}")
+                self._stopping.wait(delay)
+                delay = min(delay * 2, PUBSUB_RECONNECT_MAX_SECONDS)
+            finally:
+                pubsub, self._pubsub = self._pubsub, None
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                        pubsub.connection_pool.disconnect()
+                    except Exception:
+                        pass
+
+
+class TTLCache:
+    """Thread-safe, size-bounded LRU cache with per-entry expiry"""
+    
+    def __init__(self, max_size: int, ttl: float, name: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        """Return a live entry and mark it recently used"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[1] < time.monotonic():
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                if self.name:
+                    CACHE_REQUESTS.labels(self.name, "miss").inc()
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            if self.name:
+                CACHE_REQUESTS.labels(self.name, "hit").inc()
+            return entry[0]
+    
+    def set(self, key, value, ttl: Optional[float] = None):
+        """Store an entry, evicting the least recently used when full"""
+        if self.max_size <= 0:
+            return
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def delete(self, key):
+        """Remove an entry if present"""
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def delete_where(self, predicate: Callable[[Any, Any], bool]):
+        """Remove every entry whose key and value match the predicate"""
+        with self._lock:
+            for key in [k for k, (v, _) in self._data.items() if predicate(k, v)]:
+                del self._data[key]
+    
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class InvalidationBus:
+    """Broadcast cache invalidations to every worker via Redis pub/sub.
+    
+    Messages are "<topic>:<key>". Without Redis only the local process is
+    notified, so other workers rely on their cache TTLs. Invalidations sent
+    while a worker was reconnecting are lost, so each topic can register a
+    reset that drops everything it caches.
+    """
+    
+    def __init__(self, channel: Optional[str] = None):
+        self.channel = channel or settings.CACHE_INVALIDATION_CHANNEL
+        self._handlers: Dict[str, List[Callable[[str], None]]] = {}
+        self._resets: List[Callable[[], None]] = []
+        self._listener: Optional[PubSubListener] = None
+    
+    def subscribe(self, topic: str, handler: Callable[[str], None], reset: Optional[Callable[[], None]] = None):
+        """Call handler(key) whenever an invalidation for topic arrives, and reset() after a missed stretch"""
+        self._handlers.setdefault(topic, []).append(handler)
+        if reset is not None:
+            self._resets.append(reset)
+    
+    def publish(self, topic: str, key):
+        """Invalidate locally, then tell the other workers"""
+        message = f"{topic}:{key}"
+        self._dispatch(message)
+        
+        client = get_redis()
+        if client is not None:
+            try:
+                client.publish(self.channel, message)
+            except Exception as e:
+                print(f"Cache invalidation publish failed: {e}")
+    
+    def start(self):
+        """Start listening for invalidations from other workers"""
+        if get_redis() is None or self._listener is not None:
+            return
+        self._listener = PubSubListener(
+            self.channel, lambda data: self._dispatch(data.decode()), "cache-invalidation", self._reset
+        )
+        self._listener.start()
+    
+    def stop(self):
+        """Stop listening"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+    
+    def _reset(self):
+        """Drop cached state that invalidations may have been missed for"""
+        for reset in self._resets:
+            try:
+                reset()
+            except Exception as e:
+                print(f"Cache reset failed: {e}")
+    
+    def _dispatch(self, message: str):
+        """Run the handlers registered for the message's topic (including our own echo)"""
+        topic, _, key = message.partition(":")
+        for handler in self._handlers.get(topic, []):
+            try:
+                handler(key)
+            except Exception as e:
+                print(f"Cache invalidation handler failed: {e}")
+
+
+# Shared per-process bus, started by the application lifespan
+invalidation_bus = InvalidationBus()
@@ -3,9 +3,13 @@ Configuration settings for Digital Shadow API
 """
 
 import os
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
-from pydantic import Field
+from pydantic import Field, field_validator
+
+
+SQLITE_JOURNAL_MODES = ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF")
+SQLITE_SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
 
 
 class Settings(BaseSettings):
@@ -20,9 +24,47 @@ class Settings(BaseSettings):
     SECRET_KEY: str = Field(..., env="SECRET_KEY")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Ids, not emails: an email is chosen by whoever registers or edits a profile and is not proven owned
+    ADMIN_USER_IDS: List[int] = Field(default=[], env="ADMIN_USER_IDS")
+    PASSWORD_HASH_EXECUTOR: str = Field(default="thread", env="PASSWORD_HASH_EXECUTOR")  # 'thread' or 'process'
+    PASSWORD_HASH_WORKERS: int = Field(default=2, env="PASSWORD_HASH_WORKERS")
+    PASSWORD_HASH_QUEUE_LIMIT: int = Field(default=32, env="PASSWORD_HASH_QUEUE_LIMIT")
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = Field(default=2, env="PASSWORD_HASH_RETRY_AFTER_SECONDS")
+    
+    # Production server (python -m core.server)
+    WORKERS: int = Field(default=0, env="WORKERS")  # 0 sizes the pool from available CPUs
+    WORKERS_PER_CORE: float = Field(default=1.0, env="WORKERS_PER_CORE")
+    MAX_WORKERS: int = Field(default=0, env="MAX_WORKERS")  # 0 means no cap
+    GRACEFUL_TIMEOUT_SECONDS: int = Field(default=30, env="GRACEFUL_TIMEOUT_SECONDS")
+    WORKER_TIMEOUT_SECONDS: int = Field(default=60, env="WORKER_TIMEOUT_SECONDS")
+    KEEPALIVE_SECONDS: int = Field(default=5, env="KEEPALIVE_SECONDS")
+    MAX_REQUESTS: int = Field(default=0, env="MAX_REQUESTS")  # Recycle workers after this many requests; 0 disables
+    MAX_REQUESTS_JITTER: int = Field(default=0, env="MAX_REQUESTS_JITTER")
     
     # Database
     DATABASE_URL: str = Field(..., env="DATABASE_URL")
+    DATABASE_READ_URL: Optional[str] = Field(default=None, env="DATABASE_READ_URL")
+    DB_MAX_CONNECTIONS: int = Field(default=80, env="DB_MAX_CONNECTIONS")  # Budget shared by core.server workers
+    DB_POOL_SIZE: Optional[int] = Field(default=None, env="DB_POOL_SIZE")  # Derived from the budget when unset
+    DB_MAX_OVERFLOW: Optional[int] = Field(default=None, env="DB_MAX_OVERFLOW")
+    DB_POOL_TIMEOUT: int = Field(default=30, env="DB_POOL_TIMEOUT")
+    DB_POOL_RECYCLE: int = Field(default=1800, env="DB_POOL_RECYCLE")
+    DB_POOL_PRE_PING: bool = Field(default=True, env="DB_POOL_PRE_PING")
+    DB_STATEMENT_TIMEOUT_MS: int = Field(default=30000, env="DB_STATEMENT_TIMEOUT_MS")
+    SQLITE_JOURNAL_MODE: str = Field(default="WAL", env="SQLITE_JOURNAL_MODE")  # WAL, DELETE, TRUNCATE, PERSIST, MEMORY or OFF
+    SQLITE_SYNCHRONOUS: str = Field(default="NORMAL", env="SQLITE_SYNCHRONOUS")  # OFF, NORMAL, FULL or EXTRA
+    SQLITE_BUSY_TIMEOUT_MS: int = Field(default=5000, env="SQLITE_BUSY_TIMEOUT_MS")
+    SQLITE_CACHE_SIZE_KB: int = Field(default=64 * 1024, env="SQLITE_CACHE_SIZE_KB")
+    SQLITE_MMAP_SIZE: int = Field(default=256 * 1024 * 1024, env="SQLITE_MMAP_SIZE")
+    STATS_RECONCILE_INTERVAL_SECONDS: int = Field(default=0, env="STATS_RECONCILE_INTERVAL_SECONDS")  # 0 disables
+    
+    # Audit log (Verification records)
+    AUDIT_WRITE_MODE: str = Field(default="sync", env="AUDIT_WRITE_MODE")  # 'sync', 'buffered' or 'wal'
+    AUDIT_BATCH_SIZE: int = Field(default=200, env="AUDIT_BATCH_SIZE")
+    AUDIT_FLUSH_INTERVAL_MS: int = Field(default=250, env="AUDIT_FLUSH_INTERVAL_MS")
+    AUDIT_WAL_DIR: str = Field(default="./data/audit-wal", env="AUDIT_WAL_DIR")
+    AUDIT_WAL_FSYNC: bool = Field(default=True, env="AUDIT_WAL_FSYNC")  # fsync each segment before it is flushed
+    AUDIT_MAX_ATTEMPTS: int = Field(default=5, env="AUDIT_MAX_ATTEMPTS")  # Rejections before a row is dead-lettered
     
     # CORS
     ALLOWED_ORIGINS: List[str] = Field(
@@ -41,13 +83,134 @@ class Settings(BaseSettings):
     # File Storage
     UPLOAD_DIR: str = Field(default="./uploads", env="UPLOAD_DIR")
     MAX_FILE_SIZE: int = Field(default=10 * 1024 * 1024, env="MAX_FILE_SIZE")  # 10MB
+    
+    # 'local' keeps every file on disk; 'tiered' treats disk as a cache over pinned IPFS content
+    STORAGE_MODE: str = Field(default="local", env="STORAGE_MODE")
+    LOCAL_CACHE_MAX_BYTES: int = Field(default=10 * 1024 ** 3, env="LOCAL_CACHE_MAX_BYTES")
+    LOCAL_CACHE_POLICY: str = Field(default="lru", env="LOCAL_CACHE_POLICY")  # 'lru' or 'lfu'
+    LOCAL_CACHE_CHECK_SECONDS: int = Field(default=30, env="LOCAL_CACHE_CHECK_SECONDS")
+    LOCAL_CACHE_MIN_AGE_SECONDS: int = Field(default=60, env="LOCAL_CACHE_MIN_AGE_SECONDS")  # Never evict fresher
+    
+    # Where new uploads are written: 'local' (UPLOAD_DIR) or 's3'
+    STORAGE_BACKEND: str = Field(default="local", env="STORAGE_BACKEND")
+    S3_BUCKET: str = Field(default="", env="S3_BUCKET")
+    S3_PREFIX: str = Field(default="documents", env="S3_PREFIX")
+    S3_ENDPOINT_URL: str = Field(default="", env="S3_ENDPOINT_URL")  # Set for MinIO and other S3-compatible stores
+    S3_REGION: str = Field(default="us-east-1", env="S3_REGION")
+    S3_ACCESS_KEY_ID: str = Field(default="", env="S3_ACCESS_KEY_ID")  # Empty uses the default AWS credential chain
+    S3_SECRET_ACCESS_KEY: str = Field(default="", env="S3_SECRET_ACCESS_KEY")
+    S3_PART_SIZE: int = Field(default=8 * 1024 * 1024, env="S3_PART_SIZE")  # Multipart and ranged-read size
+    S3_MAX_CONCURRENCY: int = Field(default=8, env="S3_MAX_CONCURRENCY")  # Parallel parts per upload
+    S3_READ_AHEAD: int = Field(default=4, env="S3_READ_AHEAD")  # Ranged reads in flight per open object
+    S3_MAX_POOL_CONNECTIONS: int = Field(default=32, env="S3_MAX_POOL_CONNECTIONS")
+    
     ALLOWED_EXTENSIONS: List[str] = Field(
         default=[".pdf", ".doc", ".docx", ".txt", ".jpg", ".jpeg", ".png"],
         env="ALLOWED_EXTENSIONS"
     )
     
+    # Metrics (set PROMETHEUS_MULTIPROC_DIR when running several workers)
+    METRICS_ENABLED: bool = Field(default=True, env="METRICS_ENABLED")
+    
+    # Tracing (OpenTelemetry); exporter is 'otlp', 'console', 'file' or 'memory'
+    TRACING_ENABLED: bool = Field(default=False, env="TRACING_ENABLED")
+    TRACING_EXPORTER: str = Field(default="otlp", env="TRACING_EXPORTER")
+    TRACING_OTLP_ENDPOINT: Optional[str] = Field(default=None, env="TRACING_OTLP_ENDPOINT")
+    TRACING_FILE_PATH: str = Field(default="./data/traces-{pid}.jsonl", env="TRACING_FILE_PATH")
+    TRACING_SAMPLE_RATIO: float = Field(default=1.0, env="TRACING_SAMPLE_RATIO")
+    TRACING_SERVICE_NAME: str = Field(default="digital-shadow-api", env="TRACING_SERVICE_NAME")
+    
+    # Admin profiling endpoints (not mounted at all when disabled)
+    PROFILING_ENABLED: bool = Field(default=False, env="PROFILING_ENABLED")
+    PROFILING_MAX_SECONDS: int = Field(default=120, env="PROFILING_MAX_SECONDS")
+    
     # Redis
     REDIS_URL: str = Field(default="redis://localhost:6379", env="REDIS_URL")
+    REDIS_ENABLED: bool = Field(default=True, env="REDIS_ENABLED")  # Falls back to in-memory when unreachable
+    CACHE_INVALIDATION_CHANNEL: str = Field(default="digital-shadow:invalidate", env="CACHE_INVALIDATION_CHANNEL")
+    EVENTS_CHANNEL: str = Field(default="digital-shadow:events", env="EVENTS_CHANNEL")
+    
+    # Push event streams (GET /api/events, Server-Sent Events)
+    EVENTS_QUEUE_SIZE: int = Field(default=100, env="EVENTS_QUEUE_SIZE")  # Per stream; a full queue resyncs
+    EVENTS_KEEPALIVE_SECONDS: int = Field(default=15, env="EVENTS_KEEPALIVE_SECONDS")
+    
+    # Authenticated-principal cache
+    PRINCIPAL_CACHE_SIZE: int = Field(default=10000, env="PRINCIPAL_CACHE_SIZE")
+    PRINCIPAL_CACHE_TTL_SECONDS: int = Field(default=60, env="PRINCIPAL_CACHE_TTL_SECONDS")  # 0 disables
+    
+    # Conditional-request response cache for read endpoints
+    RESPONSE_CACHE_ENABLED: bool = Field(default=True, env="RESPONSE_CACHE_ENABLED")
+    RESPONSE_CACHE_SIZE: int = Field(default=5000, env="RESPONSE_CACHE_SIZE")
+    RESPONSE_CACHE_TTL_SECONDS: int = Field(default=300, env="RESPONSE_CACHE_TTL_SECONDS")
+    
+    # Rate limiting and load shedding for expensive endpoints ('upload', 'verify', 'bulk_verify', 'chain_verify', 'export',
+    # and the unauthenticated 'public_verify' / 'public_verify_upload', limited per client address)
+    RATE_LIMIT_ENABLED: bool = Field(default=True, env="RATE_LIMIT_ENABLED")
+    RATE_LIMIT_RATES: Dict[str, float] = Field(  # Tokens refilled per second, per user
+        default={
+            "upload": 0.2, "verify": 2.0, "bulk_verify": 0.05, "chain_verify": 0.5, "export": 0.05,
+            "public_verify": 10.0, "public_verify_upload": 0.5,
+        },
+        env="RATE_LIMIT_RATES"
+    )
+    RATE_LIMIT_BURSTS: Dict[str, int] = Field(
+        default={
+            "upload": 10, "verify": 30, "bulk_verify": 3, "chain_verify": 10, "export": 5,
+            "public_verify": 100, "public_verify_upload": 10,
+        },
+        env="RATE_LIMIT_BURSTS"
+    )
+    CONCURRENCY_LIMITS: Dict[str, int] = Field(  # In-flight requests per worker
+        default={
+            "upload": 16, "verify": 32, "bulk_verify": 2, "chain_verify": 8, "export": 4,
+            "public_verify_upload": 8,
+        },
+        env="CONCURRENCY_LIMITS"
+    )
+    CONCURRENCY_QUEUE_SIZE: int = Field(default=32, env="CONCURRENCY_QUEUE_SIZE")
+    CONCURRENCY_QUEUE_TIMEOUT_SECONDS: float = Field(default=2.0, env="CONCURRENCY_QUEUE_TIMEOUT_SECONDS")
+    
+    # Bulk verification (POST /api/documents/verify): hashing threads per worker, 0 sizes from CPUs
+    BULK_VERIFY_WORKERS: int = Field(default=0, env="BULK_VERIFY_WORKERS")
+    BULK_VERIFY_BATCH_SIZE: int = Field(default=200, env="BULK_VERIFY_BATCH_SIZE")  # Verification rows per write
+    
+    # Document deletion: DELETE only tombstones; a background reaper reclaims storage in batches
+    DELETION_GRACE_SECONDS: int = Field(default=60, env="DELETION_GRACE_SECONDS")  # Lets in-flight reads finish
+    DELETION_REAP_INTERVAL_SECONDS: int = Field(default=30, env="DELETION_REAP_INTERVAL_SECONDS")  # 0 disables
+    DELETION_REAP_BATCH_SIZE: int = Field(default=200, env="DELETION_REAP_BATCH_SIZE")
+    
+    # Integrity scrubber (python -m services.scrub_service): re-hashes stored files in the background
+    SCRUB_INTERVAL_SECONDS: int = Field(default=7 * 24 * 3600, env="SCRUB_INTERVAL_SECONDS")  # Max age of a check
+    SCRUB_MAX_BYTES_PER_SECOND: int = Field(default=20 * 1024 * 1024, env="SCRUB_MAX_BYTES_PER_SECOND")
+    SCRUB_BATCH_SIZE: int = Field(default=50, env="SCRUB_BATCH_SIZE")
+    SCRUB_IDLE_SECONDS: int = Field(default=60, env="SCRUB_IDLE_SECONDS")  # Sleep when nothing is due
+    SCRUB_NICENESS: int = Field(default=10, env="SCRUB_NICENESS")
+    SCRUB_METRICS_PORT: int = Field(default=0, env="SCRUB_METRICS_PORT")  # 0 disables the scrubber's /metrics
+    
+    # Public verify-by-content: Bloom filter of registered hashes in front of the documents table
+    CONTENT_INDEX_CAPACITY: int = Field(default=1_000_000, env="CONTENT_INDEX_CAPACITY")  # Grows on rebuild
+    CONTENT_INDEX_ERROR_RATE: float = Field(default=0.001, env="CONTENT_INDEX_ERROR_RATE")
+    CONTENT_INDEX_REFRESH_SECONDS: int = Field(default=5, env="CONTENT_INDEX_REFRESH_SECONDS")
+    CONTENT_INDEX_REBUILD_SECONDS: int = Field(default=3600, env="CONTENT_INDEX_REBUILD_SECONDS")
+    CONTENT_INDEX_PENDING_SECONDS: int = Field(default=3600, env="CONTENT_INDEX_PENDING_SECONDS")
+    PUBLIC_VERIFY_CACHE_SECONDS: int = Field(default=60, env="PUBLIC_VERIFY_CACHE_SECONDS")  # Cache-Control max-age
+    PUBLIC_VERIFY_CACHE_SIZE: int = Field(default=10000, env="PUBLIC_VERIFY_CACHE_SIZE")
+    PUBLIC_VERIFY_MAX_ROWS: int = Field(default=100, env="PUBLIC_VERIFY_MAX_ROWS")
+    
+    # Upload post-processing pipeline
+    PIPELINE_MODE: str = Field(default="inprocess", env="PIPELINE_MODE")  # 'inprocess' or 'celery'
+    CELERY_BROKER_URL: Optional[str] = Field(default=None, env="CELERY_BROKER_URL")  # Defaults to REDIS_URL
+    PIPELINE_CONCURRENCY: Dict[str, int] = Field(
+        default={"hash": 4, "ipfs_add": 4, "pin": 4, "anchor": 2, "confirm": 8},
+        env="PIPELINE_CONCURRENCY"
+    )
+    PIPELINE_MAX_ATTEMPTS: Dict[str, int] = Field(
+        default={"hash": 2, "ipfs_add": 4, "pin": 4, "anchor": 4, "confirm": 6},
+        env="PIPELINE_MAX_ATTEMPTS"
+    )
+    PIPELINE_RETRY_BACKOFF_SECONDS: float = Field(default=2.0, env="PIPELINE_RETRY_BACKOFF_SECONDS")
+    PIPELINE_LEASE_SECONDS: int = Field(default=300, env="PIPELINE_LEASE_SECONDS")
+    PIPELINE_SWEEP_INTERVAL_SECONDS: int = Field(default=60, env="PIPELINE_SWEEP_INTERVAL_SECONDS")
     
     # Email
     SMTP_HOST: Optional[str] = Field(default=None, env="SMTP_HOST")
@@ -55,6 +218,23 @@ class Settings(BaseSettings):
     SMTP_USER: Optional[str] = Field(default=None, env="SMTP_USER")
     SMTP_PASSWORD: Optional[str] = Field(default=None, env="SMTP_PASSWORD")
     
+    @field_validator("SQLITE_JOURNAL_MODE")
+    @classmethod
+    def _check_journal_mode(cls, value: str) -> str:
+        # Interpolated into a PRAGMA, where SQLite ignores values it does not know
+        value = value.upper()
+        if value not in SQLITE_JOURNAL_MODES:
+            raise ValueError(f"SQLITE_JOURNAL_MODE must be one of {', '.join(SQLITE_JOURNAL_MODES)}")
+        return value
+    
+    @field_validator("SQLITE_SYNCHRONOUS")
+    @classmethod
+    def _check_synchronous(cls, value: str) -> str:
+        value = value.upper()
+        if value not in SQLITE_SYNCHRONOUS_LEVELS:
+            raise ValueError(f"SQLITE_SYNCHRONOUS must be one of {', '.join(SQLITE_SYNCHRONOUS_LEVELS)}")
+        return value
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
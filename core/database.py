@@ -2,16 +2,89 @@
 Database configuration and models
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, ForeignKey
+from collections import defaultdict
+from sqlalchemy import (
+    create_engine, event, insert, update, Index, Column, Integer, BigInteger, String, DateTime, Text, Boolean,
+    ForeignKey
+)
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, Session
+from sqlalchemy.orm.attributes import get_history
 from sqlalchemy.sql import func
 from datetime import datetime
 from core.config import settings
+from core.metrics import DB_CHECKOUT_WAIT, instrument_engine
+from core.tracing import instrument_engine_tracing
 
-# Create database engine
-engine = create_engine(settings.DATABASE_URL)
+
+# Per-process pool for anything not launched by core.server (uvicorn, Celery, the scrubber),
+# which cannot know how many siblings share DB_MAX_CONNECTIONS
+DEFAULT_PROCESS_CONNECTIONS = 10
+
+
+def _pool_options() -> dict:
+    """Pool sizing for one process: a share of the connection budget under core.server, else a small fixed pool"""
+    if settings.WORKERS > 0:
+        per_worker = max(2, settings.DB_MAX_CONNECTIONS // settings.WORKERS)
+    else:
+        per_worker = DEFAULT_PROCESS_CONNECTIONS
+    pool_size = settings.DB_POOL_SIZE or max(1, per_worker // 2)
+    max_overflow = settings.DB_MAX_OVERFLOW
+    if max_overflow is None:
+        max_overflow = max(0, per_worker - pool_size)
+    
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection for concurrent readers and writers"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def create_db_engine(database_url: str) -> Engine:
+    """Create an engine using the profile that matches the database backend"""
+    url = make_url(database_url)
+    
+    if url.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        if url.database and url.database != ":memory:":
+            options.update(_pool_options())
+        db_engine = create_engine(database_url, **options)
+        event.listen(db_engine, "connect", _apply_sqlite_pragmas)
+        return db_engine
+    
+    options = _pool_options()
+    if url.get_backend_name() == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+        options["connect_args"] = {
+            "options": f"-c statement_timeout={int(settings.DB_STATEMENT_TIMEOUT_MS)}"
+        }
+    return create_engine(database_url, **options)
+
+
+# Create database engines; read-only queries go to the replica when one is configured
+engine = create_db_engine(settings.DATABASE_URL)
+read_engine = create_db_engine(settings.DATABASE_READ_URL) if settings.DATABASE_READ_URL else engine
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+instrument_engine(engine, "primary")
+instrument_engine_tracing(engine, "primary")
+if read_engine is not engine:
+    instrument_engine(read_engine, "replica")
+    instrument_engine_tracing(read_engine, "replica")
 
 # Create base class for models
 Base = declarative_base()
@@ -46,17 +119,25 @@ class Document(Base):
     file_path = Column(String, nullable=False)
     file_size = Column(Integer, nullable=False)
     file_type = Column(String, nullable=False)
-    file_hash = Column(String, nullable=False)
+    file_hash = Column(String, nullable=True, index=True)  # Filled in by the upload pipeline's hash stage
     ipfs_hash = Column(String, nullable=True)
     blockchain_tx_hash = Column(String, nullable=True)
     is_verified = Column(Boolean, default=False)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    deleted_at = Column(DateTime(timezone=True), nullable=True)  # Tombstone; the row is reaped in the background
+    last_verified_at = Column(DateTime(timezone=True), nullable=True)  # Last integrity scrub of the stored bytes
     
     # Relationships
     owner = relationship("User", back_populates="documents")
     verifications = relationship("Verification", back_populates="document")
+    
+    __table_args__ = (
+        Index("ix_documents_owner_id_created_at", "owner_id", "created_at"),
+        Index("ix_documents_deleted_at", "deleted_at"),
+        Index("ix_documents_last_verified_at", "last_verified_at"),
+    )
 
 
 class Verification(Base):
@@ -66,7 +147,7 @@ class Verification(Base):
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    verification_type = Column(String, nullable=False)  # 'upload', 'verify', 'download'
+    verification_type = Column(String, nullable=False)  # 'upload', 'verify', 'download', 'scrub'
     status = Column(String, nullable=False)  # 'pending', 'success', 'failed'
     blockchain_tx_hash = Column(String, nullable=True)
     ipfs_hash = Column(String, nullable=True)
@@ -76,6 +157,171 @@ class Verification(Base):
     # Relationships
     document = relationship("Document", back_populates="verifications")
     user = relationship("User", back_populates="verifications")
+    
+    __table_args__ = (
+        Index("ix_verifications_user_id_created_at", "user_id", "created_at"),
+        Index("ix_verifications_document_id_created_at", "document_id", "created_at"),
+    )
+
+
+class VerificationArchive(Base):
+    """Verification of a document that has since been deleted, kept for the audit trail"""
+    __tablename__ = "verifications_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)  # Id of the original verification
+    document_id = Column(Integer, nullable=False)  # The document row no longer exists
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    verification_type = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    blockchain_tx_hash = Column(String, nullable=True)
+    ipfs_hash = Column(String, nullable=True)
+    verification_metadata = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_verifications_archive_user_id_created_at", "user_id", "created_at"),
+        Index("ix_verifications_archive_document_id", "document_id"),
+    )
+
+
+class UploadJob(Base):
+    """Upload post-processing job, advanced stage by stage by the pipeline workers"""
+    __tablename__ = "upload_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    stage = Column(String, nullable=False)  # 'hash', 'ipfs_add', 'pin', 'anchor', 'confirm', 'done'
+    status = Column(String, nullable=False)  # 'queued', 'running', 'retrying', 'completed', 'failed'
+    attempts = Column(Integer, nullable=False, default=0)  # Attempts at the current stage
+    last_error = Column(Text, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)  # After this, any worker may pick it up
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("ix_upload_jobs_status_lease_expires_at", "status", "lease_expires_at"),
+    )
+
+
+class UserStats(Base):
+    """Per-user counters, maintained in the same transaction as the rows they count"""
+    __tablename__ = "user_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_verifications = Column(Integer, nullable=False, default=0)
+    successful_verifications = Column(Integer, nullable=False, default=0)
+    failed_verifications = Column(Integer, nullable=False, default=0)
+    total_documents = Column(Integer, nullable=False, default=0)
+    verified_documents = Column(Integer, nullable=False, default=0)
+    bytes_stored = Column(BigInteger, nullable=False, default=0)
+    version = Column(BigInteger, nullable=False, default=0)  # Bumped on any document/verification change
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+USER_STATS_COUNTERS = (
+    "total_verifications",
+    "successful_verifications",
+    "failed_verifications",
+    "total_documents",
+    "verified_documents",
+    "bytes_stored",
+)
+
+
+def new_user_stats_deltas() -> dict:
+    """Empty {user_id: {counter: delta}} accumulator"""
+    return defaultdict(lambda: defaultdict(int))
+
+
+def verification_stats_deltas(deltas: dict, user_id: int, status_value: str, sign: int):
+    """Accumulate counter changes for one verification row (sign may be a row count)"""
+    deltas[user_id]["total_verifications"] += sign
+    if status_value == "success":
+        deltas[user_id]["successful_verifications"] += sign
+    elif status_value == "failed":
+        deltas[user_id]["failed_verifications"] += sign
+
+
+def document_stats_deltas(deltas: dict, owner_id: int, file_size: int, is_verified: bool, sign: int):
+    """Accumulate counter changes for one document row"""
+    deltas[owner_id]["total_documents"] += sign
+    deltas[owner_id]["bytes_stored"] += sign * (file_size or 0)
+    if is_verified:
+        deltas[owner_id]["verified_documents"] += sign
+
+
+def _collect_user_stats_deltas(session: Session) -> dict:
+    """Work out how the pending flush changes each user's counters"""
+    deltas = new_user_stats_deltas()
+    
+    for obj in session.new:
+        if isinstance(obj, Verification):
+            verification_stats_deltas(deltas, obj.user_id, obj.status, 1)
+        elif isinstance(obj, Document):
+            document_stats_deltas(deltas, obj.owner_id, obj.file_size, obj.is_verified, 1)
+    
+    for obj in session.deleted:
+        if isinstance(obj, Verification):
+            verification_stats_deltas(deltas, obj.user_id, obj.status, -1)
+        elif isinstance(obj, Document):
+            document_stats_deltas(deltas, obj.owner_id, obj.file_size, obj.is_verified, -1)
+    
+    for obj in session.dirty:
+        if isinstance(obj, (Document, Verification)) and session.is_modified(obj):
+            # Touch the owner so their version stamp moves even without counter changes
+            deltas[obj.owner_id if isinstance(obj, Document) else obj.user_id]
+        
+        if isinstance(obj, Verification):
+            history = get_history(obj, "status")
+            if history.has_changes():
+                for old_status in history.deleted:
+                    verification_stats_deltas(deltas, obj.user_id, old_status, -1)
+                for new_status in history.added:
+                    verification_stats_deltas(deltas, obj.user_id, new_status, 1)
+        elif isinstance(obj, Document):
+            history = get_history(obj, "is_verified")
+            if history.has_changes():
+                was_verified = any(history.deleted)
+                if bool(obj.is_verified) != was_verified:
+                    deltas[obj.owner_id]["verified_documents"] += 1 if obj.is_verified else -1
+    
+    return deltas
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _maintain_user_stats(session: Session, flush_context):
+    """Keep user_stats in step with users, documents and verifications"""
+    for obj in session.new:
+        if isinstance(obj, User):
+            session.execute(insert(UserStats).values(user_id=obj.id))
+    
+    apply_user_stats_deltas(session, _collect_user_stats_deltas(session))
+
+
+def apply_user_stats_deltas(session: Session, deltas: dict):
+    """Add counter deltas and bump each affected user's version stamp.
+    
+    Bulk statements bypass the flush listener, so code issuing them calls
+    this itself, in the same transaction.
+    """
+    for user_id, changes in deltas.items():
+        values = {
+            name: getattr(UserStats, name) + delta
+            for name, delta in changes.items() if delta
+        }
+        values["version"] = UserStats.version + 1
+        result = session.execute(
+            update(UserStats).where(UserStats.user_id == user_id).values(**values)
+        )
+        if result.rowcount == 0:
+            # Row is missing (e.g. user predates the table); reconciliation fills in history
+            session.execute(insert(UserStats).values(
+                user_id=user_id,
+                version=1,
+                **{name: max(0, delta) for name, delta in changes.items()}
+            ))
 
 
 # Database dependency
@@ -83,6 +329,20 @@ def get_db():
     """Get database session"""
     db = SessionLocal()
     try:
+        # Check out the connection up front so pool wait time is measured
+        with DB_CHECKOUT_WAIT.labels("primary").time():
+            db.connection()
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db():
+    """Get read-only database session (replica when configured, may lag the primary)"""
+    db = ReadSessionLocal()
+    try:
+        with DB_CHECKOUT_WAIT.labels("replica" if read_engine is not engine else "primary").time():
+            db.connection()
         yield db
     finally:
         db.close() 
\ No newline at end of file
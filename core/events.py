@@ -0,0 +1,123 @@
+"""
+Per-user event push: pipeline progress and verification results, fanned out to every worker
+"""
+
+import asyncio
+import json
+import threading
+from typing import Dict, Iterable, Optional, Set
+from core.cache import PubSubListener, get_redis
+from core.config import settings
+from core.metrics import EVENTS_PUBLISHED, EVENT_SUBSCRIBERS
+
+
+class Subscription:
+    """One open event stream: a bounded queue owned by the event loop that serves it"""
+    
+    def __init__(self, user_id: int, document_ids: Optional[Iterable[int]] = None):
+        self.user_id = user_id
+        self.document_ids = set(document_ids) if document_ids else None
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(settings.EVENTS_QUEUE_SIZE)
+    
+    def offer(self, event: dict):
+        """Queue an event (event loop thread only)"""
+        wanted = self.document_ids is None or event["type"] == "resync" or event.get("document_id") in self.document_ids
+        if not wanted:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A stalled client gets one resync marker instead of an unbounded backlog
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+
+class EventBus:
+    """Deliver per-user events to open streams in every worker.
+    
+    With Redis, events go to one pub/sub channel and each worker's listener
+    thread hands them to its own subscribers, so any process (API worker,
+    Celery worker, scrubber) can publish. Without Redis, or when a publish
+    fails, only streams in the publishing process receive the event, which
+    covers the in-process pipeline on a single node.
+    """
+    
+    def __init__(self, channel: Optional[str] = None):
+        self.channel = channel or settings.EVENTS_CHANNEL
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[PubSubListener] = None
+    
+    def subscribe(self, user_id: int, document_ids: Optional[Iterable[int]] = None) -> Subscription:
+        """Open a stream for a user's events, optionally only those about some documents"""
+        subscription = Subscription(user_id, document_ids)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        EVENT_SUBSCRIBERS.inc()
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription):
+        """Close a stream"""
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+        EVENT_SUBSCRIBERS.dec()
+    
+    def publish(self, user_id: int, event: dict):
+        """Send an event to the user's streams in every worker (call after committing what it reports)"""
+        EVENTS_PUBLISHED.labels(event["type"]).inc()
+        client = get_redis()
+        if client is not None:
+            try:
+                client.publish(self.channel, json.dumps({"user_id": user_id, "event": event}, default=str))
+                return
+            except Exception as e:
+                print(f"Event publish failed, delivering locally: {e}")
+        self._deliver(user_id, json.loads(json.dumps(event, default=str)))
+    
+    def start(self):
+        """Start receiving events published by any process"""
+        if get_redis() is None or self._listener is not None:
+            return
+        self._listener = PubSubListener(self.channel, self._receive, "event-bus", self._resync_all)
+        self._listener.start()
+    
+    def stop(self):
+        """Stop receiving"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+    
+    def _receive(self, data: bytes):
+        try:
+            envelope = json.loads(data)
+            self._deliver(int(envelope["user_id"]), envelope["event"])
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring malformed event: {e}")
+    
+    def _resync_all(self):
+        """Tell every open stream that events may have been missed while reconnecting"""
+        with self._lock:
+            user_ids = list(self._subscribers)
+        for user_id in user_ids:
+            self._deliver(user_id, {"type": "resync"})
+    
+    def _deliver(self, user_id: int, event: dict):
+        """Hand an event to this process's streams for the user (any thread)"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                pass  # Its event loop has closed
+
+
+# Shared per-process bus, started by the application lifespan
+event_bus = EventBus()
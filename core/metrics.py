@@ -0,0 +1,178 @@
+"""
+Prometheus metrics
+
+With several workers, PROMETHEUS_MULTIPROC_DIR must point at an empty
+directory before prometheus_client is imported (core.server does this);
+/metrics then aggregates all of them.
+"""
+
+import functools
+import inspect
+import os
+import time
+from typing import Optional
+from contextlib import contextmanager
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+)
+from prometheus_client import multiprocess
+from core.tracing import tracer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", multiprocess_mode="livesum"
+)
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds", "Time spent in service and pipeline stages",
+    ["component", "operation", "outcome"], buckets=LATENCY_BUCKETS
+)
+BYTES_HASHED = Counter("file_bytes_hashed_total", "Bytes read while hashing files")
+DB_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_seconds", "Time waiting for a database connection from the pool",
+    ["pool"], buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+)
+DB_CONNECTIONS_IN_USE = Gauge(
+    "db_pool_connections_in_use", "Database connections checked out of the pool",
+    ["pool"], multiprocess_mode="livesum"
+)
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by result", ["cache", "result"])
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total", "Requests rejected by rate limits or load shedding", ["gate", "reason"]
+)
+GATE_IN_FLIGHT = Gauge(
+    "admission_in_flight", "Requests holding an admission slot", ["gate"], multiprocess_mode="livesum"
+)
+PASSWORD_HASH_QUEUE_WAIT = Histogram(
+    "password_hash_queue_wait_seconds", "Time password hashing work waited for a pool worker",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds", "Time spent hashing or verifying a password",
+    buckets=(0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 1, 2)
+)
+
+SCRUB_DOCUMENTS = Counter(
+    "scrub_documents_total", "Documents re-hashed by the integrity scrubber", ["result"]
+)
+SCRUB_BYTES = Counter("scrub_bytes_total", "Bytes read by the integrity scrubber")
+SCRUB_LAG = Gauge(
+    "scrub_lag_seconds", "Time since the least recently verified document was last checked",
+    multiprocess_mode="max"
+)
+SCRUB_COVERAGE = Gauge(
+    "scrub_coverage_ratio", "Share of documents verified within SCRUB_INTERVAL_SECONDS",
+    multiprocess_mode="max"
+)
+
+STORAGE_CACHE_BYTES = Gauge(
+    "storage_cache_bytes", "Bytes of IPFS-backed files cached on local disk", multiprocess_mode="max"
+)
+STORAGE_EVICTIONS = Counter("storage_evictions_total", "Cached files evicted from local disk")
+EVENTS_PUBLISHED = Counter("events_published_total", "Push events published to user streams", ["type"])
+EVENT_SUBSCRIBERS = Gauge("event_subscribers", "Open push event streams", multiprocess_mode="livesum")
+EXPORT_BYTES = Counter("export_bytes_total", "Archive bytes streamed by document exports", ["format"])
+
+
+def render_metrics() -> tuple:
+    """Serialize metrics for every worker; returns (body, content type)"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: Optional[int] = None):
+    """Drop a worker's live gauges when it exits (this process by default)"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+@contextmanager
+def track_stage(component: str, operation: str):
+    """Time a block of work as one stage, inside a span of the same name"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with tracer.start_as_current_span(f"{component}.{operation}"):
+            yield
+        outcome = "ok"
+    finally:
+        STAGE_LATENCY.labels(component, operation, outcome).observe(time.perf_counter() - start)
+
+
+def timed(component: str, operation: str):
+    """Decorator timing a sync or async service method as one stage"""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with track_stage(component, operation):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+        
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with track_stage(component, operation):
+                return fn(*args, **kwargs)
+        return wrapper
+    
+    return decorator
+
+
+def instrument_engine(engine, name: str):
+    """Track connections in use for an engine's pool"""
+    from sqlalchemy import event
+    
+    event.listen(engine, "checkout", lambda *args: DB_CONNECTIONS_IN_USE.labels(name).inc())
+    event.listen(engine, "checkin", lambda *args: DB_CONNECTIONS_IN_USE.labels(name).dec())
+
+
+_route_paths = {}
+
+
+def route_path(scope) -> str:
+    """Map the matched endpoint back to its path template"""
+    app = scope["app"]
+    paths = _route_paths.get(id(app))
+    if paths is None:
+        paths = _route_paths[id(app)] = {
+            getattr(route, "endpoint", None): route.path for route in app.router.routes
+        }
+    return paths.get(scope.get("endpoint"), "unmatched")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and in-flight requests per route template"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_LATENCY.labels(
+                scope["method"], route_path(scope), str(status_code)
+            ).observe(time.perf_counter() - start)
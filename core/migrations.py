@@ -0,0 +1,40 @@
+"""
+Database schema migrations
+"""
+
+from pathlib import Path
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from core.database import engine
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Revision matching the schema that create_all used to build at startup
+LEGACY_REVISION = "0001_initial"
+
+
+def get_alembic_config() -> Config:
+    """Build the Alembic config for this project"""
+    config = Config(str(BASE_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BASE_DIR / "migrations"))
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def run_migrations(revision: str = "head"):
+    """Upgrade the database schema; run once per deploy, not in every worker"""
+    config = get_alembic_config()
+    tables = inspect(engine).get_table_names()
+    
+    # Databases created before migrations existed have tables but no version
+    if "alembic_version" not in tables and "users" in tables:
+        print(f"📌 Stamping existing database at {LEGACY_REVISION}")
+        command.stamp(config, LEGACY_REVISION)
+    
+    command.upgrade(config, revision)
+    print("✅ Database schema up to date")
+
+
+if __name__ == "__main__":
+    run_migrations()
@@ -0,0 +1,74 @@
+"""
+Keyset (cursor) pagination helpers
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_, literal, String
+from sqlalchemy.orm import Query
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode a (created_at, id) position as an opaque cursor"""
+    payload = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode an opaque cursor back into a (created_at, id) position"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+
+def _timestamp_bound(query: Query, value: datetime):
+    """Bind a cursor timestamp so it compares like the stored column values"""
+    bind = query.session.get_bind()
+    if bind.dialect.name == "sqlite":
+        # SQLite stores CURRENT_TIMESTAMP as text without fractional seconds
+        fmt = "%Y-%m-%d %H:%M:%S.%f" if value.microsecond else "%Y-%m-%d %H:%M:%S"
+        return literal(value.strftime(fmt), String)
+    return value
+
+
+def paginate_keyset(
+    query: Query,
+    model,
+    cursor: Optional[str],
+    limit: int,
+    skip: int = 0
+) -> Tuple[List, Optional[str]]:
+    """Return one page ordered newest first, plus the cursor for the next page"""
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+    
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        bound = _timestamp_bound(query, created_at)
+        query = query.filter(or_(
+            model.created_at < bound,
+            and_(model.created_at == bound, model.id < row_id),
+        ))
+    elif skip:
+        # Legacy offset paging; cost grows with the offset, so clients should follow cursors
+        query = query.offset(skip)
+    
+    rows = query.limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    
+    return rows, next_cursor
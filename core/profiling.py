@@ -0,0 +1,279 @@
+"""
+On-demand CPU and memory profiling for a running worker
+
+Nothing here is imported or installed unless PROFILING_ENABLED is set.
+Each worker profiles itself, so results describe the process that
+served the admin request (its pid is included in every result).
+"""
+
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+# Leaf frames of threads that are parked waiting for work
+IDLE_LEAVES = (
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+)
+
+
+class StackSampler:
+    """Background thread that periodically samples the stacks of all other threads.
+    
+    Samples are aggregated as collapsed stacks ("root;caller;callee count"),
+    the input format of flamegraph.pl, speedscope and inferno.
+    """
+    
+    def __init__(self, interval: float = 0.005, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.recording = threading.Event()
+        self.recording.set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """Start sampling"""
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop sampling and wait for the sampler thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def collapsed(self) -> str:
+        """Samples in collapsed-stack format, hottest first"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+    
+    def _run(self):
+        """Sampling loop; skips ticks while recording is paused"""
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if not self.recording.is_set():
+                continue
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = self._stack(frame)
+                if stack is None:
+                    continue
+                self.stacks[";".join([names.get(thread_id, str(thread_id))] + stack)] += 1
+                self.samples += 1
+    
+    def _stack(self, frame) -> Optional[List[str]]:
+        """Frames from outermost to innermost, or None for an idle thread"""
+        code = frame.f_code
+        if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+            return None
+        
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+
+class RequestProfileSession:
+    """Sample only while requests matching a path pattern are in flight"""
+    
+    def __init__(self, pattern: str, count: int, interval: float, include_idle: bool, timeout: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.pattern = re.compile(pattern)
+        self.count = count
+        self.completed = 0
+        self.active = 0
+        self.deadline = time.monotonic() + timeout
+        self.status = "armed"
+        self.sampler = StackSampler(interval, include_idle)
+        self.sampler.recording.clear()
+        self._lock = threading.Lock()
+    
+    def matches(self, path: str) -> bool:
+        """Whether a request path should be profiled"""
+        return self.status == "armed" and self.pattern.search(path) is not None
+    
+    def enter(self):
+        """A matching request started"""
+        with self._lock:
+            self.active += 1
+            self.sampler.recording.set()
+    
+    def exit(self) -> bool:
+        """A matching request finished; returns True once the session is complete"""
+        with self._lock:
+            self.active -= 1
+            self.completed += 1
+            if self.active == 0:
+                self.sampler.recording.clear()
+            return self.completed >= self.count
+    
+    def finish(self, status_value: str = "completed"):
+        """Stop sampling and keep the result"""
+        if self.status == "armed":
+            self.status = status_value
+            self.sampler.stop()
+    
+    def describe(self) -> dict:
+        """Session state without the samples"""
+        return {
+            "session_id": self.id,
+            "pid": os.getpid(),
+            "pattern": self.pattern.pattern,
+            "status": self.status,
+            "requests_profiled": self.completed,
+            "requests_wanted": self.count,
+            "samples": self.sampler.samples,
+        }
+
+
+class Profiler:
+    """CPU sampling windows, request-triggered sessions and tracemalloc snapshots"""
+    
+    max_sessions = 20
+    
+    def __init__(self):
+        self.sessions: Dict[str, RequestProfileSession] = {}
+        self.armed: Optional[RequestProfileSession] = None
+        self.snapshots: Dict[str, tracemalloc.Snapshot] = {}
+    
+    async def profile_window(self, seconds: float, interval: float, include_idle: bool = False) -> StackSampler:
+        """Sample every thread of this worker for a fixed window"""
+        sampler = StackSampler(interval, include_idle)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop()
+        return sampler
+    
+    def arm(self, pattern: str, count: int, interval: float, include_idle: bool, timeout: float) -> RequestProfileSession:
+        """Profile the next `count` requests whose path matches `pattern`"""
+        if self.armed is not None:
+            self.armed.finish("cancelled")
+        
+        session = RequestProfileSession(pattern, count, interval, include_idle, timeout)
+        session.sampler.start()
+        self.armed = session
+        self.sessions[session.id] = session
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.pop(next(iter(self.sessions)))
+        return session
+    
+    def get_session(self, session_id: str) -> Optional[RequestProfileSession]:
+        """Look up a session, expiring it if its deadline passed"""
+        session = self.sessions.get(session_id)
+        if session is not None and session.status == "armed" and time.monotonic() > session.deadline:
+            self.disarm(session, "expired")
+        return session
+    
+    def cancel(self, session_id: str) -> Optional[RequestProfileSession]:
+        """Stop an armed session early, keeping what it sampled"""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            self.disarm(session, "cancelled")
+        return session
+    
+    def disarm(self, session: RequestProfileSession, status_value: str):
+        """Finish a session and stop matching requests against it"""
+        session.finish(status_value)
+        if self.armed is session:
+            self.armed = None
+    
+    # Memory
+    
+    def is_tracing(self) -> bool:
+        """Whether tracemalloc is running"""
+        return tracemalloc.is_tracing()
+    
+    def start_tracing(self, frames: int) -> bool:
+        """Start tracemalloc; returns False if it was already running"""
+        if tracemalloc.is_tracing():
+            return False
+        tracemalloc.start(frames)
+        return True
+    
+    def stop_tracing(self):
+        """Stop tracemalloc and drop stored snapshots"""
+        tracemalloc.stop()
+        self.snapshots.clear()
+    
+    def take_snapshot(self) -> str:
+        """Store a snapshot of current allocations and return its id"""
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        snapshot_id = uuid.uuid4().hex[:12]
+        self.snapshots[snapshot_id] = snapshot
+        while len(self.snapshots) > self.max_sessions:
+            self.snapshots.pop(next(iter(self.snapshots)))
+        return snapshot_id
+    
+    def top_allocations(self, snapshot_id: str, base_id: Optional[str] = None,
+                        group_by: str = "lineno", path_filter: Optional[str] = None,
+                        limit: int = 25) -> List[dict]:
+        """Largest allocation sites, or largest growth since `base_id`"""
+        snapshot = self.snapshots[snapshot_id]
+        base = self.snapshots[base_id] if base_id else None
+        if path_filter:
+            filters = (tracemalloc.Filter(True, f"*{path_filter}*"),)
+            snapshot = snapshot.filter_traces(filters)
+            base = base.filter_traces(filters) if base else None
+        
+        if base is not None:
+            stats = snapshot.compare_to(base, group_by)
+        else:
+            stats = snapshot.statistics(group_by)
+        
+        return [
+            {
+                "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                "size_bytes": stat.size,
+                "size_diff_bytes": getattr(stat, "size_diff", None),
+                "count": stat.count,
+                "count_diff": getattr(stat, "count_diff", None),
+            }
+            for stat in stats[:limit]
+        ]
+
+
+class ProfilingMiddleware:
+    """ASGI middleware feeding request-triggered profiling sessions"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        # A single attribute check when no session is armed
+        session = profiler.armed
+        if session is None or scope["type"] != "http" or not session.matches(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        
+        session.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if session.exit() or time.monotonic() > session.deadline:
+                profiler.disarm(session, "completed")
+
+
+profiler = Profiler()
@@ -0,0 +1,184 @@
+"""
+Per-user rate limiting and global load shedding for expensive endpoints
+"""
+
+import asyncio
+import math
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+from fastapi import Depends, HTTPException, Request, status
+from core.config import settings
+from core.cache import TTLCache, get_redis
+from core.database import User
+from core.security import get_current_active_user
+from core.metrics import ADMISSION_REJECTIONS, GATE_IN_FLIGHT
+
+# Atomic token bucket: refill by elapsed time, then try to take one token
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RateLimiter:
+    """Token buckets per (client, endpoint class), shared through Redis when available"""
+    
+    def __init__(self):
+        self.rejected = 0
+        self._script = None
+        self._local = TTLCache(100000, 3600)
+        self._lock = threading.Lock()
+    
+    def check(self, subject, endpoint_class: str):
+        """Take a token for a user id (or other client key) or raise 429 with Retry-After"""
+        rate = settings.RATE_LIMIT_RATES.get(endpoint_class)
+        burst = settings.RATE_LIMIT_BURSTS.get(endpoint_class)
+        if not settings.RATE_LIMIT_ENABLED or not rate or not burst:
+            return
+        
+        allowed, retry_after = self._take(f"ratelimit:{endpoint_class}:{subject}", rate, burst)
+        if not allowed:
+            self.rejected += 1
+            ADMISSION_REJECTIONS.labels(endpoint_class, "rate_limited").inc()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded, please slow down",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+    
+    def _take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        """Run the bucket in Redis, or locally if Redis is unavailable"""
+        client = get_redis()
+        if client is not None:
+            try:
+                if self._script is None:
+                    self._script = client.register_script(_TOKEN_BUCKET_SCRIPT)
+                allowed, retry_after = self._script(keys=[key], args=[rate, burst])
+                return bool(int(allowed)), float(retry_after)
+            except Exception as e:
+                print(f"Redis rate limiter failed, using local buckets: {e}")
+        
+        return self._take_local(key, rate, burst)
+    
+    def _take_local(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        """Per-process token bucket"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._local.get(key) or (float(burst), now)
+            tokens = min(burst, tokens + (now - ts) * rate)
+            if tokens >= 1:
+                self._local.set(key, (tokens - 1, now), ttl=burst / rate + 1)
+                return True, 0.0
+            self._local.set(key, (tokens, now), ttl=burst / rate + 1)
+            return False, (1 - tokens) / rate
+
+
+class ConcurrencyGate:
+    """Cap in-flight requests for one endpoint class, with a short bounded queue"""
+    
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.shed = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+    
+    def _reject(self):
+        """Shed the request with 503"""
+        self.shed += 1
+        ADMISSION_REJECTIONS.labels(self.name, "overloaded").inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": str(max(1, math.ceil(self.queue_timeout)))},
+        )
+    
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one in-flight slot for the duration of the request"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        
+        if self._semaphore.locked() and self.waiting >= self.queue_size:
+            self._reject()
+        
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject()
+        finally:
+            self.waiting -= 1
+        
+        self.in_flight += 1
+        GATE_IN_FLIGHT.labels(self.name).inc()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            GATE_IN_FLIGHT.labels(self.name).dec()
+            self._semaphore.release()
+
+
+rate_limiter = RateLimiter()
+concurrency_gates = {
+    name: ConcurrencyGate(
+        name, limit, settings.CONCURRENCY_QUEUE_SIZE, settings.CONCURRENCY_QUEUE_TIMEOUT_SECONDS
+    )
+    for name, limit in settings.CONCURRENCY_LIMITS.items()
+}
+
+
+@asynccontextmanager
+async def _admitted(subject, endpoint_class: str):
+    """Apply the subject's rate limit, then hold a slot under the endpoint's concurrency cap"""
+    rate_limiter.check(subject, endpoint_class)
+    
+    gate = concurrency_gates.get(endpoint_class)
+    if gate is None:
+        yield
+        return
+    
+    async with gate.slot():
+        yield
+
+
+def limit_requests(endpoint_class: str, user_dependency=get_current_active_user):
+    """Route dependency applying the user's rate limit and the global concurrency cap"""
+    async def dependency(current_user: User = Depends(user_dependency)):
+        async with _admitted(current_user.id, endpoint_class):
+            yield
+    
+    return dependency
+
+
+def limit_public_requests(endpoint_class: str):
+    """Route dependency for unauthenticated endpoints, rate limited per client address"""
+    async def dependency(request: Request):
+        client = request.client.host if request.client else "unknown"
+        async with _admitted(f"ip:{client}", endpoint_class):
+            yield
+    
+    return dependency
@@ -0,0 +1,126 @@
+"""
+Conditional-request response cache for per-user read endpoints
+"""
+
+import hashlib
+import json
+from typing import Callable, Optional, Tuple
+from fastapi import Request, Response
+from core.config import settings
+from core.cache import TTLCache, get_redis
+from core.metrics import CACHE_REQUESTS
+
+# Headers that are recomputed rather than replayed from the cache
+_SKIPPED_HEADERS = {"content-length", "etag", "cache-control"}
+
+
+class ResponseCache:
+    """Two-tier cache of rendered response bodies: in-process LRU, then Redis.
+    
+    Keys embed the user's version stamp, so entries never need invalidating;
+    a change produces new keys and old entries simply age out.
+    """
+    
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[int] = None):
+        self.ttl = ttl or settings.RESPONSE_CACHE_TTL_SECONDS
+        self.local = TTLCache(max_size or settings.RESPONSE_CACHE_SIZE, self.ttl, name="response_local")
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+    
+    def get(self, key: str) -> Optional[Tuple[bytes, dict]]:
+        """Look up a rendered (body, headers) pair"""
+        entry = self.local.get(key)
+        if entry is not None:
+            return entry
+        
+        client = get_redis()
+        if client is not None:
+            try:
+                raw = client.get(f"resp:{key}")
+            except Exception:
+                raw = None
+            if raw is not None:
+                header_line, _, body = raw.partition(b"\n")
+                entry = (body, json.loads(header_line))
+                self.local.set(key, entry)
+                return entry
+        
+        return None
+    
+    def set(self, key: str, body: bytes, headers: dict):
+        """Store a rendered (body, headers) pair in both tiers"""
+        self.local.set(key, (body, headers))
+        
+        client = get_redis()
+        if client is not None:
+            try:
+                client.setex(f"resp:{key}", self.ttl, json.dumps(headers).encode() + b"\n" + body)
+            except Exception as e:
+                print(f"Response cache write failed: {e}")
+    
+    def respond(
+        self,
+        request: Request,
+        user_id: int,
+        version: int,
+        build: Callable[[], Response]
+    ) -> Response:
+        """Serve 304, a cached body, or build and cache a fresh response"""
+        resource = request.url.path
+        if request.url.query:
+            resource += "?" + request.url.query
+        
+        digest = hashlib.sha1(f"{user_id}:{version}:{resource}".encode()).hexdigest()[:20]
+        etag = f'W/"{version}-{digest}"'
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            CACHE_REQUESTS.labels("response", "not_modified").inc()
+            return Response(status_code=304, headers=cache_headers)
+        
+        if not settings.RESPONSE_CACHE_ENABLED:
+            response = build()
+            response.headers.update(cache_headers)
+            return response
+        
+        key = f"{user_id}:{version}:{resource}"
+        entry = self.get(key)
+        if entry is None:
+            self.misses += 1
+            CACHE_REQUESTS.labels("response", "miss").inc()
+            response = build()
+            headers = {
+                name: value for name, value in response.headers.items()
+                if name not in _SKIPPED_HEADERS
+            }
+            if response.status_code == 200:
+                self.set(key, response.body, headers)
+            response.headers.update(cache_headers)
+            return response
+        
+        self.hits += 1
+        CACHE_REQUESTS.labels("response", "hit").inc()
+        body, headers = entry
+        return Response(content=body, headers={**headers, **cache_headers})
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    weak = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == weak:
+            return True
+    return False
+
+
+# Shared per-process cache
+response_cache = ResponseCache()
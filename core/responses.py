@@ -0,0 +1,41 @@
+"""
+Fast JSON responses and precompiled response serializers
+"""
+
+from typing import Any, Optional
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+
+# Default response class: orjson encodes datetimes as RFC 3339 natively
+DefaultJSONResponse = ORJSONResponse
+
+
+class Serializer:
+    """Precompiled validator and JSON encoder for a response model.
+    
+    Builds the JSON body straight from ORM objects in pydantic-core,
+    skipping FastAPI's jsonable_encoder pass. Endpoints keep their
+    response_model for the OpenAPI schema and return serializer.response().
+    """
+    
+    def __init__(self, model_type: Any):
+        self.model_type = model_type
+        self._adapter = TypeAdapter(model_type)
+    
+    def validate(self, data: Any) -> Any:
+        """Validate ORM objects or dicts into the response model"""
+        return self._adapter.validate_python(data, from_attributes=True)
+    
+    def dumps(self, data: Any) -> bytes:
+        """Encode data as JSON bytes"""
+        return self._adapter.dump_json(self.validate(data))
+    
+    def response(self, data: Any, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+        """Build a JSON response for data"""
+        return Response(
+            content=self.dumps(data),
+            status_code=status_code,
+            headers=headers,
+            media_type="application/json",
+        )
@@ -2,15 +2,22 @@
 Security utilities for authentication and authorization
 """
 
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, Union
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 from core.config import settings
-from core.database import get_db, User
+from core.database import get_db, SessionLocal, User
+from core.cache import TTLCache, invalidation_bus
+from core.metrics import ADMISSION_REJECTIONS, PASSWORD_HASH_QUEUE_WAIT, PASSWORD_HASH_DURATION
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -18,6 +25,30 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # JWT token scheme
 security = HTTPBearer()
 
+# Authenticated-principal caches: validated token -> user id, user id -> column values
+USER_CACHE_COLUMNS = [column.name for column in User.__table__.columns]
+token_cache = TTLCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS, name="principal_token")
+user_cache = TTLCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS, name="principal_user")
+
+
+def _evict_user(user_id: str):
+    """Drop a cached user record in this process"""
+    user_cache.delete(int(user_id))
+
+
+def _reset_principal_caches():
+    """Forget every cached principal after invalidations may have been missed"""
+    token_cache.clear()
+    user_cache.clear()
+
+
+invalidation_bus.subscribe("user", _evict_user, reset=_reset_principal_caches)
+
+
+def invalidate_user_cache(user_id: int):
+    """Invalidate a user's cached record in every worker after it is modified"""
+    invalidation_bus.publish("user", user_id)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
@@ -29,6 +60,125 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def _timed_call(fn, args: tuple, submitted: float):
+    """Run fn in a pool worker and report (result, queue wait, run time)"""
+    started = time.monotonic()
+    result = fn(*args)
+    return result, started - submitted, time.monotonic() - started
+
+
+class PasswordHashPool:
+    """Size-limited executor for bcrypt work with admission control.
+    
+    Hashing runs off the event loop. Once every worker is busy and the
+    queue is full, new requests are shed with 503 and Retry-After.
+    """
+    
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        queue_limit: Optional[int] = None,
+        executor: Optional[str] = None,
+        retry_after: Optional[int] = None
+    ):
+        self.workers = workers or settings.PASSWORD_HASH_WORKERS
+        self.queue_limit = settings.PASSWORD_HASH_QUEUE_LIMIT if queue_limit is None else queue_limit
+        self.executor_type = executor or settings.PASSWORD_HASH_EXECUTOR
+        self.retry_after = retry_after or settings.PASSWORD_HASH_RETRY_AFTER_SECONDS
+        
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+        
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def capacity(self) -> int:
+        """Requests admitted at once: running plus queued"""
+        return self.workers + self.queue_limit
+    
+    def _get_executor(self) -> Executor:
+        """Create the executor lazily so each server worker gets its own after fork"""
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hash"
+                )
+        return self._executor
+    
+    async def run(self, fn, *args):
+        """Run a hashing function in the pool, or shed load when saturated"""
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                ADMISSION_REJECTIONS.labels("password_hash", "queue_full").inc()
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication service is busy, please retry",
+                    headers={"Retry-After": str(self.retry_after)},
+                )
+            self.in_flight += 1
+        
+        try:
+            loop = asyncio.get_running_loop()
+            result, waited, elapsed = await loop.run_in_executor(
+                self._get_executor(), _timed_call, fn, args, time.monotonic()
+            )
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        
+        PASSWORD_HASH_QUEUE_WAIT.observe(waited)
+        PASSWORD_HASH_DURATION.observe(elapsed)
+        with self._lock:
+            self.completed += 1
+            self.queue_wait_total += waited
+            self.queue_wait_max = max(self.queue_wait_max, waited)
+            self.hash_time_total += elapsed
+            self.hash_time_max = max(self.hash_time_max, elapsed)
+        
+        return result
+    
+    def stats(self) -> dict:
+        """Queue wait and hash time statistics for this process"""
+        completed = self.completed or 1
+        return {
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_avg": self.queue_wait_total / completed,
+            "queue_wait_max": self.queue_wait_max,
+            "hash_time_avg": self.hash_time_total / completed,
+            "hash_time_max": self.hash_time_max,
+        }
+    
+    def shutdown(self):
+        """Stop the pool workers"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordHashPool()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the hashing pool without blocking the event loop"""
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password in the hashing pool without blocking the event loop"""
+    return await password_pool.run(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -56,28 +206,51 @@ async def get_current_user(
     db: Session = Depends(get_db)
 ) -> User:
     """Get the current authenticated user"""
+    return await authenticate_token(credentials.credentials, db)
+
+
+async def authenticate_token(token: str, db: Session) -> User:
+    """Resolve a bearer token to its user, or raise 401"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = verify_token(credentials.credentials)
-        if payload is None:
+    user_id = token_cache.get(token)
+    
+    if user_id is None:
+        try:
+            payload = verify_token(token)
+            if payload is None:
+                raise credentials_exception
+            
+            user_id = payload.get("sub")
+            if user_id is None:
+                raise credentials_exception
+            user_id = int(user_id)
+                
+        except (JWTError, ValueError):
             raise credentials_exception
         
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-            
-    except JWTError:
-        raise credentials_exception
+        # Never cache a token beyond its own expiry
+        expires_in = payload.get("exp", 0) - time.time()
+        if expires_in > 0:
+            token_cache.set(token, user_id, min(token_cache.ttl, expires_in))
     
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    values = user_cache.get(user_id)
+    if values is not None:
+        # Rebuild a clean instance and attach it to this request's session
+        user = User(**values)
+        make_transient_to_detached(user)
+        db.add(user)
+        return user
+    
+    user = db.query(User).filter(User.id == user_id).first()
     if user is None:
         raise credentials_exception
     
+    user_cache.set(user_id, {name: getattr(user, name) for name in USER_CACHE_COLUMNS})
     return user
 
 
@@ -85,4 +258,33 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
     """Get the current active user"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+
+async def authenticate_stream_token(token: str) -> User:
+    """Resolve a token to an active user on a session closed before returning.
+    
+    For streaming responses: get_db's session lives until the response has
+    been sent, which for a long download or event stream would keep a pooled
+    connection checked out the whole time.
+    """
+    db = SessionLocal()
+    try:
+        user = await authenticate_token(token, db)
+        if not user.is_active:
+            raise HTTPException(status_code=400, detail="Inactive user")
+        return user
+    finally:
+        await run_in_threadpool(db.close)
+
+
+async def get_current_stream_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+    """Get the current active user without holding a database session (for streaming routes)"""
+    return await authenticate_stream_token(credentials.credentials)
+
+
+async def get_current_admin_user(current_user: User = Depends(get_current_active_user)) -> User:
+    """Get the current user, requiring their id to be listed in ADMIN_USER_IDS"""
+    if current_user.id not in settings.ADMIN_USER_IDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     return current_user 
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""
+Production server launcher
+
+    python -m core.server --host 0.0.0.0 --port 8000
+
+Sizes the worker pool from the CPUs this process may use, applies
+migrations and warms the application up once in the parent, then forks
+gunicorn workers running uvicorn with uvloop and httptools when they are
+installed. On SIGTERM or SIGHUP workers stop accepting connections and
+finish in-flight requests for up to GRACEFUL_TIMEOUT_SECONDS; with
+MAX_REQUESTS set, each worker is replaced after serving that many.
+
+Nothing that imports prometheus_client or the database may be imported
+at module level: worker count and the metrics directory must be settled
+before those modules read them.
+"""
+
+import argparse
+import importlib.util
+import math
+import os
+import shutil
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+from core.config import settings
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on, honouring affinity and cgroup quotas"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    
+    # Containers usually limit CPU through a cgroup v2 quota rather than affinity
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def worker_count() -> int:
+    """WORKERS when set, otherwise WORKERS_PER_CORE per available CPU, capped at MAX_WORKERS"""
+    if settings.WORKERS > 0:
+        return settings.WORKERS
+    workers = max(1, round(available_cpus() * settings.WORKERS_PER_CORE))
+    if settings.MAX_WORKERS > 0:
+        workers = min(workers, settings.MAX_WORKERS)
+    return workers
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def event_loop() -> str:
+    """Fastest installed event loop implementation"""
+    return "uvloop" if _installed("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    """Fastest installed HTTP/1.1 parser"""
+    return "httptools" if _installed("httptools") else "h11"
+
+
+def prepare_multiprocess_dir(path: str = "./data/prometheus"):
+    """Point workers at a fresh shared metrics directory; call before prometheus_client is imported"""
+    path = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", path)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def reset_connections():
+    """Drop pooled connections so the parent and its workers never share a socket"""
+    from core.database import engine, read_engine
+    
+    engine.dispose(close=False)
+    if read_engine is not engine:
+        read_engine.dispose(close=False)
+    
+    # web3 caches HTTP sessions per thread id, and a forked main thread keeps its id
+    try:
+        from web3._utils import request as web3_request
+        web3_request._session_cache.clear()
+    except (ImportError, AttributeError):
+        pass
+
+
+def warm_up(application):
+    """One-time start-up work done in the parent so every forked worker inherits it"""
+    from core.database import engine
+    from core.security import pwd_context
+    
+    application.openapi()
+    pwd_context.dummy_verify()  # Loads the bcrypt backend
+    with engine.connect():
+        pass
+    engine.dispose()
+
+
+class AppWorker(UvicornWorker):
+    """uvicorn worker using the fastest available event loop and HTTP parser"""
+    CONFIG_KWARGS = {
+        "loop": event_loop(),
+        "http": http_protocol(),
+        "lifespan": "on",
+        # Leave part of the graceful window for lifespan shutdown (audit log drain)
+        "timeout_graceful_shutdown": max(1, int(settings.GRACEFUL_TIMEOUT_SECONDS * 0.75)),
+    }
+
+
+def _post_fork(server, worker):
+    reset_connections()
+
+
+def _child_exit(server, worker):
+    # Runs in the parent, so it also covers workers that were killed
+    from core.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
+
+class ProductionServer(BaseApplication):
+    """gunicorn application serving an already imported ASGI app"""
+    
+    def __init__(self, application, options: dict):
+        self.application = application
+        self.options = options
+        super().__init__()
+    
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+    
+    def load(self):
+        return self.application
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Digital Shadow production server")
+    parser.add_argument("--host", default="0.0.0.0", help="Host to bind to")
+    parser.add_argument("--port", type=int, default=8000, help="Port to bind to")
+    parser.add_argument("--workers", type=int, help="Override the computed worker count")
+    parser.add_argument("--skip-migrations", action="store_true", help="Do not apply migrations on launch")
+    args = parser.parse_args()
+    
+    # Per-worker pool sizing reads WORKERS when core.database is imported
+    workers = args.workers or worker_count()
+    settings.WORKERS = workers
+    os.environ["WORKERS"] = str(workers)
+    prepare_multiprocess_dir()
+    
+    if not args.skip_migrations:
+        from core.migrations import run_migrations
+        run_migrations()
+    
+    from app import app as application
+    warm_up(application)
+    
+    print(f"🚀 Starting {workers} workers ({event_loop()} loop, {http_protocol()} parser)")
+    ProductionServer(application, {
+        "bind": f"{args.host}:{args.port}",
+        "workers": workers,
+        "worker_class": "core.server.AppWorker",
+        "preload_app": True,
+        "graceful_timeout": settings.GRACEFUL_TIMEOUT_SECONDS,
+        "timeout": settings.WORKER_TIMEOUT_SECONDS,
+        "keepalive": settings.KEEPALIVE_SECONDS,
+        "max_requests": settings.MAX_REQUESTS,
+        "max_requests_jitter": settings.MAX_REQUESTS_JITTER,
+        "post_fork": _post_fork,
+        "child_exit": _child_exit,
+        "loglevel": "info",
+    }).run()
+
+
+if __name__ == "__main__":
+    main()
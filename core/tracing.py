@@ -0,0 +1,213 @@
+"""
+OpenTelemetry tracing
+
+Spans are created for every request, every `timed` service stage and
+every SQL statement. Until configure_tracing() installs a provider the
+tracer is a no-op, so instrumented code costs next to nothing with
+TRACING_ENABLED unset. Incoming W3C `traceparent` headers are honoured,
+so traces continue across nodes.
+"""
+
+import json
+import os
+import threading
+from typing import Callable, Dict, Optional
+from opentelemetry import context, propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor, SpanExporter, SpanExportResult
+)
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from core.config import settings
+
+tracer = trace.get_tracer("digital_shadow")
+
+MAX_STATEMENT_LENGTH = 2000
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """Append finished spans to a file, one JSON object per line"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    
+    def export(self, spans) -> SpanExportResult:
+        lines = "".join(json.dumps(json.loads(span.to_json())) + "\n" for span in spans)
+        with self._lock, open(self.path, "a") as f:
+            f.write(lines)
+        return SpanExportResult.SUCCESS
+    
+    def shutdown(self):
+        pass
+
+
+def _otlp_exporter() -> SpanExporter:
+    """OTLP over HTTP; endpoint from TRACING_OTLP_ENDPOINT or the standard OTEL_* variables"""
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    
+    if settings.TRACING_OTLP_ENDPOINT:
+        return OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)
+    return OTLPSpanExporter()
+
+
+EXPORTERS: Dict[str, Callable[[], SpanExporter]] = {
+    "otlp": _otlp_exporter,
+    "console": ConsoleSpanExporter,
+    "file": lambda: JsonLinesSpanExporter(settings.TRACING_FILE_PATH.replace("{pid}", str(os.getpid()))),
+    "memory": InMemorySpanExporter,
+}
+
+_provider: Optional[TracerProvider] = None
+
+
+def register_exporter(name: str, factory: Callable[[], SpanExporter]):
+    """Make another exporter selectable through TRACING_EXPORTER"""
+    EXPORTERS[name] = factory
+
+
+def configure_tracing(exporter: Optional[SpanExporter] = None) -> Optional[TracerProvider]:
+    """Install the tracer provider for this process.
+    
+    Call once per process after forking (export threads do not survive a
+    fork). Passing an exporter, e.g. an InMemorySpanExporter in tests,
+    enables tracing regardless of TRACING_ENABLED.
+    """
+    global _provider
+    if _provider is not None:
+        return _provider
+    if exporter is None:
+        if not settings.TRACING_ENABLED:
+            return None
+        exporter = EXPORTERS[settings.TRACING_EXPORTER]()
+    
+    provider = TracerProvider(
+        resource=Resource.create({
+            "service.name": settings.TRACING_SERVICE_NAME,
+            "service.version": settings.APP_VERSION,
+            "process.pid": os.getpid(),
+        }),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)),
+    )
+    # Export synchronously for in-memory capture so tests see spans immediately
+    processor = SimpleSpanProcessor if isinstance(exporter, InMemorySpanExporter) else BatchSpanProcessor
+    provider.add_span_processor(processor(exporter))
+    trace.set_tracer_provider(provider)
+    _provider = provider
+    return provider
+
+
+def shutdown_tracing():
+    """Flush pending spans"""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def inject_context() -> dict:
+    """Carrier with the current trace context, for work handed to another process"""
+    carrier = {}
+    propagate.inject(carrier)
+    return carrier
+
+
+def attach_context(carrier: Optional[dict]):
+    """Make a propagated context current; returns a token for detach_context"""
+    return context.attach(propagate.extract(carrier or {}))
+
+
+def detach_context(token):
+    """Restore the context that was current before attach_context"""
+    context.detach(token)
+
+
+def instrument_engine_tracing(engine, name: str):
+    """Create a span for every SQL statement run on an engine"""
+    from sqlalchemy import event
+    
+    system = engine.dialect.name
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, execution_context, executemany):
+        span = tracer.start_span(
+            f"db.{statement.split(None, 1)[0].lower() if statement else 'query'}",
+            kind=SpanKind.CLIENT,
+            attributes={
+                "db.system": system,
+                "db.pool": name,
+                "db.statement": statement[:MAX_STATEMENT_LENGTH],
+                "db.executemany": executemany,
+            },
+        )
+        execution_context._trace_span = span
+    
+    def after_cursor_execute(conn, cursor, statement, parameters, execution_context, executemany):
+        span = getattr(execution_context, "_trace_span", None)
+        if span is not None:
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                span.set_attribute("db.rowcount", cursor.rowcount)
+            span.end()
+    
+    def handle_error(exception_context):
+        execution_context = exception_context.execution_context
+        span = getattr(execution_context, "_trace_span", None) if execution_context else None
+        if span is not None:
+            span.record_exception(exception_context.original_exception)
+            span.set_status(Status(StatusCode.ERROR))
+            span.end()
+    
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+def web3_tracing_middleware(make_request, w3):
+    """web3 middleware giving each JSON-RPC call its own span"""
+    def middleware(method, params):
+        with tracer.start_as_current_span(f"rpc.{method}", kind=SpanKind.CLIENT, attributes={
+            "rpc.system": "jsonrpc",
+            "rpc.method": method,
+        }):
+            return make_request(method, params)
+    return middleware
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span per request, continuing incoming trace context"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        from core.metrics import route_path
+        
+        carrier = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        with tracer.start_as_current_span(
+            f"HTTP {scope['method']}",
+            context=propagate.extract(carrier),
+            kind=SpanKind.SERVER,
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+        ) as span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = route_path(scope)
+                span.update_name(f"{scope['method']} {route}")
+                span.set_attribute("http.route", route)
+                span.set_attribute("http.status_code", status_code)
+                if status_code >= 500:
+                    span.set_status(Status(StatusCode.ERROR))
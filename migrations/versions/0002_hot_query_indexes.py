@@ -0,0 +1,27 @@
+"""Indexes for listing, history and hash lookup queries
+
+Revision ID: 0002_hot_query_indexes
+Revises: 0001_initial
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+
+revision = "0002_hot_query_indexes"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_documents_file_hash", "documents", ["file_hash"])
+    op.create_index("ix_documents_owner_id_created_at", "documents", ["owner_id", "created_at"])
+    op.create_index("ix_verifications_user_id_created_at", "verifications", ["user_id", "created_at"])
+    op.create_index("ix_verifications_document_id_created_at", "verifications", ["document_id", "created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_verifications_document_id_created_at", table_name="verifications")
+    op.drop_index("ix_verifications_user_id_created_at", table_name="verifications")
+    op.drop_index("ix_documents_owner_id_created_at", table_name="documents")
+    op.drop_index("ix_documents_file_hash", table_name="documents")
@@ -0,0 +1,51 @@
+"""Per-user statistics counters
+
+Revision ID: 0003_user_stats
+Revises: 0002_hot_query_indexes
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_user_stats"
+down_revision = "0002_hot_query_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "user_stats",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("total_verifications", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("successful_verifications", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("failed_verifications", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("total_documents", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("verified_documents", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("bytes_stored", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    
+    # Backfill counters for existing users
+    op.execute(sa.text("""
+        INSERT INTO user_stats (
+            user_id, total_verifications, successful_verifications, failed_verifications,
+            total_documents, verified_documents, bytes_stored
+        )
+        SELECT
+            u.id,
+            (SELECT COUNT(*) FROM verifications v WHERE v.user_id = u.id),
+            (SELECT COUNT(*) FROM verifications v WHERE v.user_id = u.id AND v.status = 'success'),
+            (SELECT COUNT(*) FROM verifications v WHERE v.user_id = u.id AND v.status = 'failed'),
+            (SELECT COUNT(*) FROM documents d WHERE d.owner_id = u.id),
+            (SELECT COUNT(*) FROM documents d WHERE d.owner_id = u.id AND d.is_verified = :verified),
+            (SELECT COALESCE(SUM(d.file_size), 0) FROM documents d WHERE d.owner_id = u.id)
+        FROM users u
+    """).bindparams(verified=True))
+
+
+def downgrade():
+    op.drop_table("user_stats")
@@ -0,0 +1,24 @@
+"""Version stamp on user_stats for response caching
+
+Revision ID: 0004_user_stats_version
+Revises: 0003_user_stats
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_user_stats_version"
+down_revision = "0003_user_stats"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("user_stats") as batch_op:
+        batch_op.add_column(sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"))
+
+
+def downgrade():
+    with op.batch_alter_table("user_stats") as batch_op:
+        batch_op.drop_column("version")
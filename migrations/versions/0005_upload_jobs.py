@@ -0,0 +1,49 @@
+"""Upload pipeline jobs; file_hash is filled in asynchronously
+
+Revision ID: 0005_upload_jobs
+Revises: 0004_user_stats_version
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_upload_jobs"
+down_revision = "0004_user_stats_version"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "upload_jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("document_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("stage", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["document_id"], ["documents.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_upload_jobs_id", "upload_jobs", ["id"])
+    op.create_index("ix_upload_jobs_document_id", "upload_jobs", ["document_id"])
+    op.create_index("ix_upload_jobs_status_lease_expires_at", "upload_jobs", ["status", "lease_expires_at"])
+    
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.alter_column("file_hash", existing_type=sa.String(), nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.alter_column("file_hash", existing_type=sa.String(), nullable=False)
+    
+    op.drop_index("ix_upload_jobs_status_lease_expires_at", table_name="upload_jobs")
+    op.drop_index("ix_upload_jobs_document_id", table_name="upload_jobs")
+    op.drop_index("ix_upload_jobs_id", table_name="upload_jobs")
+    op.drop_table("upload_jobs")
@@ -0,0 +1,50 @@
+"""Document tombstones and the archive for verifications of deleted documents
+
+Revision ID: 0006_document_tombstones
+Revises: 0005_upload_jobs
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_document_tombstones"
+down_revision = "0005_upload_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.add_column(sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True))
+    op.create_index("ix_documents_deleted_at", "documents", ["deleted_at"])
+    
+    op.create_table(
+        "verifications_archive",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("document_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("verification_type", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("blockchain_tx_hash", sa.String(), nullable=True),
+        sa.Column("ipfs_hash", sa.String(), nullable=True),
+        sa.Column("verification_metadata", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("archived_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_verifications_archive_user_id_created_at", "verifications_archive", ["user_id", "created_at"]
+    )
+    op.create_index("ix_verifications_archive_document_id", "verifications_archive", ["document_id"])
+
+
+def downgrade():
+    op.drop_index("ix_verifications_archive_document_id", table_name="verifications_archive")
+    op.drop_index("ix_verifications_archive_user_id_created_at", table_name="verifications_archive")
+    op.drop_table("verifications_archive")
+    
+    op.drop_index("ix_documents_deleted_at", table_name="documents")
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.drop_column("deleted_at")
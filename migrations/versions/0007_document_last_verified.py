@@ -0,0 +1,26 @@
+"""Track when the integrity scrubber last checked each document
+
+Revision ID: 0007_document_last_verified
+Revises: 0006_document_tombstones
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007_document_last_verified"
+down_revision = "0006_document_tombstones"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.add_column(sa.Column("last_verified_at", sa.DateTime(timezone=True), nullable=True))
+    op.create_index("ix_documents_last_verified_at", "documents", ["last_verified_at"])
+
+
+def downgrade():
+    op.drop_index("ix_documents_last_verified_at", table_name="documents")
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.drop_column("last_verified_at")
@@ -0,0 +1,379 @@
+"""
+Audit log service for buffered, batched Verification writes
+"""
+
+import asyncio
+import glob
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+from sqlalchemy import select
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.database import SessionLocal, Document, Verification
+
+AUDIT_COLUMNS = [
+    column.name for column in Verification.__table__.columns if column.name != "id"
+]
+ATTEMPTS_KEY = "_attempts"  # Failed inserts of a queued row, carried alongside its columns
+DEAD_LETTER_FILE = "audit-dead-letter.jsonl"
+
+# Errors caused by a row's own values rather than by the database being unavailable
+ROW_ERRORS = (IntegrityError, DataError)
+
+
+def _pid_alive(pid: int) -> bool:
+    """Check whether a process with this pid is still running"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AuditLogWriter:
+    """Queue Verification records and insert them in batches.
+    
+    Modes:
+      sync     - add and commit on the caller's session (no batching); a
+                 record is durable and readable once record() returns
+      buffered - queue in memory; records not yet flushed are lost on a crash
+      wal      - queue in memory and append to a local write-ahead file first;
+                 unflushed records are replayed on the next start (at-least-once)
+    
+    In the batching modes record() returns before the row is in the
+    database: history and stats reflect it after the next flush, up to
+    AUDIT_FLUSH_INTERVAL_MS later. Write-ahead appends reach the OS before
+    record() returns, so they survive a process crash, but are only fsynced
+    (with AUDIT_WAL_FSYNC) when the flusher picks them up; an OS crash or
+    power loss can lose up to one flush interval of acknowledged records.
+    
+    A row the database rejects is retried on its own and, after
+    AUDIT_MAX_ATTEMPTS, moved to a dead-letter file so it cannot hold up
+    the rows behind it.
+    """
+    
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        flush_interval_ms: Optional[int] = None,
+        wal_dir: Optional[str] = None,
+        fsync: Optional[bool] = None
+    ):
+        self.mode = mode or settings.AUDIT_WRITE_MODE
+        self.batch_size = batch_size or settings.AUDIT_BATCH_SIZE
+        self.flush_interval = (flush_interval_ms or settings.AUDIT_FLUSH_INTERVAL_MS) / 1000
+        self.wal_dir = Path(wal_dir or settings.AUDIT_WAL_DIR)
+        self.fsync = settings.AUDIT_WAL_FSYNC if fsync is None else fsync
+        self.max_attempts = settings.AUDIT_MAX_ATTEMPTS
+        
+        self._buffer: List[dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wal_file = None
+        self._wal_path: Optional[Path] = None
+        self._wal_sequence = 0
+        self._wal_dirty = False
+        self._flushed_segments: List[Path] = []
+    
+    @property
+    def running(self) -> bool:
+        """Whether the background flusher is active"""
+        return self._task is not None and not self._task.done()
+    
+    async def start(self):
+        """Replay orphaned write-ahead files and start the background flusher"""
+        if self.mode == "sync":
+            return
+        
+        if self.mode == "wal":
+            self.wal_dir.mkdir(parents=True, exist_ok=True)
+            recovered = await asyncio.to_thread(self.recover)
+            if recovered:
+                print(f"Recovered {recovered} audit records from write-ahead log")
+            self._open_wal_segment()
+        
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the flusher and drain everything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        await asyncio.to_thread(self.flush)
+        
+        if self._wal_file is not None:
+            self._close_wal(self._wal_file)
+            self._wal_file = None
+            if not self._buffer and self._wal_path.exists():
+                self._wal_path.unlink()
+    
+    def record(self, db: Session, verification: Verification):
+        """Queue a Verification record (committed immediately in sync mode)"""
+        self.record_many(db, [verification])
+    
+    def record_many(self, db: Session, verifications: List[Verification]):
+        """Queue several Verification records at once: one commit in sync mode, one fsync in wal mode"""
+        if not verifications:
+            return
+        if self.mode == "sync" or not self.running:
+            db.add_all(verifications)
+            db.commit()
+            return
+        
+        rows = []
+        for verification in verifications:
+            row = {name: getattr(verification, name) for name in AUDIT_COLUMNS}
+            if row.get("created_at") is None:
+                row["created_at"] = datetime.now(timezone.utc)
+            rows.append(row)
+        
+        with self._lock:
+            if self._wal_file is not None:
+                self._append_wal(rows)
+            self._buffer.extend(rows)
+            pending = len(self._buffer)
+        
+        if pending >= self.batch_size:
+            self._notify()
+    
+    def _notify(self):
+        """Wake the flusher; callers may be on the event loop or in a worker thread"""
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._wake.set()
+            return
+        try:
+            # asyncio.Event is not thread-safe: set it from the loop so its waiter is woken
+            self._loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            pass  # Loop closed; stop() drains what is left
+    
+    def flush(self) -> int:
+        """Insert all queued records; returns rows written"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._buffer:
+                    return 0
+                batch, self._buffer = self._buffer, []
+                # Rows put back by a failed flush are already in earlier segments
+                previous = self._wal_file if self._wal_dirty else None
+                if previous is not None:
+                    self._flushed_segments.append(self._wal_path)
+                    self._open_wal_segment()
+            
+            if previous is not None:
+                # Group commit: one fsync covers every record appended since the last flush
+                self._close_wal(previous)
+            
+            try:
+                written, retry = self._write(batch)
+            except Exception as e:
+                print(f"Audit log flush failed, will retry: {e}")
+                with self._lock:
+                    self._buffer[:0] = batch
+                return 0
+            
+            if retry:
+                # Carry the rows still owed into the live segment so the old ones can go
+                with self._lock:
+                    if self._wal_file is not None:
+                        self._append_wal(retry)
+                    self._buffer[:0] = retry
+            
+            for segment in self._flushed_segments:
+                segment.unlink(missing_ok=True)
+            self._flushed_segments = []
+            
+            return written
+    
+    def recover(self) -> int:
+        """Insert records left in write-ahead files by processes that died"""
+        recovered = 0
+        
+        segments = glob.glob(str(self.wal_dir / "audit-*.wal"))
+        segments += glob.glob(str(self.wal_dir / "audit-*.wal.replay-*"))
+        
+        for path in segments:
+            name = Path(path).name
+            owner = name.rsplit("-", 1)[1] if ".replay-" in name else name.split("-")[1]
+            if int(owner) != os.getpid() and _pid_alive(int(owner)):
+                continue
+            
+            # Claim the segment atomically so only one worker replays it
+            claimed = f"{path.split('.replay-')[0]}.replay-{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            
+            rows = []
+            with open(claimed) as f:
+                for line in f:
+                    try:
+                        rows.append(self._decode(line))
+                    except ValueError:
+                        continue  # Torn final write
+            
+            owed = []
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                try:
+                    written, retry = self._write(batch)
+                except Exception as e:
+                    print(f"Audit log replay of {name} failed, queueing it: {e}")
+                    written, retry = 0, batch
+                recovered += written
+                owed.extend(retry)
+            
+            if owed:
+                # Startup must not depend on the database accepting old records; the
+                # flusher retries them and removes the segment once they are written
+                with self._lock:
+                    self._buffer[:0] = owed
+                    self._flushed_segments.append(Path(claimed))
+            else:
+                os.remove(claimed)
+        
+        return recovered
+    
+    async def _run(self):
+        """Flush on a timer, or sooner when a full batch is queued"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await asyncio.to_thread(self.flush)
+    
+    def _write(self, rows: List[dict]) -> Tuple[int, List[dict]]:
+        """Insert rows, isolating any the database rejects; returns (rows written, rows to retry later).
+        
+        Errors that are not about a row's values (the database is down, say)
+        propagate from the batch insert, leaving every row to the caller.
+        """
+        try:
+            self._insert(rows)
+            return len(rows), []
+        except ROW_ERRORS as e:
+            if len(rows) == 1:
+                return 0, self._rejected(rows, e)
+        
+        # One bad row fails the whole batch, so find it by inserting one at a time
+        written, retry = 0, []
+        for index, row in enumerate(rows):
+            try:
+                self._insert([row])
+                written += 1
+            except ROW_ERRORS as e:
+                retry.extend(self._rejected([row], e))
+            except Exception as e:
+                print(f"Audit log insert failed, will retry: {e}")
+                retry.extend(rows[index:])
+                break
+        return written, retry
+    
+    def _rejected(self, rows: List[dict], error: Exception) -> List[dict]:
+        """Count a rejection against each row; returns those with attempts left, dead-lettering the rest"""
+        # The reaper may have removed the document since the row was queued; that will not
+        # change on retry, and its archive keeps only verifications that were written
+        gone = self._missing_documents(rows)
+        if gone:
+            self._dead_letter([row for row in rows if row["document_id"] in gone], "Document was deleted")
+            rows = [row for row in rows if row["document_id"] not in gone]
+        
+        retry, dead = [], []
+        for row in rows:
+            row[ATTEMPTS_KEY] = row.get(ATTEMPTS_KEY, 0) + 1
+            (dead if row[ATTEMPTS_KEY] >= self.max_attempts else retry).append(row)
+        if dead:
+            self._dead_letter(dead, error)
+        return retry
+    
+    def _missing_documents(self, rows: List[dict]) -> Set[int]:
+        """Ids of the rows' documents that no longer exist"""
+        document_ids = {row["document_id"] for row in rows}
+        db = SessionLocal()
+        try:
+            return document_ids - set(db.execute(select(Document.id).where(Document.id.in_(document_ids))).scalars())
+        except Exception:
+            return set()  # Treat the rows as ordinary rejections
+        finally:
+            db.close()
+    
+    def _dead_letter(self, rows: List[dict], error):
+        """Set aside rows the database keeps rejecting"""
+        reason = str(error).splitlines()[0] if str(error) else type(error).__name__
+        print(f"Audit log dropping {len(rows)} rejected records to {DEAD_LETTER_FILE}: {reason}")
+        try:
+            self.wal_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.wal_dir / DEAD_LETTER_FILE, "a") as f:
+                f.write("".join(json.dumps({**row, "_error": reason}, default=str) + "\n" for row in rows))
+        except OSError as e:
+            print(f"Could not write audit dead-letter file: {e}")
+    
+    def _insert(self, rows: List[dict]):
+        """Bulk insert rows through the ORM so user_stats stays in step"""
+        db = SessionLocal()
+        try:
+            db.add_all([Verification(**{name: row[name] for name in AUDIT_COLUMNS if name in row}) for row in rows])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    def _open_wal_segment(self):
+        """Start a new write-ahead segment for this process (the caller closes the previous one)"""
+        self._wal_sequence += 1
+        self._wal_dirty = False
+        self._wal_path = self.wal_dir / f"audit-{os.getpid()}-{self._wal_sequence}.wal"
+        self._wal_file = open(self._wal_path, "a", buffering=1)
+    
+    def _append_wal(self, rows: List[dict]):
+        """Append records to the current segment (handed to the OS, fsynced at the next flush)"""
+        self._wal_file.write("".join(json.dumps(row, default=str) + "\n" for row in rows))
+        self._wal_file.flush()
+        self._wal_dirty = True
+    
+    def _close_wal(self, wal_file):
+        """Close a segment, first forcing it to disk when AUDIT_WAL_FSYNC is on"""
+        try:
+            if self.fsync:
+                wal_file.flush()
+                os.fsync(wal_file.fileno())
+        finally:
+            wal_file.close()
+    
+    def _decode(self, line: str) -> dict:
+        """Decode one write-ahead line back into column values"""
+        row = json.loads(line)
+        if row.get("created_at"):
+            row["created_at"] = datetime.fromisoformat(row["created_at"])
+        return row
+
+
+# Shared per-process writer, started and drained by the application lifespan
+audit_log = AuditLogWriter()
@@ -7,6 +7,8 @@ from typing import Optional
 from web3 import Web3
 from web3.exceptions import ContractLogicError
 from core.config import settings
+from core.metrics import timed
+from core.tracing import web3_tracing_middleware
 import json
 
 
@@ -23,6 +25,7 @@ class BlockchainService:
         try:
             # Initialize Web3
             self.w3 = Web3(Web3.HTTPProvider(settings.ETHEREUM_RPC_URL))
+            self.w3.middleware_onion.add(web3_tracing_middleware, "tracing")
             
             # Check if connected
             if not self.w3.is_connected():
@@ -70,7 +73,20 @@ class BlockchainService:
         ipfs_hash: Optional[str], 
         user_id: int
     ) -> Optional[str]:
-        """Store document hash on blockchain"""
+        """Store document hash on blockchain and wait for the receipt"""
+        tx_hash = await self.send_document_hash(file_hash, ipfs_hash, user_id)
+        if tx_hash and await self.wait_for_confirmation(tx_hash):
+            return tx_hash
+        return None
+    
+    @timed("blockchain", "send")
+    async def send_document_hash(
+        self, 
+        file_hash: str, 
+        ipfs_hash: Optional[str], 
+        user_id: int
+    ) -> Optional[str]:
+        """Submit the document hash transaction without waiting for it to be mined"""
         if not self.w3 or not self.w3.is_connected():
             print("Blockchain not connected - skipping storage")
             return None
@@ -103,15 +119,28 @@ class BlockchainService:
                 # For demo purposes, return a mock transaction hash
                 tx_hash = self.w3.to_hex(self.w3.keccak(f"{file_hash}{ipfs_hash}{user_id}".encode()))
             
-            # Wait for transaction receipt
-            tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
-            
             return self.w3.to_hex(tx_hash)
             
         except Exception as e:
             print(f"Error storing document on blockchain: {e}")
             return None
     
+    @timed("blockchain", "confirm")
+    async def wait_for_confirmation(self, transaction_hash: str, timeout: int = 120) -> Optional[bool]:
+        """Wait for a transaction receipt and report whether it succeeded (None when that could not be found out)"""
+        if not self.w3 or not self.w3.is_connected():
+            print("Blockchain not connected - skipping confirmation")
+            return None
+        
+        try:
+            tx_receipt = self.w3.eth.wait_for_transaction_receipt(transaction_hash, timeout=timeout)
+            return tx_receipt.get("status", 1) == 1
+            
+        except Exception as e:
+            print(f"Error confirming blockchain transaction: {e}")
+            return None
+    
+    @timed("blockchain", "verify")
     async def verify_document_hash(
         self, 
         file_hash: str, 
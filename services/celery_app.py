@@ -0,0 +1,62 @@
+"""
+Celery application for the upload post-processing pipeline
+
+Run one worker pool per stage so each scales on its own, e.g.:
+    celery -A services.celery_app worker -Q pipeline.hash,pipeline.confirm -c 8
+    celery -A services.celery_app worker -Q pipeline.ipfs_add,pipeline.pin -c 4
+    celery -A services.celery_app worker -Q pipeline.anchor -c 2
+"""
+
+from typing import Optional
+from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
+from core.config import settings
+from core.tracing import configure_tracing, shutdown_tracing, inject_context, attach_context, detach_context
+from services.pipeline_service import pipeline, STAGES
+
+celery_app = Celery(
+    "digital_shadow",
+    broker=settings.CELERY_BROKER_URL or settings.REDIS_URL,
+)
+celery_app.conf.update(
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    task_default_queue=f"pipeline.{STAGES[0]}",
+)
+
+
+@worker_process_init.connect
+def _init_worker_tracing(**kwargs):
+    """Each forked worker process exports its own spans"""
+    configure_tracing()
+
+
+@worker_process_shutdown.connect
+def _shutdown_worker_tracing(**kwargs):
+    shutdown_tracing()
+
+
+def enqueue_stage(job_id: int, stage: str, countdown: float = 0):
+    """Send a job's stage to that stage's queue, carrying the current trace context"""
+    run_stage_task.apply_async(
+        args=[job_id, stage], kwargs={"trace_context": inject_context()},
+        queue=f"pipeline.{stage}", countdown=countdown
+    )
+
+
+@celery_app.task(name="pipeline.run_stage")
+def run_stage_task(job_id: int, stage: str, trace_context: Optional[dict] = None):
+    """Run one pipeline stage and enqueue whatever comes next"""
+    token = attach_context(trace_context)
+    try:
+        delay = 0
+        try:
+            following = pipeline.run_stage(job_id, stage)
+        except Exception as e:
+            following, delay = pipeline.record_failure(job_id, stage, e)
+        
+        if following:
+            enqueue_stage(job_id, following, countdown=delay)
+    finally:
+        detach_context(token)
@@ -0,0 +1,266 @@
+"""
+In-memory index of registered content hashes for public verify-by-content
+"""
+
+import asyncio
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import func, select
+from core.config import settings
+from core.cache import TTLCache, invalidation_bus
+from core.database import SessionLocal, ReadSessionLocal, Document
+from core.metrics import CACHE_REQUESTS
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter keyed by hex SHA-256 digests.
+    
+    The keys are already uniformly distributed, so bit positions come
+    straight from the digest by double hashing instead of rehashing.
+    """
+    
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self._bits = bytearray(math.ceil(self.size / 8))
+        self._lock = threading.Lock()
+    
+    def _positions(self, file_hash: str):
+        h1 = int(file_hash[:16], 16)
+        h2 = int(file_hash[16:32], 16) | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+    
+    def add(self, file_hash: str):
+        """Insert a hash (writers are serialised; readers never block)"""
+        with self._lock:
+            new = False
+            for position in self._positions(file_hash):
+                byte, mask = position >> 3, 1 << (position & 7)
+                if not self._bits[byte] & mask:
+                    self._bits[byte] |= mask
+                    new = True
+            # Re-adding a hash already present leaves the count alone
+            if new:
+                self.count += 1
+    
+    def __contains__(self, file_hash: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(file_hash))
+    
+    @property
+    def saturated(self) -> bool:
+        """More entries than the filter was sized for, so the error rate is above target"""
+        return self.count > self.capacity
+
+
+class ContentIndex:
+    """Bloom filter of every registered file hash, in front of the indexed documents table.
+    
+    Unknown hashes are answered from memory without touching the database.
+    The filter is built once at start-up and kept current incrementally:
+    hashes are added as the pipeline publishes them, and a periodic scan of
+    new document ids catches anything a worker missed. A full rebuild on a
+    longer interval resizes the filter and drops deleted content.
+    """
+    
+    def __init__(self):
+        self.filter: Optional[BloomFilter] = None
+        self.results = TTLCache(
+            settings.PUBLIC_VERIFY_CACHE_SIZE, settings.PUBLIC_VERIFY_CACHE_SECONDS, name="public_verify"
+        )
+        self.last_rebuild = 0.0
+        self._scan_from = 0  # Lowest document id that may still gain a hash
+        self._pending: Optional[list] = None  # Hashes published while a rebuild is running
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def ready(self) -> bool:
+        return self.filter is not None
+    
+    def add(self, file_hash: str):
+        """Record a newly registered hash"""
+        file_hash = file_hash.lower()
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(file_hash)
+            if self.filter is not None:
+                self.filter.add(file_hash)
+    
+    def publish(self, file_hash: str):
+        """Tell every worker's index about a new hash"""
+        invalidation_bus.publish("content", file_hash)
+    
+    def might_contain(self, file_hash: str) -> bool:
+        """False only when the hash is certainly not registered"""
+        current = self.filter
+        if current is None:
+            return True
+        if file_hash in current:
+            return True
+        CACHE_REQUESTS.labels("content_bloom", "rejected").inc()
+        return False
+    
+    def _next_scan_from(self, db, after_id: int, max_id: int) -> int:
+        """Oldest recent document still waiting for its hash, else just past max_id.
+        
+        Documents whose hash stage failed long ago are ignored so they do
+        not pin the scan window open forever.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.CONTENT_INDEX_PENDING_SECONDS)
+        pending = db.execute(
+            select(func.min(Document.id)).where(
+                Document.id >= after_id,
+                Document.id <= max_id,
+                Document.file_hash.is_(None),
+                Document.created_at >= cutoff,
+            )
+        ).scalar()
+        return pending if pending is not None else max_id + 1
+    
+    def rebuild(self) -> int:
+        """Build a right-sized filter from the database and swap it in (blocking)"""
+        with self._lock:
+            self._pending = []
+        
+        # Replica lag is harmless: anything it has not seen yet is past the scan window
+        db = ReadSessionLocal()
+        try:
+            max_id, count = db.execute(
+                select(func.max(Document.id), func.count(Document.file_hash))
+            ).one()
+            max_id = max_id or 0
+            bloom = BloomFilter(
+                max(settings.CONTENT_INDEX_CAPACITY, 2 * count), settings.CONTENT_INDEX_ERROR_RATE
+            )
+            rows = db.execute(
+                select(Document.file_hash)
+                .where(Document.id <= max_id, Document.file_hash.is_not(None), Document.deleted_at.is_(None))
+                .execution_options(yield_per=10000)
+            )
+            for (file_hash,) in rows:
+                bloom.add(file_hash.lower())
+            scan_from = self._next_scan_from(db, 0, max_id)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        finally:
+            db.close()
+        
+        with self._lock:
+            for file_hash in self._pending:
+                bloom.add(file_hash)
+            self._pending = None
+            self.filter = bloom
+            self._scan_from = scan_from
+        self.last_rebuild = time.monotonic()
+        return bloom.count
+    
+    def refresh(self) -> int:
+        """Add hashes of documents created or hashed since the last scan (blocking)"""
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(Document.id, Document.file_hash)
+                .where(Document.id >= self._scan_from)
+                .order_by(Document.id)
+            ).all()
+            if not rows:
+                return 0
+            
+            added = 0
+            for _, file_hash in rows:
+                if file_hash:
+                    self.add(file_hash)
+                    added += 1
+            self._scan_from = self._next_scan_from(db, self._scan_from, rows[-1].id)
+            return added
+        finally:
+            db.close()
+    
+    def not_registered(self, file_hash: str) -> dict:
+        """Answer for content nobody has registered"""
+        return {
+            "file_hash": file_hash,
+            "registered": False,
+            "first_registered_at": None,
+            "anchored": False,
+            "blockchain_tx_hash": None,
+        }
+    
+    def find(self, file_hash: str) -> dict:
+        """Registration details from the indexed documents table (blocking; check the filter first)"""
+        cached = self.results.get(file_hash)
+        if cached is not None:
+            return cached
+        
+        db = ReadSessionLocal()
+        try:
+            rows = db.execute(
+                select(Document.created_at, Document.is_verified, Document.blockchain_tx_hash)
+                .where(Document.file_hash == file_hash, Document.deleted_at.is_(None))
+                .order_by(Document.created_at)
+                .limit(settings.PUBLIC_VERIFY_MAX_ROWS)
+            ).all()
+        finally:
+            db.close()
+        
+        if not rows:
+            if self.filter is not None:
+                CACHE_REQUESTS.labels("content_bloom", "false_positive").inc()
+            return self.not_registered(file_hash)
+        
+        anchored = next((row for row in rows if row.is_verified and row.blockchain_tx_hash), None)
+        result = {
+            "file_hash": file_hash,
+            "registered": True,
+            "first_registered_at": rows[0].created_at,
+            "anchored": anchored is not None,
+            "blockchain_tx_hash": anchored.blockchain_tx_hash if anchored else None,
+        }
+        # Anchored answers do not change, so they are safe to keep for a while
+        if result["anchored"]:
+            self.results.set(file_hash, result)
+        return result
+    
+    def lookup(self, file_hash: str) -> dict:
+        """Registration details for a hash, skipping the database when the filter rules it out"""
+        if not self.might_contain(file_hash):
+            return self.not_registered(file_hash)
+        return self.find(file_hash)
+    
+    async def start(self):
+        """Build the filter in the background and keep it current"""
+        invalidation_bus.subscribe("content", self.add)
+        self._task = asyncio.create_task(self._maintain())
+    
+    async def stop(self):
+        """Stop background maintenance"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def _maintain(self):
+        """Initial build, then incremental refreshes and occasional full rebuilds"""
+        while True:
+            try:
+                stale = time.monotonic() - self.last_rebuild >= settings.CONTENT_INDEX_REBUILD_SECONDS
+                if self.filter is None or self.filter.saturated or stale:
+                    count = await asyncio.to_thread(self.rebuild)
+                    print(f"📇 Content index built with {count} hashes")
+                else:
+                    await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                print(f"Content index refresh failed: {e}")
+            await asyncio.sleep(settings.CONTENT_INDEX_REFRESH_SECONDS)
+
+
+# Shared per-process index, maintained by the application lifespan
+content_index = ContentIndex()
@@ -0,0 +1,177 @@
+"""
+Tombstone-based document deletion and the background reaper
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from sqlalchemy import delete, exists, func, insert, select, update
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.database import (
+    SessionLocal, Document, Verification, VerificationArchive, UploadJob,
+    apply_user_stats_deltas, new_user_stats_deltas, document_stats_deltas, verification_stats_deltas
+)
+from core.metrics import track_stage
+from services.audit_service import audit_log
+from services.file_service import FileService
+from services.ipfs_service import IPFSService
+from services.storage_service import tiered_storage
+
+UNFINISHED_JOB_STATUSES = ("queued", "running", "retrying")
+ARCHIVED_COLUMNS = (
+    "id", "document_id", "user_id", "verification_type", "status",
+    "blockchain_tx_hash", "ipfs_hash", "verification_metadata", "created_at",
+)
+
+
+def _now() -> datetime:
+    """Current UTC time"""
+    return datetime.now(timezone.utc)
+
+
+class DeletionService:
+    """Service that tombstones documents on request and reclaims their storage later.
+    
+    Deleting only stamps `deleted_at` and moves the owner's counters, so it
+    costs one UPDATE however many documents are involved. The reaper then
+    works through tombstones in batches: it archives their verifications,
+    removes files and unpins CIDs no remaining document references, and
+    deletes the rows. Every reaper step is idempotent, so a batch that
+    fails part-way is simply picked up again.
+    """
+    
+    def __init__(self):
+        self.file_service = FileService()
+        self.ipfs_service = IPFSService()
+    
+    def tombstone(self, db: Session, owner_id: int, document_ids: Optional[List[int]] = None) -> int:
+        """Mark an owner's documents (all of them when ids are not given) as deleted; caller commits"""
+        statement = (
+            update(Document)
+            .where(Document.owner_id == owner_id, Document.deleted_at.is_(None))
+            .values(deleted_at=_now())
+            .returning(Document.file_size, Document.is_verified)
+            .execution_options(synchronize_session=False)
+        )
+        if document_ids is not None:
+            statement = statement.where(Document.id.in_(document_ids))
+        rows = db.execute(statement).all()
+        if not rows:
+            return 0
+        
+        # Queued stages have nothing left to do; running ones stop at their next claim
+        job_filter = UploadJob.status.in_(("queued", "retrying"))
+        document_filter = Document.owner_id == owner_id
+        if document_ids is not None:
+            document_filter = Document.id.in_(document_ids)
+        db.execute(
+            update(UploadJob)
+            .where(job_filter, UploadJob.document_id.in_(select(Document.id).where(document_filter)))
+            .values(status="failed", last_error="Document was deleted", lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        
+        # A bulk UPDATE skips the flush listener, so move the counters here
+        deltas = new_user_stats_deltas()
+        for file_size, is_verified in rows:
+            document_stats_deltas(deltas, owner_id, file_size, is_verified, -1)
+        apply_user_stats_deltas(db, deltas)
+        return len(rows)
+    
+    def reap_batch(self, limit: Optional[int] = None) -> int:
+        """Permanently remove one batch of tombstoned documents (blocking); returns how many"""
+        limit = limit or settings.DELETION_REAP_BATCH_SIZE
+        cutoff = _now() - timedelta(seconds=settings.DELETION_GRACE_SECONDS)
+        # Verifications still queued here would lose their document; other workers flush
+        # every AUDIT_FLUSH_INTERVAL_MS, well inside the grace period
+        audit_log.flush()
+        db = SessionLocal()
+        try:
+            # Skip locked rows so several workers can reap side by side
+            candidates = db.execute(
+                select(Document.id, Document.file_path, Document.ipfs_hash)
+                .where(
+                    Document.deleted_at < cutoff,
+                    ~exists().where(
+                        UploadJob.document_id == Document.id,
+                        UploadJob.status.in_(UNFINISHED_JOB_STATUSES),
+                    ),
+                )
+                .order_by(Document.deleted_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not candidates:
+                db.rollback()
+                return 0
+            
+            with track_stage("deletion", "reap"):
+                ids = [row.id for row in candidates]
+                self._archive_verifications(db, ids)
+                db.execute(delete(UploadJob).where(UploadJob.document_id.in_(ids)))
+                db.execute(delete(Document).where(Document.id.in_(ids)))
+                
+                # Content can be shared: one stored file per (user, filename), one CID per content
+                paths = {row.file_path for row in candidates if row.file_path}
+                cids = {row.ipfs_hash for row in candidates if row.ipfs_hash}
+                if paths:
+                    paths -= set(db.execute(
+                        select(Document.file_path).where(Document.file_path.in_(paths))
+                    ).scalars())
+                if cids:
+                    cids -= set(db.execute(
+                        select(Document.ipfs_hash).where(Document.ipfs_hash.in_(cids))
+                    ).scalars())
+                
+                # Release storage before committing: if the commit fails the batch is retried,
+                # and removing or unpinning again is harmless
+                self.file_service.delete_files(sorted(paths))
+                tiered_storage.forget(sorted(paths))
+                asyncio.run(self.ipfs_service.unpin_files(sorted(cids)))
+                db.commit()
+            return len(ids)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    def _archive_verifications(self, db: Session, document_ids: List[int]):
+        """Move the documents' verifications to the archive, keeping the counters in step"""
+        deltas = new_user_stats_deltas()
+        counts = db.execute(
+            select(Verification.user_id, Verification.status, func.count(Verification.id))
+            .where(Verification.document_id.in_(document_ids))
+            .group_by(Verification.user_id, Verification.status)
+        ).all()
+        if not counts:
+            return
+        for user_id, status_value, count in counts:
+            verification_stats_deltas(deltas, user_id, status_value, -count)
+        
+        columns = [getattr(Verification, name) for name in ARCHIVED_COLUMNS]
+        db.execute(
+            insert(VerificationArchive).from_select(
+                list(ARCHIVED_COLUMNS),
+                select(*columns).where(Verification.document_id.in_(document_ids)),
+            )
+        )
+        db.execute(delete(Verification).where(Verification.document_id.in_(document_ids)))
+        apply_user_stats_deltas(db, deltas)
+    
+    def reap_all(self) -> int:
+        """Reap batches until no eligible tombstones remain (blocking)"""
+        total = 0
+        while True:
+            reaped = self.reap_batch()
+            total += reaped
+            if reaped == 0:
+                return total
+
+
+deletion_service = DeletionService()
+
+
+if __name__ == "__main__":
+    print(f"✅ Reaped {deletion_service.reap_all()} deleted documents")
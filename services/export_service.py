@@ -0,0 +1,343 @@
+"""
+Streaming archive export of a user's documents and their proofs
+
+The archive (tar or ZIP, stored without compression) is assembled on the
+fly from the stored files: nothing is written to disk and only one read
+chunk is held in memory at a time. A manifest of hashes, CIDs and
+transaction hashes goes first. Every header is derived from the manifest,
+so the whole layout, and its total length, is known before the first byte
+is sent. That makes the stream byte-addressable: a Range request resumes
+an interrupted download at any offset, and the ETag (a digest of the
+manifest) tells a client whether it is still resuming the same archive.
+
+Resuming a ZIP re-reads, but does not re-send, the files before the resume
+point, because the central directory needs their CRC-32s. Tar resumes
+without that.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+import hashlib
+import json
+import os
+import re
+import struct
+import tarfile
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from core.database import Document
+from core.metrics import EXPORT_BYTES
+from services.file_service import FileService
+from services.storage_backend import is_remote
+from services.storage_service import tiered_storage
+
+ARCHIVE_FORMATS = {"zip": "application/zip", "tar": "application/x-tar"}  # Format -> media type
+EXPORT_CHUNK_SIZE = 1024 * 1024
+MANIFEST_NAME = "manifest.json"
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_FLAGS = 0x08 | 0x800  # Sizes and CRC follow the data; UTF-8 names
+ZIP_EXTERNAL_ATTR = 0o100644 << 16
+
+file_service = FileService()
+
+
+@dataclass
+class ArchiveEntry:
+    """One file in an export: a stored document or in-memory content"""
+    name: str
+    size: int
+    mtime: datetime
+    document: Optional[object] = None  # Row with file_path and ipfs_hash
+    data: Optional[bytes] = None
+
+
+class Segment(ABC):
+    """Fixed-length run of archive bytes"""
+    
+    def __init__(self, size: int):
+        self.size = size
+    
+    @abstractmethod
+    def read(self, start: int, end: int) -> AsyncIterator[bytes]:
+        """Async iterator over bytes [start, end) of this segment"""
+    
+    async def skip(self):
+        """Called instead of read() when a resumed download starts past this segment"""
+
+
+class BytesSegment(Segment):
+    def __init__(self, data: bytes):
+        super().__init__(len(data))
+        self.data = data
+    
+    async def read(self, start: int, end: int) -> AsyncIterator[bytes]:
+        yield self.data[start:end]
+
+
+class DeferredSegment(Segment):
+    """Bytes of a known length whose content is only available once earlier segments ran"""
+    
+    def __init__(self, size: int, render: Callable[[], bytes]):
+        super().__init__(size)
+        self.render = render
+    
+    async def read(self, start: int, end: int) -> AsyncIterator[bytes]:
+        data = self.render()
+        if len(data) != self.size:
+            raise RuntimeError(f"Archive layout changed: expected {self.size} bytes, rendered {len(data)}")
+        yield data[start:end]
+
+
+class FileSegment(Segment):
+    """A stored document's bytes, streamed from disk (fetched back first if evicted)"""
+    
+    def __init__(self, entry: ArchiveEntry, on_crc: Optional[Callable[[int], None]] = None):
+        super().__init__(entry.size)
+        self.entry = entry
+        self.on_crc = on_crc
+    
+    async def read(self, start: int, end: int) -> AsyncIterator[bytes]:
+        path = await tiered_storage.ensure_local(self.entry.document)
+        with await asyncio.to_thread(file_service.open_file, path) as f:
+            crc = 0
+            if self.on_crc is not None and start:
+                crc = await asyncio.to_thread(self._crc, f, start)
+            else:
+                f.seek(start)
+            
+            position = start
+            while position < end:
+                chunk = await asyncio.to_thread(f.read, min(EXPORT_CHUNK_SIZE, end - position))
+                if not chunk:
+                    raise RuntimeError(f"{self.entry.name} is shorter than its recorded {self.size} bytes")
+                if self.on_crc is not None:
+                    crc = zlib.crc32(chunk, crc)
+                position += len(chunk)
+                yield chunk
+        
+        if self.on_crc is not None and end == self.size:
+            self.on_crc(crc)
+    
+    async def skip(self):
+        if self.on_crc is None:
+            return
+        path = await tiered_storage.ensure_local(self.entry.document)
+        with await asyncio.to_thread(file_service.open_file, path) as f:
+            self.on_crc(await asyncio.to_thread(self._crc, f, self.size))
+    
+    @staticmethod
+    def _crc(f, length: int) -> int:
+        """CRC-32 of the next length bytes of f (blocking)"""
+        crc = 0
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(EXPORT_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise RuntimeError("File is shorter than its recorded size")
+            crc = zlib.crc32(chunk, crc)
+            remaining -= len(chunk)
+        return crc
+
+
+def _tar_segments(entries: List[ArchiveEntry]) -> List[Segment]:
+    """PAX tar: a header block per entry, data padded to 512 bytes, two zero blocks at the end"""
+    segments = []
+    for entry in entries:
+        info = tarfile.TarInfo(entry.name)
+        info.size = entry.size
+        info.mtime = int(entry.mtime.timestamp())
+        info.mode = 0o644
+        segments.append(BytesSegment(info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8")))
+        segments.append(BytesSegment(entry.data) if entry.data is not None else FileSegment(entry))
+        padding = -entry.size % tarfile.BLOCKSIZE
+        if padding:
+            segments.append(BytesSegment(b"\0" * padding))
+    segments.append(BytesSegment(b"\0" * (2 * tarfile.BLOCKSIZE)))
+    return segments
+
+
+def _mtime(created_at: Optional[datetime]) -> datetime:
+    """Timezone-aware modification time for an archive entry"""
+    if created_at is None:
+        return datetime(1980, 1, 1, tzinfo=timezone.utc)
+    return created_at if created_at.tzinfo else created_at.replace(tzinfo=timezone.utc)
+
+
+def _dos_time(mtime: datetime):
+    """(time, date) fields of a ZIP header"""
+    mtime = max(mtime, datetime(1980, 1, 1, tzinfo=timezone.utc))
+    return (
+        mtime.hour << 11 | mtime.minute << 5 | mtime.second // 2,
+        (mtime.year - 1980) << 9 | mtime.month << 5 | mtime.day,
+    )
+
+
+def _zip64_extra(entry: ArchiveEntry, offset: int) -> bytes:
+    """Central directory ZIP64 field for sizes or a header offset past 4 GiB (empty if none are)"""
+    fields = [entry.size, entry.size] if entry.size >= ZIP64_LIMIT else []
+    if offset >= ZIP64_LIMIT:
+        fields.append(offset)
+    return struct.pack(f"<HH{len(fields)}Q", 1, 8 * len(fields), *fields) if fields else b""
+
+
+def _zip_segments(entries: List[ArchiveEntry]) -> List[Segment]:
+    """Stored ZIP (ZIP64 where needed) with data descriptors, so each CRC can follow its data"""
+    segments = []
+    crcs = [None] * len(entries)
+    records = []  # (name, entry, offset, dos time, dos date)
+    offset = 0
+    
+    for index, entry in enumerate(entries):
+        name = entry.name.encode("utf-8")
+        big = entry.size >= ZIP64_LIMIT
+        dos_time, dos_date = _dos_time(entry.mtime)
+        extra = struct.pack("<HHQQ", 1, 16, 0, 0) if big else b""
+        header = struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 45 if big else 20, ZIP_FLAGS, 0, dos_time, dos_date,
+            0, ZIP64_LIMIT if big else 0, ZIP64_LIMIT if big else 0, len(name), len(extra)
+        ) + name + extra
+        records.append((name, entry, offset, dos_time, dos_date))
+        
+        def set_crc(crc, index=index):
+            crcs[index] = crc
+        
+        if entry.data is not None:
+            set_crc(zlib.crc32(entry.data))
+            data = BytesSegment(entry.data)
+        else:
+            data = FileSegment(entry, on_crc=set_crc)
+        
+        def descriptor(index=index, size=entry.size, big=big):
+            return struct.pack("<IIQQ" if big else "<IIII", 0x08074B50, crcs[index], size, size)
+        
+        segments += [BytesSegment(header), data, DeferredSegment(24 if big else 16, descriptor)]
+        offset += len(header) + entry.size + (24 if big else 16)
+    
+    directory_offset = offset
+    directory_size = sum(46 + len(name) + len(_zip64_extra(entry, start)) for name, entry, start, _, _ in records)
+    
+    def central_directory() -> bytes:
+        parts = []
+        for index, (name, entry, start, dos_time, dos_date) in enumerate(records):
+            big = entry.size >= ZIP64_LIMIT
+            extra = _zip64_extra(entry, start)
+            version = 45 if extra else 20
+            parts.append(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, 3 << 8 | version, version, ZIP_FLAGS, 0,
+                dos_time, dos_date, crcs[index],
+                ZIP64_LIMIT if big else entry.size, ZIP64_LIMIT if big else entry.size,
+                len(name), len(extra), 0, 0, 0, ZIP_EXTERNAL_ATTR, min(start, ZIP64_LIMIT)
+            ) + name + extra)
+        return b"".join(parts)
+    
+    segments.append(DeferredSegment(directory_size, central_directory))
+    
+    count = len(entries)
+    end = b""
+    if count >= 0xFFFF or directory_offset >= ZIP64_LIMIT or directory_size >= ZIP64_LIMIT:
+        zip64_end_offset = directory_offset + directory_size
+        end += struct.pack(
+            "<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, directory_size, directory_offset
+        )
+        end += struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1)
+    end += struct.pack(
+        "<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+        min(directory_size, ZIP64_LIMIT), min(directory_offset, ZIP64_LIMIT), 0
+    )
+    segments.append(BytesSegment(end))
+    return segments
+
+
+def _archive_name(document) -> str:
+    """Unique, filesystem-safe name for a document inside the archive"""
+    title = re.sub(r"[^\w.-]+", "_", document.title).strip("._")[:100] or "document"
+    extension = os.path.splitext(document.file_path)[1]
+    return f"documents/{document.id}-{title}{extension}"
+
+
+class ArchiveExport:
+    """Byte-addressable layout of one export archive"""
+    
+    def __init__(self, archive_format: str, entries: List[ArchiveEntry], manifest: bytes):
+        self.format = archive_format
+        self.media_type = ARCHIVE_FORMATS[archive_format]
+        self.segments = _zip_segments(entries) if archive_format == "zip" else _tar_segments(entries)
+        self.size = sum(segment.size for segment in self.segments)
+        self.etag = f'"{hashlib.sha256(archive_format.encode() + manifest).hexdigest()[:32]}"'
+    
+    async def stream(self, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Archive bytes [start, end), end defaulting to the archive size"""
+        end = self.size if end is None else end
+        position = 0
+        for segment in self.segments:
+            segment_end = position + segment.size
+            if segment_end <= start:
+                await segment.skip()
+            elif position < end:
+                async for chunk in segment.read(max(start - position, 0), min(end, segment_end) - position):
+                    EXPORT_BYTES.labels(self.format).inc(len(chunk))
+                    yield chunk
+            else:
+                return
+            position = segment_end
+
+
+class ExportService:
+    """Service that plans archive exports of a user's documents"""
+    
+    def plan(self, db: Session, user_id: int, archive_format: str) -> ArchiveExport:
+        """Manifest and layout of the user's current documents (blocking)"""
+        rows = db.execute(
+            select(
+                Document.id, Document.title, Document.file_path, Document.file_size, Document.file_type,
+                Document.file_hash, Document.ipfs_hash, Document.blockchain_tx_hash,
+                Document.is_verified, Document.created_at
+            )
+            .where(Document.owner_id == user_id, Document.deleted_at.is_(None))
+            .order_by(Document.id)
+        ).all()
+        
+        entries = []
+        listed = []
+        for row in rows:
+            if is_remote(row.file_path):
+                # Trust the recorded size rather than a round trip per object; a missing
+                # object aborts the stream when it is reached
+                size = row.file_size
+            else:
+                try:
+                    size = os.path.getsize(row.file_path)
+                except OSError:
+                    # Evicted files come back from IPFS while streaming; anything else is left out
+                    size = row.file_size if tiered_storage.is_evicted(row) else None
+            name = _archive_name(row) if size is not None else None
+            listed.append({
+                "id": row.id,
+                "title": row.title,
+                "path": name,
+                "size": size,
+                "content_type": row.file_type,
+                "sha256": row.file_hash,
+                "ipfs_cid": row.ipfs_hash,
+                "blockchain_tx_hash": row.blockchain_tx_hash,
+                "verified": row.is_verified,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+            })
+            if name is not None:
+                entries.append(ArchiveEntry(name, size, _mtime(row.created_at), document=row))
+        
+        # Deterministic for a given set of documents, so resumed downloads line up
+        manifest = json.dumps(
+            {"version": 1, "user_id": user_id, "documents": listed}, indent=2, sort_keys=True
+        ).encode("utf-8")
+        latest = max((entry.mtime for entry in entries), default=datetime(1980, 1, 1, tzinfo=timezone.utc))
+        entries.insert(0, ArchiveEntry(MANIFEST_NAME, len(manifest), latest, data=manifest))
+        return ArchiveExport(archive_format, entries, manifest)
+
+
+export_service = ExportService()
@@ -2,13 +2,18 @@
 File service for handling file operations
 """
 
+import asyncio
 import os
 import hashlib
 import shutil
-from typing import Optional
+from typing import BinaryIO, List, Optional
 from pathlib import Path
 from fastapi import UploadFile
 from core.config import settings
+from core.metrics import timed, BYTES_HASHED
+from services.storage_backend import backend_for, default_backend, is_remote, local_backend
+
+HASH_CHUNK_SIZE = 4096
 
 
 class FileService:
@@ -16,6 +21,7 @@ class FileService:
     
     def __init__(self):
         self.upload_dir = Path(settings.UPLOAD_DIR)
+        self.storage = default_backend()
         self._ensure_upload_directory()
     
     def _ensure_upload_directory(self):
@@ -35,35 +41,47 @@ class FileService:
         
         return True
     
+    @timed("file", "save")
     async def save_file(self, file: UploadFile, user_id: int) -> str:
-        """Save uploaded file to disk"""
-        # Create user-specific directory
-        user_dir = self.upload_dir / str(user_id)
-        user_dir.mkdir(exist_ok=True)
-        
-        # Generate unique filename
+        """Save uploaded file to the storage backend; returns its location"""
+        # Generate unique filename in a user-specific directory
         file_extension = Path(file.filename).suffix
         unique_filename = f"{hashlib.md5(f'{file.filename}{user_id}'.encode()).hexdigest()}{file_extension}"
-        file_path = user_dir / unique_filename
         
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        return str(file_path)
+        # Save file (possibly a multipart upload) off the event loop
+        return await asyncio.to_thread(self.storage.save, f"{user_id}/{unique_filename}", file.file)
+    
+    def open_file(self, file_path: str) -> BinaryIO:
+        """Open a stored file for streaming reads, wherever it is stored"""
+        return backend_for(file_path).open(file_path)
     
-    def calculate_file_hash(self, file_path: str) -> str:
+    @timed("file", "hash")
+    def calculate_file_hash(self, file_path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
         """Calculate SHA-256 hash of file"""
+        with self.open_file(file_path) as f:
+            return self.calculate_stream_hash(f, chunk_size)
+    
+    def calculate_stream_hash(self, stream, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+        """Calculate SHA-256 hash of a binary file object, read from its current position"""
         sha256_hash = hashlib.sha256()
+        bytes_read = 0
         
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(chunk)
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            sha256_hash.update(chunk)
+            bytes_read += len(chunk)
         
+        BYTES_HASHED.inc(bytes_read)
         return sha256_hash.hexdigest()
     
     def get_file_info(self, file_path: str) -> dict:
         """Get file information"""
+        if is_remote(file_path):
+            try:
+                size = backend_for(file_path).size(file_path)
+            except FileNotFoundError:
+                return None
+            return {"path": file_path, "size": size, "hash": self.calculate_file_hash(file_path)}
+        
         if not os.path.exists(file_path):
             return None
         
@@ -78,16 +96,22 @@ class FileService:
         }
     
     def delete_file(self, file_path: str) -> bool:
-        """Delete file from disk"""
+        """Delete a stored file"""
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                return True
-            return False
+            return self.delete_files([file_path]) == 1
         except Exception as e:
             print(f"Error deleting file {file_path}: {e}")
             return False
     
+    def delete_files(self, file_paths: List[str]) -> int:
+        """Delete several stored files, batched per backend; missing files are skipped. Returns how many were removed"""
+        remote = [file_path for file_path in file_paths if is_remote(file_path)]
+        local = [file_path for file_path in file_paths if not is_remote(file_path)]
+        removed = local_backend.delete_many(local) if local else 0
+        if remote:
+            removed += backend_for(remote[0]).delete_many(remote)
+        return removed
+    
     def copy_file(self, source_path: str, destination_path: str) -> bool:
         """Copy file from source to destination"""
         try:
@@ -109,7 +133,7 @@ class FileService:
     def get_file_size(self, file_path: str) -> int:
         """Get file size in bytes"""
         try:
-            return os.path.getsize(file_path)
+            return backend_for(file_path).size(file_path)
         except OSError:
             return 0
     
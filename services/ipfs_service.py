@@ -3,29 +3,44 @@ IPFS service for decentralized file storage
 """
 
 import asyncio
-from typing import Optional
+import os
+from typing import List, Optional
 import ipfshttpclient
 from core.config import settings
+from core.metrics import timed
+from services.storage_backend import backend_for
 
 
 class IPFSService:
     """Service for IPFS operations"""
     
     def __init__(self):
-        self.client = None
-        self._initialize_client()
+        self._client = None
+        self._pid = None
+    
+    @property
+    def client(self):
+        """This process's IPFS client, connected on first use; None when the node is unreachable"""
+        # Instances are created at import, before gunicorn forks its workers:
+        # each process connects its own rather than sharing the parent's HTTP session
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._client = self._initialize_client()
+        return self._client
     
     def _initialize_client(self):
         """Initialize IPFS client"""
         try:
-            self.client = ipfshttpclient.connect(settings.IPFS_NODE_URL)
+            client = ipfshttpclient.connect(settings.IPFS_NODE_URL)
             # Test connection
-            self.client.version()
+            client.version()
             print("IPFS client initialized successfully")
+            return client
         except Exception as e:
             print(f"Error initializing IPFS client: {e}")
-            self.client = None
+            return None
     
+    @timed("ipfs", "add")
     async def upload_file(self, file_path: str) -> Optional[str]:
         """Upload file to IPFS"""
         if not self.client:
@@ -33,8 +48,9 @@ class IPFSService:
             return None
         
         try:
-            # Upload file to IPFS
-            result = self.client.add(file_path)
+            # Upload file to IPFS, streamed from wherever it is stored
+            with backend_for(file_path).open(file_path) as stream:
+                result = self.client.add(stream)
             
             # Return the IPFS hash
             if isinstance(result, list):
@@ -46,6 +62,7 @@ class IPFSService:
             print(f"Error uploading file to IPFS: {e}")
             return None
     
+    @timed("ipfs", "get")
     async def download_file(self, ipfs_hash: str, output_path: str) -> bool:
         """Download file from IPFS"""
         if not self.client:
@@ -61,6 +78,7 @@ class IPFSService:
             print(f"Error downloading file from IPFS: {e}")
             return False
     
+    @timed("ipfs", "stat")
     async def get_file_info(self, ipfs_hash: str) -> Optional[dict]:
         """Get file information from IPFS"""
         if not self.client:
@@ -102,6 +120,7 @@ class IPFSService:
         except Exception as e:
             return {"connected": False, "error": str(e)}
     
+    @timed("ipfs", "pin")
     async def pin_file(self, ipfs_hash: str) -> bool:
         """Pin file to IPFS node"""
         if not self.client:
@@ -117,6 +136,7 @@ class IPFSService:
             print(f"Error pinning file to IPFS: {e}")
             return False
     
+    @timed("ipfs", "unpin")
     async def unpin_file(self, ipfs_hash: str) -> bool:
         """Unpin file from IPFS node"""
         if not self.client:
@@ -130,4 +150,26 @@ class IPFSService:
             
         except Exception as e:
             print(f"Error unpinning file from IPFS: {e}")
-            return False 
\ No newline at end of file
+            return False
+    
+    @timed("ipfs", "unpin_many")
+    async def unpin_files(self, ipfs_hashes: List[str]) -> int:
+        """Unpin several CIDs in one call; returns how many were unpinned"""
+        if not ipfs_hashes:
+            return 0
+        if not self.client:
+            print("IPFS client not available - skipping unpin")
+            return 0
+        
+        try:
+            self.client.pin.rm(*ipfs_hashes)
+            return len(ipfs_hashes)
+        except Exception as e:
+            # One CID that is not pinned fails the whole call; retry individually
+            print(f"Bulk unpin failed, unpinning one by one: {e}")
+        
+        unpinned = 0
+        for ipfs_hash in ipfs_hashes:
+            if await self.unpin_file(ipfs_hash):
+                unpinned += 1
+        return unpinned
@@ -0,0 +1,398 @@
+"""
+Upload post-processing pipeline: durable stages run by background workers
+"""
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from sqlalchemy import update, or_, and_
+from sqlalchemy.orm import Session
+from core.config import settings
+from core.events import event_bus
+from core.database import SessionLocal, Document, Verification, UploadJob
+from core.metrics import track_stage
+from services.blockchain_service import BlockchainService
+from services.ipfs_service import IPFSService
+from services.file_service import FileService
+from services.content_index_service import content_index
+from services.storage_service import tiered_storage
+
+STAGES = ["hash", "ipfs_add", "pin", "anchor", "confirm"]
+FINISHED_STATUSES = ("completed", "failed")
+
+
+@dataclass
+class StagePolicy:
+    """Concurrency and retry policy for one pipeline stage"""
+    name: str
+    concurrency: int
+    max_attempts: int
+    required: bool  # When False, the job moves on after the final failed attempt
+    
+    def retry_delay(self, attempt: int) -> float:
+        """Exponential backoff before the next attempt"""
+        return settings.PIPELINE_RETRY_BACKOFF_SECONDS * (2 ** max(0, attempt - 1))
+
+
+STAGE_POLICIES = {
+    name: StagePolicy(
+        name=name,
+        concurrency=settings.PIPELINE_CONCURRENCY.get(name, 4),
+        max_attempts=settings.PIPELINE_MAX_ATTEMPTS.get(name, 3),
+        # IPFS is best-effort, as it was when uploads ran inline
+        required=name not in ("ipfs_add", "pin"),
+    )
+    for name in STAGES
+}
+
+
+def _now() -> datetime:
+    """Current UTC time"""
+    return datetime.now(timezone.utc)
+
+
+def next_stage(stage: str) -> Optional[str]:
+    """Stage that follows the given one, or None after the last"""
+    index = STAGES.index(stage)
+    return STAGES[index + 1] if index + 1 < len(STAGES) else None
+
+
+class PipelineService:
+    """Service that runs upload post-processing stages against the database.
+    
+    Jobs are claimed with a compare-and-set on (stage, status, lease), so a
+    stage runs at most once at a time even if several workers are handed
+    the same job. A job nobody touches before its lease expires is picked
+    up again by the sweeper.
+    """
+    
+    def __init__(self):
+        self.file_service = FileService()
+        self.ipfs_service = IPFSService()
+        self.blockchain_service = BlockchainService()
+        self.handlers = {
+            "hash": self._stage_hash,
+            "ipfs_add": self._stage_ipfs_add,
+            "pin": self._stage_pin,
+            "anchor": self._stage_anchor,
+            "confirm": self._stage_confirm,
+        }
+    
+    def create_job(self, db: Session, document: Document) -> UploadJob:
+        """Queue a new job for a freshly stored document (caller commits)"""
+        job = UploadJob(
+            document_id=document.id,
+            user_id=document.owner_id,
+            stage=STAGES[0],
+            status="queued",
+            attempts=0,
+            lease_expires_at=_now() + timedelta(seconds=settings.PIPELINE_LEASE_SECONDS),
+        )
+        db.add(job)
+        return job
+    
+    def claim(self, db: Session, job_id: int, stage: str) -> bool:
+        """Atomically take ownership of a job's current stage"""
+        now = _now()
+        result = db.execute(
+            update(UploadJob)
+            .where(
+                UploadJob.id == job_id,
+                UploadJob.stage == stage,
+                or_(
+                    UploadJob.status.in_(["queued", "retrying"]),
+                    and_(UploadJob.status == "running", UploadJob.lease_expires_at < now),
+                ),
+            )
+            .values(
+                status="running",
+                attempts=UploadJob.attempts + 1,
+                lease_expires_at=now + timedelta(seconds=settings.PIPELINE_LEASE_SECONDS),
+            )
+        )
+        db.commit()
+        return result.rowcount == 1
+    
+    def run_stage(self, job_id: int, stage: str) -> Optional[str]:
+        """Run one stage (blocking); returns the next stage, or None when there is nothing to do"""
+        db = SessionLocal()
+        try:
+            if not self.claim(db, job_id, stage):
+                return None
+            
+            job = db.get(UploadJob, job_id)
+            document = db.get(Document, job.document_id)
+            if document is None or document.deleted_at is not None:
+                job.status = "failed"
+                job.last_error = "Document no longer exists"
+                job.lease_expires_at = None
+                db.commit()
+                return None
+            
+            with track_stage("pipeline", stage):
+                asyncio.run(self.handlers[stage](db, job, document))
+                following = self._advance(db, job)
+            self._publish_progress(job, document)
+            return following
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    def record_failure(self, job_id: int, stage: str, error: Exception) -> Tuple[Optional[str], float]:
+        """Handle a failed attempt; returns (stage to run next, delay before running it)"""
+        policy = STAGE_POLICIES[stage]
+        db = SessionLocal()
+        try:
+            job = db.get(UploadJob, job_id)
+            if job is None or job.stage != stage:
+                return None, 0
+            
+            job.last_error = f"{stage}: {error}"
+            
+            if job.attempts < policy.max_attempts:
+                job.status = "retrying"
+                delay = policy.retry_delay(job.attempts)
+                job.lease_expires_at = _now() + timedelta(seconds=delay + settings.PIPELINE_LEASE_SECONDS)
+                db.commit()
+                self._publish_progress(job)
+                return stage, delay
+            
+            if not policy.required:
+                print(f"Pipeline stage {stage} gave up for job {job_id}, continuing: {error}")
+                following = self._advance(db, job, keep_error=True)
+                self._publish_progress(job)
+                return following, 0
+            
+            print(f"Pipeline job {job_id} failed at {stage}: {error}")
+            job.status = "failed"
+            job.lease_expires_at = None
+            document = db.get(Document, job.document_id)
+            if document is not None:
+                db.add(self._upload_verification(document, status_value="failed"))
+            db.commit()
+            self._publish_progress(job, document)
+            return None, 0
+        finally:
+            db.close()
+    
+    def find_stale_jobs(self, limit: int = 100) -> List[Tuple[int, str]]:
+        """Unfinished jobs whose lease lapsed, e.g. after a worker restart"""
+        db = SessionLocal()
+        try:
+            rows = db.query(UploadJob.id, UploadJob.stage).filter(
+                UploadJob.status.notin_(FINISHED_STATUSES),
+                UploadJob.lease_expires_at < _now(),
+            ).limit(limit).all()
+            return [(job_id, stage) for job_id, stage in rows]
+        finally:
+            db.close()
+    
+    def get_progress(self, job: UploadJob) -> dict:
+        """Describe how far a job has got"""
+        done = len(STAGES) if job.stage == "done" else STAGES.index(job.stage)
+        return {
+            "stages": STAGES,
+            "completed_stages": STAGES[:done],
+            "progress": done / len(STAGES),
+        }
+    
+    def _advance(self, db: Session, job: UploadJob, keep_error: bool = False) -> Optional[str]:
+        """Move a job on to its next stage and release it"""
+        following = next_stage(job.stage)
+        job.stage = following or "done"
+        job.status = "queued" if following else "completed"
+        job.attempts = 0
+        job.lease_expires_at = (
+            _now() + timedelta(seconds=settings.PIPELINE_LEASE_SECONDS) if following else None
+        )
+        if not keep_error:
+            job.last_error = None
+        db.commit()
+        return following
+    
+    def _publish_progress(self, job: UploadJob, document: Optional[Document] = None):
+        """Push a job's committed state, and what it has learned about the document, to the owner"""
+        event = {
+            "type": "pipeline",
+            "job_id": job.id,
+            "document_id": job.document_id,
+            "stage": job.stage,
+            "status": job.status,
+            "error": job.last_error,
+            **self.get_progress(job),
+        }
+        if document is not None:
+            event.update(
+                file_hash=document.file_hash,
+                ipfs_hash=document.ipfs_hash,
+                blockchain_tx_hash=document.blockchain_tx_hash,
+                is_verified=bool(document.is_verified),
+            )
+        event_bus.publish(job.user_id, event)
+    
+    def _upload_verification(self, document: Document, status_value: str) -> Verification:
+        """Audit record for the outcome of an upload"""
+        return Verification(
+            document_id=document.id,
+            user_id=document.owner_id,
+            verification_type="upload",
+            status=status_value,
+            blockchain_tx_hash=document.blockchain_tx_hash,
+            ipfs_hash=document.ipfs_hash
+        )
+    
+    async def _stage_hash(self, db: Session, job: UploadJob, document: Document):
+        """Hash the stored bytes"""
+        document.file_hash = self.file_service.calculate_file_hash(document.file_path)
+        # Early is harmless: the filter only ever says "maybe", and lookups confirm in the database
+        content_index.publish(document.file_hash)
+    
+    # The services log and swallow their errors, returning None/False; stages turn that
+    # back into an exception so the stage's retry policy applies
+    
+    async def _stage_ipfs_add(self, db: Session, job: UploadJob, document: Document):
+        """Add the file to IPFS"""
+        if self.ipfs_service.client is None:
+            return  # No IPFS node configured; the client is never re-created, so retrying cannot help
+        document.ipfs_hash = await self.ipfs_service.upload_file(document.file_path)
+        if not document.ipfs_hash:
+            raise RuntimeError("IPFS add returned no CID")
+    
+    async def _stage_pin(self, db: Session, job: UploadJob, document: Document):
+        """Pin the CID so the node keeps it"""
+        if not document.ipfs_hash:
+            return
+        if not await self.ipfs_service.pin_file(document.ipfs_hash):
+            raise RuntimeError(f"Pinning {document.ipfs_hash} failed")
+        # Pinned content can be fetched back, so the local copy may now be evicted
+        tiered_storage.register(document.file_path, document.ipfs_hash)
+    
+    async def _stage_anchor(self, db: Session, job: UploadJob, document: Document):
+        """Submit the hash anchoring transaction"""
+        if not document.blockchain_tx_hash:
+            document.blockchain_tx_hash = await self.blockchain_service.send_document_hash(
+                document.file_hash, document.ipfs_hash, document.owner_id
+            )
+            if not document.blockchain_tx_hash:
+                raise RuntimeError("Anchoring transaction was not submitted")
+    
+    async def _stage_confirm(self, db: Session, job: UploadJob, document: Document):
+        """Wait for the anchor to be mined and record the upload outcome"""
+        if not document.blockchain_tx_hash:
+            raise RuntimeError("No anchoring transaction to confirm")
+        confirmed = await self.blockchain_service.wait_for_confirmation(document.blockchain_tx_hash)
+        if confirmed is None:
+            raise RuntimeError(f"Could not confirm transaction {document.blockchain_tx_hash}")
+        if not confirmed:
+            # Mined but reverted: waiting again will not change that
+            document.blockchain_tx_hash = None
+        
+        document.is_verified = confirmed
+        db.add(self._upload_verification(document, "success" if confirmed else "failed"))
+
+
+class InProcessExecutor:
+    """Run pipeline stages on asyncio tasks inside the API process.
+    
+    Each stage has its own concurrency limit; blocking stage work runs in
+    threads. Suitable for single-node deployments and tests.
+    """
+    
+    def __init__(self, pipeline: PipelineService):
+        self.pipeline = pipeline
+        self._semaphores = {}
+        self._tasks = set()
+        self._sweeper: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """Create stage limits and start the stale-job sweeper"""
+        self._semaphores = {
+            name: asyncio.Semaphore(policy.concurrency) for name, policy in STAGE_POLICIES.items()
+        }
+        self._sweeper = asyncio.create_task(self._sweep())
+    
+    async def stop(self):
+        """Stop driving jobs; unfinished ones resume from the database later"""
+        tasks = list(self._tasks)
+        if self._sweeper is not None:
+            tasks.append(self._sweeper)
+            self._sweeper = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def submit(self, job_id: int, stage: str = STAGES[0]):
+        """Start driving a job from the given stage"""
+        task = asyncio.create_task(self._drive(job_id, stage))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _drive(self, job_id: int, stage: Optional[str]):
+        """Run a job's stages in order, retrying per stage policy"""
+        while stage:
+            delay = 0
+            async with self._semaphores[stage]:
+                try:
+                    following = await asyncio.to_thread(self.pipeline.run_stage, job_id, stage)
+                except Exception as e:
+                    following, delay = await asyncio.to_thread(
+                        self.pipeline.record_failure, job_id, stage, e
+                    )
+            if delay:
+                await asyncio.sleep(delay)
+            stage = following
+    
+    async def _sweep(self):
+        """Resume jobs whose lease lapsed"""
+        while True:
+            await asyncio.sleep(settings.PIPELINE_SWEEP_INTERVAL_SECONDS)
+            try:
+                for job_id, stage in await asyncio.to_thread(self.pipeline.find_stale_jobs):
+                    await self.submit(job_id, stage)
+            except Exception as e:
+                print(f"Pipeline sweep failed: {e}")
+
+
+class CeleryExecutor:
+    """Hand pipeline stages to Celery workers, one queue per stage.
+    
+    Scale stages independently by pointing workers at their queues, e.g.
+    celery -A services.celery_app worker -Q pipeline.anchor -c 2
+    """
+    
+    def __init__(self, pipeline: PipelineService):
+        self.pipeline = pipeline
+        self._sweeper: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """Start the stale-job sweeper"""
+        self._sweeper = asyncio.create_task(self._sweep())
+    
+    async def stop(self):
+        """Stop the sweeper; queued stages stay with the broker"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+    
+    async def submit(self, job_id: int, stage: str = STAGES[0]):
+        """Enqueue a job's stage on its Celery queue"""
+        from services.celery_app import enqueue_stage
+        await asyncio.to_thread(enqueue_stage, job_id, stage)
+    
+    async def _sweep(self):
+        """Re-enqueue jobs whose lease lapsed"""
+        while True:
+            await asyncio.sleep(settings.PIPELINE_SWEEP_INTERVAL_SECONDS)
+            try:
+                for job_id, stage in await asyncio.to_thread(self.pipeline.find_stale_jobs):
+                    await self.submit(job_id, stage)
+            except Exception as e:
+                print(f"Pipeline sweep failed: {e}")
+
+
+pipeline = PipelineService()
+pipeline_executor = CeleryExecutor(pipeline) if settings.PIPELINE_MODE == "celery" else InProcessExecutor(pipeline)
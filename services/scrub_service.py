@@ -0,0 +1,269 @@
+"""
+Background integrity scrubber for stored documents
+
+Re-hashes every stored file against Document.file_hash at least once per
+SCRUB_INTERVAL_SECONDS, never-checked and longest-unchecked documents
+first. Reads are capped at SCRUB_MAX_BYTES_PER_SECOND and the process
+lowers its CPU priority, so it can run next to live traffic (add
+`ionice -c3` on Linux to also put its disk reads behind everyone else's):
+
+    python -m services.scrub_service
+    python -m services.scrub_service --once    # Check everything due, then exit
+
+Each outcome is committed together with the document's last_verified_at,
+which is also the checkpoint: a restarted scrubber carries on with
+whatever is still due. Run one scrubber per document store.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Collection, List, Optional
+from sqlalchemy import func, select
+from core.config import settings
+from core.database import SessionLocal, Document, Verification
+from core.events import event_bus
+from core.metrics import SCRUB_BYTES, SCRUB_COVERAGE, SCRUB_DOCUMENTS, SCRUB_LAG, track_stage
+from services.file_service import FileService
+from services.storage_service import tiered_storage
+
+SCRUB_CHUNK_SIZE = 1024 * 1024
+STATUS_INTERVAL_SECONDS = 60
+
+
+def _now() -> datetime:
+    """Current UTC time"""
+    return datetime.now(timezone.utc)
+
+
+class ThrottledReader:
+    """File object wrapper that paces reads to a byte rate shared by all its users"""
+    
+    def __init__(self, stream, limiter: "ByteRateLimiter"):
+        self.stream = stream
+        self.limiter = limiter
+    
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        if data:
+            self.limiter.consume(len(data))
+            SCRUB_BYTES.inc(len(data))
+        return data
+
+
+class ByteRateLimiter:
+    """Token bucket over bytes; consume() sleeps until the budget allows the read"""
+    
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def consume(self, amount: int):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            deficit = -self._tokens
+        if deficit > 0:
+            time.sleep(deficit / self.rate)
+
+
+class ScrubService:
+    """Service that re-verifies stored files and records each outcome"""
+    
+    def __init__(self, rate: Optional[int] = None):
+        self.file_service = FileService()
+        self.limiter = ByteRateLimiter(settings.SCRUB_MAX_BYTES_PER_SECOND if rate is None else rate)
+        self._last_status = 0.0
+    
+    def due_documents(self, limit: int, skip: Collection[int] = ()) -> List[int]:
+        """Ids of documents due a check: never checked first, then the longest unchecked"""
+        due_before = _now() - timedelta(seconds=settings.SCRUB_INTERVAL_SECONDS)
+        live = (Document.file_hash.is_not(None), Document.deleted_at.is_(None))
+        if skip:
+            live += (Document.id.notin_(skip),)
+        db = SessionLocal()
+        try:
+            # Two indexed queries rather than one NULLS FIRST sort, which most indexes cannot serve
+            ids = list(db.execute(
+                select(Document.id)
+                .where(Document.last_verified_at.is_(None), *live)
+                .order_by(Document.id)
+                .limit(limit)
+            ).scalars())
+            if len(ids) < limit:
+                ids += db.execute(
+                    select(Document.id)
+                    .where(Document.last_verified_at < due_before, *live)
+                    .order_by(Document.last_verified_at)
+                    .limit(limit - len(ids))
+                ).scalars()
+            return ids
+        finally:
+            db.close()
+    
+    def scrub_document(self, document_id: int) -> Optional[str]:
+        """Re-hash one document and commit the outcome; returns 'ok', 'mismatch', 'missing' or 'evicted'"""
+        db = SessionLocal()
+        try:
+            document = db.get(Document, document_id)
+            if document is None or document.deleted_at is not None or document.file_hash is None:
+                return None
+            
+            # Evicted files live on as pinned, content-addressed IPFS data; do not pull them back
+            if tiered_storage.is_evicted(document):
+                document.last_verified_at = _now()
+                db.commit()
+                SCRUB_DOCUMENTS.labels("evicted").inc()
+                return "evicted"
+            
+            with track_stage("scrub", "document"):
+                try:
+                    with self.file_service.open_file(document.file_path) as f:
+                        current_hash = self.file_service.calculate_stream_hash(
+                            ThrottledReader(f, self.limiter), SCRUB_CHUNK_SIZE
+                        )
+                    result = "ok" if current_hash == document.file_hash else "mismatch"
+                except FileNotFoundError:
+                    current_hash = None
+                    result = "missing"
+            
+            if result != "ok":
+                print(f"⚠️ Integrity scrub: document {document.id} is {result} ({document.file_path})")
+            
+            # The outcome and the checkpoint commit together
+            document.last_verified_at = _now()
+            db.add(Verification(
+                document_id=document.id,
+                user_id=document.owner_id,
+                verification_type="scrub",
+                status="success" if result == "ok" else "failed",
+                verification_metadata=json.dumps({
+                    "hash_match": result == "ok",
+                    "result": result,
+                    "file_hash": current_hash,
+                }),
+            ))
+            db.commit()
+            SCRUB_DOCUMENTS.labels(result).inc()
+            if result != "ok":
+                # Only problems are pushed; routine passes would flood mostly idle streams
+                event_bus.publish(document.owner_id, {
+                    "type": "verification",
+                    "document_id": document.id,
+                    "is_valid": False,
+                    "verification_status": "failed",
+                    "source": "scrub",
+                    "result": result,
+                })
+            return result
+        except Exception:
+            db.rollback()
+            SCRUB_DOCUMENTS.labels("error").inc()
+            raise
+        finally:
+            db.close()
+    
+    def update_status(self) -> dict:
+        """Refresh the lag and coverage gauges"""
+        now = _now()
+        live = (Document.file_hash.is_not(None), Document.deleted_at.is_(None))
+        db = SessionLocal()
+        try:
+            total, covered = db.execute(
+                select(
+                    func.count(Document.id),
+                    func.count(Document.id).filter(
+                        Document.last_verified_at >= now - timedelta(seconds=settings.SCRUB_INTERVAL_SECONDS)
+                    ),
+                ).where(*live)
+            ).one()
+            # Never-checked documents have been waiting since they were uploaded
+            oldest = db.execute(
+                select(func.min(Document.created_at)).where(Document.last_verified_at.is_(None), *live)
+            ).scalar() or db.execute(
+                select(func.min(Document.last_verified_at)).where(*live)
+            ).scalar()
+        finally:
+            db.close()
+        
+        if oldest is not None and oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=timezone.utc)
+        status = {
+            "documents": total,
+            "covered": covered,
+            "coverage": covered / total if total else 1.0,
+            "lag_seconds": (now - oldest).total_seconds() if oldest else 0.0,
+        }
+        SCRUB_COVERAGE.set(status["coverage"])
+        SCRUB_LAG.set(status["lag_seconds"])
+        self._last_status = time.monotonic()
+        return status
+    
+    def run_once(self) -> int:
+        """Check everything currently due; returns documents checked"""
+        checked = 0
+        failed = set()  # Retried on the next pass rather than straight away
+        while True:
+            ids = self.due_documents(settings.SCRUB_BATCH_SIZE, skip=failed)
+            if not ids:
+                return checked
+            for document_id in ids:
+                try:
+                    if self.scrub_document(document_id):
+                        checked += 1
+                except Exception as e:
+                    failed.add(document_id)
+                    print(f"Integrity scrub of document {document_id} failed: {e}")
+                if time.monotonic() - self._last_status >= STATUS_INTERVAL_SECONDS:
+                    self.update_status()
+    
+    def run_forever(self):
+        """Scrub continuously, idling while nothing is due"""
+        while True:
+            try:
+                checked = self.run_once()
+                status = self.update_status()
+                if checked:
+                    print(f"🔍 Scrubbed {checked} documents, coverage {status['coverage']:.1%}")
+            except Exception as e:
+                print(f"Integrity scrub pass failed: {e}")
+            time.sleep(settings.SCRUB_IDLE_SECONDS)
+
+
+def lower_priority(niceness: int):
+    """Let everything else on the host have the CPU first"""
+    if niceness > 0 and hasattr(os, "nice"):
+        os.nice(niceness)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Digital Shadow integrity scrubber")
+    parser.add_argument("--once", action="store_true", help="Check everything due, then exit")
+    parser.add_argument("--rate", type=int, help="Override SCRUB_MAX_BYTES_PER_SECOND")
+    args = parser.parse_args()
+    
+    lower_priority(settings.SCRUB_NICENESS)
+    if settings.SCRUB_METRICS_PORT:
+        from prometheus_client import start_http_server
+        start_http_server(settings.SCRUB_METRICS_PORT)
+    
+    scrubber = ScrubService(rate=args.rate)
+    if args.once:
+        checked = scrubber.run_once()
+        print(f"✅ Scrubbed {checked} documents: {scrubber.update_status()}")
+        return
+    scrubber.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Statistics service for per-user counters
+"""
+
+from typing import Optional
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+from core.database import SessionLocal, User, Document, Verification, UserStats, USER_STATS_COUNTERS
+
+
+class StatsService:
+    """Service for reading and reconciling per-user statistics"""
+    
+    def compute_user_stats(self, db: Session, user_id: Optional[int] = None) -> dict:
+        """Compute counters from the source tables (slow path, used for reconciliation)"""
+        verification_query = db.query(
+            Verification.user_id,
+            func.count(Verification.id),
+            func.sum(case((Verification.status == "success", 1), else_=0)),
+            func.sum(case((Verification.status == "failed", 1), else_=0)),
+        ).group_by(Verification.user_id)
+        
+        document_query = db.query(
+            Document.owner_id,
+            func.count(Document.id),
+            func.sum(case((Document.is_verified == True, 1), else_=0)),
+            func.coalesce(func.sum(Document.file_size), 0),
+        ).filter(Document.deleted_at.is_(None)).group_by(Document.owner_id)
+        
+        user_query = db.query(User.id)
+        
+        if user_id is not None:
+            verification_query = verification_query.filter(Verification.user_id == user_id)
+            document_query = document_query.filter(Document.owner_id == user_id)
+            user_query = user_query.filter(User.id == user_id)
+        
+        stats = {row[0]: dict.fromkeys(USER_STATS_COUNTERS, 0) for row in user_query.all()}
+        
+        for uid, total, successful, failed in verification_query.all():
+            counters = stats.setdefault(uid, dict.fromkeys(USER_STATS_COUNTERS, 0))
+            counters["total_verifications"] = total or 0
+            counters["successful_verifications"] = successful or 0
+            counters["failed_verifications"] = failed or 0
+        
+        for uid, total, verified, size in document_query.all():
+            counters = stats.setdefault(uid, dict.fromkeys(USER_STATS_COUNTERS, 0))
+            counters["total_documents"] = total or 0
+            counters["verified_documents"] = verified or 0
+            counters["bytes_stored"] = size or 0
+        
+        return stats
+    
+    def get_user_stats(self, db: Session, user_id: int) -> dict:
+        """Read a user's counters with a single primary-key lookup"""
+        row = db.get(UserStats, user_id)
+        if row is None:
+            return self.compute_user_stats(db, user_id).get(
+                user_id, dict.fromkeys(USER_STATS_COUNTERS, 0)
+            )
+        
+        return {name: getattr(row, name) for name in USER_STATS_COUNTERS}
+    
+    def get_version(self, db: Session, user_id: int) -> int:
+        """Current change stamp for a user's documents and verifications"""
+        return db.query(UserStats.version).filter(UserStats.user_id == user_id).scalar() or 0
+    
+    def format_stats(self, counters: dict) -> dict:
+        """Build the stats API payload from raw counters"""
+        total_verifications = counters["total_verifications"]
+        successful_verifications = counters["successful_verifications"]
+        total_documents = counters["total_documents"]
+        verified_documents = counters["verified_documents"]
+        
+        return {
+            "total_verifications": total_verifications,
+            "successful_verifications": successful_verifications,
+            "failed_verifications": counters["failed_verifications"],
+            "success_rate": (successful_verifications / total_verifications * 100) if total_verifications > 0 else 0,
+            "total_documents": total_documents,
+            "verified_documents": verified_documents,
+            "verification_coverage": (verified_documents / total_documents * 100) if total_documents > 0 else 0,
+            "bytes_stored": counters["bytes_stored"]
+        }
+    
+    def reconcile(self, db: Session, user_id: Optional[int] = None) -> int:
+        """Rewrite drifted counters from the source tables; returns rows fixed"""
+        snapshot = self.compute_user_stats(db, user_id)
+        stored = {
+            row.user_id: row
+            for row in db.query(UserStats).filter(
+                UserStats.user_id.in_(list(snapshot))
+            ).all()
+        } if snapshot else {}
+        drifted = [
+            uid for uid, actual in snapshot.items()
+            if uid not in stored
+            or any(getattr(stored[uid], name) != value for name, value in actual.items())
+        ]
+        db.rollback()
+        
+        fixed = 0
+        for uid in drifted:
+            # Lock the counter row, then recount, so concurrent increments are not lost
+            row = db.query(UserStats).filter(UserStats.user_id == uid).with_for_update().first()
+            actual = self.compute_user_stats(db, uid).get(uid)
+            if actual is None:
+                db.rollback()
+                continue
+            if row is None:
+                db.add(UserStats(user_id=uid, version=1, **actual))
+            else:
+                for name, value in actual.items():
+                    setattr(row, name, value)
+                row.version = row.version + 1
+            db.commit()
+            fixed += 1
+        
+        return fixed
+
+
+def reconcile_all() -> int:
+    """Reconcile counters for every user in a fresh session"""
+    db = SessionLocal()
+    try:
+        return StatsService().reconcile(db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    print(f"✅ Reconciled user stats ({reconcile_all()} rows fixed)")
@@ -0,0 +1,302 @@
+"""
+Storage backends for uploaded document bytes
+
+Document.file_path holds a location. A plain path is a file on the local
+backend, which is where every document stored before backends existed
+lives; an s3://bucket/key location is an object in S3-compatible storage
+(AWS S3, MinIO, Ceph RGW...). New uploads go to STORAGE_BACKEND, while
+reads always follow the location, so both kinds can coexist while data
+is migrated.
+
+The S3 backend keeps one pooled client per process. Uploads go through
+s3transfer, which switches to parallel multipart above S3_PART_SIZE.
+Reads are ranged GETs issued in parallel ahead of the reader, so hashing
+and verification stream an object at full bandwidth while holding at most
+S3_READ_AHEAD parts in memory.
+"""
+
+import io
+from abc import ABC, abstractmethod
+import os
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Deque, Dict, List, Optional, Tuple
+from core.config import settings
+
+S3_SCHEME = "s3://"
+COPY_CHUNK_SIZE = 1024 * 1024
+S3_DELETE_BATCH = 1000  # DeleteObjects limit
+
+
+def is_remote(location: str) -> bool:
+    """Whether a stored location is an object-storage URL rather than a local path"""
+    return location.startswith(S3_SCHEME)
+
+
+class StorageBackend(ABC):
+    """Stored document bytes: written once, then streamed, sized and deleted by location"""
+    
+    @abstractmethod
+    def save(self, key: str, stream: BinaryIO) -> str:
+        """Store a stream under key (blocking); returns its location"""
+    
+    @abstractmethod
+    def open(self, location: str) -> BinaryIO:
+        """Readable, seekable binary stream (blocking); FileNotFoundError when absent"""
+    
+    @abstractmethod
+    def size(self, location: str) -> int:
+        """Stored size in bytes (blocking); FileNotFoundError when absent"""
+    
+    @abstractmethod
+    def delete_many(self, locations: List[str]) -> int:
+        """Remove stored objects, skipping missing ones (blocking); returns how many were removed"""
+    
+    def exists(self, location: str) -> bool:
+        """Whether anything is stored at a location (blocking)"""
+        try:
+            self.size(location)
+            return True
+        except FileNotFoundError:
+            return False
+
+
+class LocalBackend(StorageBackend):
+    """Files under UPLOAD_DIR on this node's disk"""
+    
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or settings.UPLOAD_DIR)
+    
+    def save(self, key: str, stream: BinaryIO) -> str:
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(stream, f, COPY_CHUNK_SIZE)
+        return str(path)
+    
+    def open(self, location: str) -> BinaryIO:
+        return open(location, "rb")
+    
+    def size(self, location: str) -> int:
+        return os.path.getsize(location)
+    
+    def delete_many(self, locations: List[str]) -> int:
+        removed = 0
+        for location in locations:
+            try:
+                os.remove(location)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error deleting file {location}: {e}")
+        return removed
+
+
+class S3ObjectReader(io.RawIOBase):
+    """Seekable read-only stream over an S3 object, fetching ranges in parallel ahead of the reader"""
+    
+    def __init__(self, backend: "S3Backend", bucket: str, key: str, size: int):
+        super().__init__()
+        self.backend = backend
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self._position = 0
+        self._next = 0  # Offset of the first byte not yet requested
+        self._pending: Deque[Tuple[int, Future]] = deque()
+        self._part = memoryview(b"")
+        self._part_start = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self.size}[whence]
+        position = max(0, base + offset)
+        if not self._part_start <= position < self._part_start + len(self._part):
+            self._cancel()
+            self._part, self._part_start, self._next = memoryview(b""), position, position
+        self._position = position
+        return position
+    
+    def _fill(self):
+        """Keep up to S3_READ_AHEAD range requests in flight"""
+        part_size = settings.S3_PART_SIZE
+        while len(self._pending) < settings.S3_READ_AHEAD and self._next < self.size:
+            end = min(self._next + part_size, self.size)
+            future = self.backend.range_pool.submit(self.backend.get_range, self.bucket, self.key, self._next, end)
+            self._pending.append((self._next, future))
+            self._next = end
+    
+    def readinto(self, buffer) -> int:
+        if self._position >= self.size:
+            return 0
+        offset = self._position - self._part_start
+        if offset >= len(self._part):
+            self._fill()
+            start, future = self._pending.popleft()
+            self._part, self._part_start = memoryview(future.result()), start
+            self._fill()
+            offset = self._position - start
+        count = min(len(buffer), len(self._part) - offset)
+        buffer[:count] = self._part[offset:offset + count]
+        self._position += count
+        return count
+    
+    def _cancel(self):
+        while self._pending:
+            self._pending.popleft()[1].cancel()
+    
+    def close(self):
+        self._cancel()
+        self._part = memoryview(b"")
+        super().close()
+
+
+class S3Backend(StorageBackend):
+    """Objects in an S3-compatible bucket, through one pooled client per process"""
+    
+    def __init__(self):
+        self.bucket = settings.S3_BUCKET
+        self.prefix = settings.S3_PREFIX.strip("/")
+        self._client = None
+        self._transfer_config = None
+        self._range_pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def client(self):
+        """Shared client, created on first use (boto3 clients are thread-safe)"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+                    from boto3.s3.transfer import TransferConfig
+                    from botocore.config import Config
+                    
+                    self._transfer_config = TransferConfig(
+                        multipart_threshold=settings.S3_PART_SIZE,
+                        multipart_chunksize=settings.S3_PART_SIZE,
+                        max_concurrency=settings.S3_MAX_CONCURRENCY,
+                    )
+                    self._client = boto3.session.Session().client(
+                        "s3",
+                        endpoint_url=settings.S3_ENDPOINT_URL or None,
+                        region_name=settings.S3_REGION,
+                        aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+                        aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None,
+                        config=Config(
+                            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                            retries={"max_attempts": 5, "mode": "adaptive"},
+                            # Custom endpoints (MinIO and friends) rarely have per-bucket DNS
+                            s3={"addressing_style": "path" if settings.S3_ENDPOINT_URL else "auto"},
+                        ),
+                    )
+        return self._client
+    
+    @property
+    def range_pool(self) -> ThreadPoolExecutor:
+        """Threads for ranged reads, shared by every open reader in the process"""
+        if self._range_pool is None:
+            with self._lock:
+                if self._range_pool is None:
+                    self._range_pool = ThreadPoolExecutor(
+                        max_workers=settings.S3_MAX_POOL_CONNECTIONS, thread_name_prefix="s3-range"
+                    )
+        return self._range_pool
+    
+    def _parse(self, location: str) -> Tuple[str, str]:
+        """(bucket, key) of an s3:// location"""
+        bucket, _, key = location[len(S3_SCHEME):].partition("/")
+        return bucket, key
+    
+    def _not_found(self, error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+    
+    def save(self, key: str, stream: BinaryIO) -> str:
+        if not self.bucket:
+            raise RuntimeError("S3_BUCKET must be set to store documents in S3")
+        key = f"{self.prefix}/{key}" if self.prefix else key
+        client = self.client
+        client.upload_fileobj(stream, self.bucket, key, Config=self._transfer_config)
+        return f"{S3_SCHEME}{self.bucket}/{key}"
+    
+    def open(self, location: str) -> BinaryIO:
+        bucket, key = self._parse(location)
+        return S3ObjectReader(self, bucket, key, self.size(location))
+    
+    def size(self, location: str) -> int:
+        from botocore.exceptions import ClientError
+        
+        bucket, key = self._parse(location)
+        try:
+            return self.client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        except ClientError as e:
+            if self._not_found(e):
+                raise FileNotFoundError(location) from e
+            raise
+    
+    def get_range(self, bucket: str, key: str, start: int, end: int) -> bytes:
+        """Bytes [start, end) of an object (blocking)"""
+        from botocore.exceptions import ClientError
+        
+        try:
+            body = self.client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end - 1}")["Body"]
+        except ClientError as e:
+            if self._not_found(e):
+                raise FileNotFoundError(f"{S3_SCHEME}{bucket}/{key}") from e
+            raise
+        with body:
+            data = body.read()
+        if len(data) != end - start:
+            raise IOError(f"{S3_SCHEME}{bucket}/{key} changed while it was being read")
+        return data
+    
+    def delete_many(self, locations: List[str]) -> int:
+        by_bucket: Dict[str, List[str]] = {}
+        for location in locations:
+            bucket, key = self._parse(location)
+            by_bucket.setdefault(bucket, []).append(key)
+        
+        removed = 0
+        for bucket, keys in by_bucket.items():
+            for start in range(0, len(keys), S3_DELETE_BATCH):
+                batch = keys[start:start + S3_DELETE_BATCH]
+                # Deleting a missing key succeeds, so the count is of keys no longer stored
+                response = self.client.delete_objects(
+                    Bucket=bucket, Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+                )
+                for error in response.get("Errors", []):
+                    print(f"Error deleting {S3_SCHEME}{bucket}/{error.get('Key')}: {error.get('Message')}")
+                removed += len(batch) - len(response.get("Errors", []))
+        return removed
+    
+    def shutdown(self):
+        """Stop the ranged-read threads"""
+        if self._range_pool is not None:
+            self._range_pool.shutdown(wait=False, cancel_futures=True)
+            self._range_pool = None
+
+
+local_backend = LocalBackend()
+s3_backend = S3Backend()
+
+
+def default_backend() -> StorageBackend:
+    """Backend that new uploads are written to"""
+    return s3_backend if settings.STORAGE_BACKEND == "s3" else local_backend
+
+
+def backend_for(location: str) -> StorageBackend:
+    """Backend that holds a stored location"""
+    return s3_backend if is_remote(location) else local_backend
@@ -0,0 +1,304 @@
+"""
+Tiered document storage: local disk as a size-bounded cache over IPFS
+
+With STORAGE_MODE=tiered, a document's local file becomes disposable once
+its CID is pinned. Pinned files are tracked in a small SQLite index next
+to the uploads (shared by every process on the node), and the least
+recently or least frequently used are evicted whenever the cached bytes
+exceed LOCAL_CACHE_MAX_BYTES. Reads go through ensure_local(), which
+fetches evicted files back from IPFS; concurrent misses for one CID share
+a single download.
+
+    python -m services.storage_service --index    # Register already pinned files
+    python -m services.storage_service --evict    # Enforce the size limit now
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from core.config import settings
+from core.database import SessionLocal, Document
+from core.metrics import CACHE_REQUESTS, STORAGE_CACHE_BYTES, STORAGE_EVICTIONS, track_stage
+from services.ipfs_service import IPFSService
+from services.storage_backend import is_remote
+
+LOW_WATERMARK = 0.9  # Evict down to this share of the limit, so eviction runs in bursts
+EVICTION_ORDER = {
+    "lru": "last_access",
+    "lfu": "hits, last_access",
+}
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    cid TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+class ContentUnavailableError(Exception):
+    """An evicted file could not be fetched back from IPFS right now (unlike a file that is gone)"""
+
+
+class TieredStorage:
+    """Size-bounded local cache of IPFS-backed document files"""
+    
+    def __init__(self):
+        self.enabled = settings.STORAGE_MODE == "tiered"
+        self.policy = settings.LOCAL_CACHE_POLICY
+        self.max_bytes = settings.LOCAL_CACHE_MAX_BYTES
+        self.index_path = str(Path(settings.UPLOAD_DIR) / ".cache-index.sqlite")
+        self._ipfs: Optional[IPFSService] = None
+        self._fetches: Dict[str, asyncio.Task] = {}
+        self._accesses: Dict[str, list] = defaultdict(lambda: [0.0, 0])
+        self._accesses_lock = threading.Lock()
+        self._local = threading.local()
+        self._task: Optional[asyncio.Task] = None
+        if self.policy not in EVICTION_ORDER:
+            raise ValueError(f"LOCAL_CACHE_POLICY must be one of {', '.join(EVICTION_ORDER)}")
+    
+    @property
+    def ipfs(self) -> IPFSService:
+        # Connect lazily: nodes in local mode never need it
+        if self._ipfs is None:
+            self._ipfs = IPFSService()
+        return self._ipfs
+    
+    def _db(self) -> sqlite3.Connection:
+        """This thread's connection to the node-local index"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_last_access ON entries (last_access)")
+            self._local.conn = conn
+        return conn
+    
+    def register(self, path: str, cid: str):
+        """Make a stored file evictable now that its content is pinned under cid"""
+        if not self.enabled or not cid or is_remote(path):
+            return
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        self._db().execute(
+            "INSERT INTO entries (path, cid, size, last_access, hits) VALUES (?, ?, ?, ?, 1) "
+            "ON CONFLICT(path) DO UPDATE SET cid = excluded.cid, size = excluded.size, "
+            "last_access = excluded.last_access",
+            (path, cid, size, time.time()),
+        )
+    
+    def forget(self, paths: List[str]):
+        """Drop index entries for files removed outside the cache"""
+        if not self.enabled or not paths:
+            return
+        self._db().executemany("DELETE FROM entries WHERE path = ?", [(path,) for path in paths])
+    
+    def record_access(self, path: str):
+        """Note a read; the mtime is touched now, the index is updated in batches"""
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            return
+        with self._accesses_lock:
+            entry = self._accesses[path]
+            entry[0] = now
+            entry[1] += 1
+    
+    def flush_accesses(self):
+        """Write buffered access times and counts to the index"""
+        with self._accesses_lock:
+            accesses, self._accesses = self._accesses, defaultdict(lambda: [0.0, 0])
+        if accesses:
+            self._db().executemany(
+                "UPDATE entries SET last_access = MAX(last_access, ?), hits = hits + ? WHERE path = ?",
+                [(last_access, hits, path) for path, (last_access, hits) in accesses.items()],
+            )
+    
+    def is_evicted(self, document: Document) -> bool:
+        """True when only the IPFS copy of a document exists right now"""
+        if not self.enabled or not document.ipfs_hash or is_remote(document.file_path):
+            return False
+        return not os.path.exists(document.file_path)
+    
+    async def ensure_local(self, document: Document) -> str:
+        """Location of a document's file, fetched back from IPFS first if a local copy was evicted.
+        
+        Raises ContentUnavailableError when the fetch fails, e.g. during an IPFS outage.
+        """
+        path = document.file_path
+        if is_remote(path):
+            return path  # Object storage is not cached on local disk
+        if os.path.exists(path):
+            if self.enabled:
+                CACHE_REQUESTS.labels("storage", "hit").inc()
+                self.record_access(path)
+            return path
+        if not self.enabled or not document.ipfs_hash:
+            return path
+        
+        cid = document.ipfs_hash
+        task = self._fetches.get(cid)
+        if task is None:
+            CACHE_REQUESTS.labels("storage", "miss").inc()
+            task = asyncio.create_task(asyncio.to_thread(self._fetch, cid, path))
+            self._fetches[cid] = task
+            task.add_done_callback(lambda _: self._fetches.pop(cid, None))
+        else:
+            CACHE_REQUESTS.labels("storage", "coalesced").inc()
+        
+        try:
+            fetched = await asyncio.shield(task)
+        except Exception as e:
+            print(f"Fetching {cid} from IPFS failed: {e}")
+            raise ContentUnavailableError(f"{cid} could not be fetched from IPFS") from e
+        
+        # Another document with the same content may have triggered the fetch
+        if fetched != path and not os.path.exists(path):
+            await asyncio.to_thread(self._copy_fetched, fetched, path, cid)
+        return path
+    
+    def _copy_fetched(self, fetched: str, path: str, cid: str):
+        """Copy content fetched for another document into place and index it (blocking)"""
+        shutil.copyfile(fetched, path)
+        # The index write can wait behind another process's eviction, so keep it off the loop
+        self.register(path, cid)
+    
+    def _fetch(self, cid: str, path: str) -> str:
+        """Download a CID into place (blocking); the rename makes it appear atomically"""
+        with track_stage("storage", "fetch"):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            staging = tempfile.mkdtemp(prefix=".fetch-", dir=os.path.dirname(path))
+            try:
+                if not asyncio.run(self.ipfs.download_file(cid, staging)):
+                    raise FileNotFoundError(f"{cid} could not be fetched from IPFS")
+                os.replace(os.path.join(staging, cid), path)
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+        self.register(path, cid)
+        self.record_access(path)  # Archive mtimes are old; mark it fresh so it is not evicted at once
+        self.enforce_limit()
+        return path
+    
+    def enforce_limit(self) -> int:
+        """Evict files until the cache is under its low watermark (blocking); returns files evicted"""
+        if not self.enabled:
+            return 0
+        self.flush_accesses()
+        conn = self._db()
+        evicted = 0
+        # BEGIN IMMEDIATE serialises eviction across every process on the node
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                if self.policy == "lfu":
+                    # Age the counts so files that were popular long ago can still go
+                    conn.execute("UPDATE entries SET hits = hits / 2")
+                target = self.max_bytes * LOW_WATERMARK
+                recent = time.time() - settings.LOCAL_CACHE_MIN_AGE_SECONDS
+                rows = conn.execute(
+                    f"SELECT path, size FROM entries ORDER BY {EVICTION_ORDER[self.policy]}"
+                ).fetchall()
+                for path, size in rows:
+                    if total <= target:
+                        break
+                    try:
+                        # Files read moments ago (possibly by another process) stay
+                        if os.stat(path).st_mtime > recent:
+                            continue
+                        os.remove(path)
+                        evicted += 1
+                    except FileNotFoundError:
+                        pass
+                    conn.execute("DELETE FROM entries WHERE path = ?", (path,))
+                    total -= size
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        STORAGE_CACHE_BYTES.set(total)
+        if evicted:
+            STORAGE_EVICTIONS.inc(evicted)
+        return evicted
+    
+    def index_existing(self) -> int:
+        """Register pinned documents whose files are on this node (blocking); returns files added"""
+        if not self.enabled:
+            return 0
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(Document.file_path, Document.ipfs_hash)
+                .where(Document.ipfs_hash.is_not(None), Document.deleted_at.is_(None))
+                .execution_options(yield_per=1000)
+            )
+            added = 0
+            for path, cid in rows:
+                if os.path.exists(path):
+                    self.register(path, cid)
+                    added += 1
+            return added
+        finally:
+            db.close()
+    
+    async def start(self):
+        """Keep the cache under its limit in the background"""
+        if self.enabled:
+            self._task = asyncio.create_task(self._maintain())
+    
+    async def stop(self):
+        """Stop background eviction and save buffered access counts"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.enabled:
+            await asyncio.to_thread(self.flush_accesses)
+    
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(settings.LOCAL_CACHE_CHECK_SECONDS)
+            try:
+                evicted = await asyncio.to_thread(self.enforce_limit)
+                if evicted:
+                    print(f"🗄️ Evicted {evicted} cached files")
+            except Exception as e:
+                print(f"Storage cache eviction failed: {e}")
+
+
+# Shared per-process storage tier
+tiered_storage = TieredStorage()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiered storage maintenance")
+    parser.add_argument("--index", action="store_true", help="Register pinned files already on disk")
+    parser.add_argument("--evict", action="store_true", help="Enforce LOCAL_CACHE_MAX_BYTES now")
+    args = parser.parse_args()
+    
+    if not tiered_storage.enabled:
+        raise SystemExit("STORAGE_MODE is not 'tiered'")
+    if args.index:
+        print(f"✅ Indexed {tiered_storage.index_existing()} cached files")
+    if args.evict:
+        print(f"✅ Evicted {tiered_storage.enforce_limit()} cached files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Bulk integrity verification of a user's stored documents
+"""
+
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from core.config import settings
+from core.database import SessionLocal, Document, Verification
+from core.events import event_bus
+from services.audit_service import audit_log
+from services.file_service import FileService
+from services.storage_service import ContentUnavailableError, tiered_storage
+
+BULK_VERIFY_CHUNK_SIZE = 1024 * 1024  # Large reads keep hashlib outside the GIL for longer
+BULK_VERIFY_PAGE_SIZE = 500
+
+
+class BulkVerifier:
+    """Re-hashes many stored files on a per-process thread pool and streams the outcomes.
+    
+    SHA-256 releases the GIL while it works through large buffers, so a
+    thread per disk stream is enough to hash at full disk bandwidth. The
+    pool is shared by every bulk request in the worker, so concurrent
+    requests take turns rather than multiplying the I/O.
+    """
+    
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or settings.BULK_VERIFY_WORKERS or min(8, os.cpu_count() or 1)
+        self.file_service = FileService()
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+    
+    def _get_executor(self) -> Executor:
+        """Create the pool lazily so each server worker gets its own after fork"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-verify")
+            return self._executor
+    
+    def _selection(self, user_id: int, document_ids: Optional[List[int]], verified: Optional[bool],
+                   created_after: Optional[datetime], created_before: Optional[datetime]):
+        """Statement for the documents to check, in id order for keyset paging"""
+        statement = (
+            select(Document.id, Document.file_path, Document.file_hash, Document.ipfs_hash)
+            .where(Document.owner_id == user_id, Document.deleted_at.is_(None))
+            .order_by(Document.id)
+            .limit(BULK_VERIFY_PAGE_SIZE)
+        )
+        if document_ids is not None:
+            statement = statement.where(Document.id.in_(document_ids))
+        if verified is not None:
+            statement = statement.where(Document.is_verified.is_(verified))
+        if created_after is not None:
+            statement = statement.where(Document.created_at >= created_after)
+        if created_before is not None:
+            statement = statement.where(Document.created_at < created_before)
+        return statement
+    
+    def _page(self, statement, after_id: int) -> list:
+        """Next page of the selection, on a session held only for the query (blocking)"""
+        db = SessionLocal()
+        try:
+            return db.execute(statement.where(Document.id > after_id)).all()
+        finally:
+            db.close()
+    
+    def _record(self, verifications: List[Verification]):
+        """Hand a batch of outcomes to the audit log on a short-lived session (blocking)"""
+        db = SessionLocal()
+        try:
+            audit_log.record_many(db, verifications)
+        finally:
+            db.close()
+    
+    async def _check(self, document) -> dict:
+        """Hash one document on the pool and compare it with the stored hash"""
+        result = {"document_id": document.id, "stored_hash": document.file_hash}
+        try:
+            path = await tiered_storage.ensure_local(document)
+            loop = asyncio.get_running_loop()
+            current_hash = await loop.run_in_executor(
+                self._get_executor(), self.file_service.calculate_file_hash, path, BULK_VERIFY_CHUNK_SIZE
+            )
+        except FileNotFoundError:
+            return {**result, "is_valid": False, "file_hash": None,
+                    "verification_status": "failed", "error": "File not found"}
+        except ContentUnavailableError:
+            return {**result, "is_valid": False, "file_hash": None,
+                    "verification_status": "failed", "error": "Content temporarily unavailable"}
+        except Exception as e:
+            # One unreadable file (permissions, object storage, IPFS fetch) must not end the run
+            print(f"Bulk verification could not read document {document.id}: {e}")
+            return {**result, "is_valid": False, "file_hash": None,
+                    "verification_status": "failed", "error": f"Could not read file: {type(e).__name__}"}
+        
+        is_valid = current_hash == document.file_hash
+        return {**result, "is_valid": is_valid, "file_hash": current_hash,
+                "verification_status": "success" if is_valid else "failed"}
+    
+    async def verify(
+        self,
+        user_id: int,
+        document_ids: Optional[List[int]] = None,
+        verified: Optional[bool] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> AsyncIterator[dict]:
+        """Check the selected documents, yielding each outcome as it completes and a summary last.
+        
+        No session is held across yields: a run can last as long as hashing
+        thousands of files takes, and the client reads it at its own pace.
+        """
+        statement = self._selection(user_id, document_ids, verified, created_after, created_before)
+        summary = {"checked": 0, "valid": 0, "failed": 0, "pending": 0}
+        pending_records: List[Verification] = []
+        in_flight = set()
+        rows = deque()
+        after_id = 0
+        exhausted = False
+        
+        def record(result: dict):
+            summary["checked"] += 1
+            summary["valid" if result["is_valid"] else "failed"] += 1
+            metadata = {"hash_match": result["is_valid"], "bulk": True}
+            if "error" in result:
+                metadata["error"] = result["error"]
+            pending_records.append(Verification(
+                document_id=result["document_id"],
+                user_id=user_id,
+                verification_type="verify",
+                status=result["verification_status"],
+                verification_metadata=json.dumps(metadata),
+            ))
+        
+        try:
+            while True:
+                # Keep the pool busy, fetching the next page only when the current one is used up
+                while len(in_flight) < 2 * self.workers and not (exhausted and not rows):
+                    if not rows:
+                        rows = deque(await run_in_threadpool(self._page, statement, after_id))
+                        if not rows:
+                            exhausted = True
+                            break
+                        after_id = rows[-1].id
+                        if len(rows) < BULK_VERIFY_PAGE_SIZE:
+                            exhausted = True
+                    document = rows.popleft()
+                    if document.file_hash is None:
+                        summary["pending"] += 1
+                        yield {"document_id": document.id, "verification_status": "pending"}
+                        continue
+                    in_flight.add(asyncio.ensure_future(self._check(document)))
+                
+                if not in_flight:
+                    break
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    record(result)
+                    yield result
+                
+                if len(pending_records) >= settings.BULK_VERIFY_BATCH_SIZE:
+                    records, pending_records = pending_records, []
+                    await run_in_threadpool(self._record, records)
+            
+            event_bus.publish(user_id, {"type": "bulk_verification", "summary": summary})
+            yield {"summary": summary}
+        finally:
+            # A disconnected client stops the run; outcomes already computed are still recorded
+            for task in in_flight:
+                task.cancel()
+            if pending_records:
+                self._record(pending_records)
+    
+    def shutdown(self):
+        """Stop the pool workers"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Shared per-process hashing pool
+bulk_verifier = BulkVerifier()